@@ -11,19 +11,27 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'NexusGrid.settings')
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "NexusGrid.settings")
 
-application = get_asgi_application()
-import os
-from django.core.asgi import get_asgi_application
+# Set up Django before importing anything that touches models
+django_asgi_app = get_asgi_application()
+
+from channels.auth import AuthMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
-from monitoring.routing import websocket_urlpatterns
+from channels.security.websocket import AllowedHostsOriginValidator
+from dashboard.routing import websocket_urlpatterns as dashboard_websocket_urlpatterns
+from monitoring.routing import websocket_urlpatterns as monitoring_websocket_urlpatterns
+from system_layout.routing import websocket_urlpatterns as layout_websocket_urlpatterns
 
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "NexusGrid.settings")
+websocket_urlpatterns = (
+    dashboard_websocket_urlpatterns + monitoring_websocket_urlpatterns + layout_websocket_urlpatterns
+)
 
 application = ProtocolTypeRouter(
     {
-        "http": get_asgi_application(),
-        "websocket": URLRouter(websocket_urlpatterns),  # Handle WebSockets
+        "http": django_asgi_app,
+        "websocket": AllowedHostsOriginValidator(
+            AuthMiddlewareStack(URLRouter(websocket_urlpatterns))  # Handle WebSockets
+        ),
     }
 )
@@ -0,0 +1,190 @@
+"""
+Keyset (cursor) pagination for the fault and resource request lists.
+
+A page is fetched with WHERE (key) < (last row's key) ORDER BY key LIMIT
+n + 1 instead of OFFSET, so it costs the same however far back it is, and
+no COUNT(*) is needed to know whether another page follows. The key is a
+timestamp plus the primary key, which breaks ties. Cursors are signed
+tokens holding the key of the row to continue from and the direction;
+clients pass them back as they are.
+
+A cursor that fails its signature check raises InvalidCursor, which views
+answer with 400: quietly serving the first page instead would hand a client
+that follows `next` links the same rows again.
+
+Orderings that aren't made of model fields (search relevance) fall back to
+an offset kept in the cursor. A total is only counted when asked for, and
+then estimated: from the planner on PostgreSQL, elsewhere by counting up to
+APPROX_COUNT_CAP rows.
+"""
+import json
+
+from django.core import signing
+from django.db import connection
+from django.db.models import Q
+
+PER_PAGE = 10
+
+# Without a planner estimate, totals are counted up to this many rows
+APPROX_COUNT_CAP = 1000
+
+# Named after the module's first home, so cursors issued before the move
+# stay valid
+CURSOR_SALT = 'dashboard.pagination'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, previous_cursor, params, total=None, total_exact=False):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.total = total
+        self.total_exact = total_exact
+        self._params = params
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def _query(self, **changes):
+        params = self._params.copy()
+        for name, value in changes.items():
+            params.pop(name, None)
+            if value is not None:
+                params[name] = value
+        return params.urlencode()
+
+    @property
+    def next_query(self):
+        return self._query(cursor=self.next_cursor)
+
+    @property
+    def previous_query(self):
+        return self._query(cursor=self.previous_cursor)
+
+    @property
+    def first_query(self):
+        return self._query(cursor=None)
+
+    @property
+    def total_query(self):
+        return self._query(total='1')
+
+
+def _encode(payload):
+    return signing.dumps(payload, salt=CURSOR_SALT, compress=True)
+
+
+def _decode(cursor):
+    """
+    The cursor's payload, or None for a missing cursor (the first page).
+    Raises InvalidCursor for one that was tampered with.
+    """
+    if not cursor:
+        return None
+    try:
+        return signing.loads(cursor, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        raise InvalidCursor('Invalid page cursor') from None
+
+
+def _fields(queryset, keys):
+    return [queryset.model._meta.get_field(key.lstrip('-')) for key in keys]
+
+
+def _key_of(obj, fields):
+    return [field.value_to_string(obj) for field in fields]
+
+
+def _after(keys, fields, values, reverse=False):
+    """
+    Q for the rows that come after `values` in the `keys` ordering (before
+    them with reverse=True): (a > x) OR (a = x AND b > y) ..., plus a >= x
+    on its own so the database can range-scan the index on a.
+    """
+    values = [field.to_python(value) for field, value in zip(fields, values)]
+    descending = keys[0].startswith('-') != reverse
+    bound = Q(**{f'{fields[0].name}__{"lte" if descending else "gte"}': values[0]})
+    condition = Q()
+    for i, (key, field) in enumerate(zip(keys, fields)):
+        descending = key.startswith('-') != reverse
+        term = Q(**{f'{field.name}__{"lt" if descending else "gt"}': values[i]})
+        for prior, prior_value in zip(fields[:i], values[:i]):
+            term &= Q(**{prior.name: prior_value})
+        condition |= term
+    return bound & condition
+
+
+def _flip(key):
+    return key[1:] if key.startswith('-') else f'-{key}'
+
+
+def approximate_count(queryset):
+    """
+    (count, exact): the planner's row estimate on PostgreSQL, otherwise an
+    exact count up to APPROX_COUNT_CAP (exact is False when it hit the cap).
+    """
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.order_by().values('pk').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        return int(plan[0]['Plan']['Plan Rows']), False
+    count = queryset.order_by().values('pk')[:APPROX_COUNT_CAP + 1].count()
+    return min(count, APPROX_COUNT_CAP), count <= APPROX_COUNT_CAP
+
+
+def paginate(queryset, cursor, params, keys=None, per_page=PER_PAGE, with_total=False):
+    """
+    One KeysetPage of `queryset`. `keys` is the ordering, model fields
+    ending with the primary key (e.g. ['-reported_at', '-fault_id']); with
+    keys=None the queryset's own ordering is kept and paged by offset.
+    `params` is the request's query string, which the page's links keep.
+    Raises InvalidCursor for a cursor that wasn't issued here.
+    """
+    params = params.copy()
+    params.pop('cursor', None)
+    payload = _decode(cursor) or {}
+    total, total_exact = approximate_count(queryset) if with_total else (None, False)
+
+    if keys is None:
+        offset = max(int(payload.get('offset', 0)), 0)
+        rows = list(queryset[offset:offset + per_page + 1])
+        next_cursor = _encode({'offset': offset + per_page}) if len(rows) > per_page else None
+        previous_cursor = _encode({'offset': max(offset - per_page, 0)}) if offset else None
+        return KeysetPage(rows[:per_page], next_cursor, previous_cursor, params, total, total_exact)
+
+    fields = _fields(queryset, keys)
+    backwards = 'before' in payload
+    if backwards:
+        rows = list(
+            queryset.filter(_after(keys, fields, payload['before'], reverse=True))
+            .order_by(*[_flip(key) for key in keys])[:per_page + 1]
+        )
+        more_before = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        more_after = True
+    else:
+        if 'after' in payload:
+            queryset = queryset.filter(_after(keys, fields, payload['after']))
+        rows = list(queryset.order_by(*keys)[:per_page + 1])
+        more_after = len(rows) > per_page
+        rows = rows[:per_page]
+        more_before = 'after' in payload
+
+    next_cursor = _encode({'after': _key_of(rows[-1], fields)}) if rows and more_after else None
+    previous_cursor = _encode({'before': _key_of(rows[0], fields)}) if rows and more_before else None
+    return KeysetPage(rows, next_cursor, previous_cursor, params, total, total_exact)
@@ -300,6 +300,10 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Single-process alternative for tests and local development without Redis
+if env.bool("CHANNEL_LAYER_IN_MEMORY", default=False):
+    CHANNEL_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
 # ------------------------------------------------------------------------------
 # 13. EMAIL CONFIGURATION
 # ------------------------------------------------------------------------------
@@ -334,4 +338,65 @@ LOGGING = {
             'propagate': False,
         },
     },
-}
\ No newline at end of file
+}
+# ------------------------------------------------------------------------------
+# 15. MONITORING (TELEMETRY INGEST)
+# ------------------------------------------------------------------------------
+
+# Shared secret collectors send as "Authorization: Token <value>". Ingest is
+# refused until it is set.
+MONITORING_INGEST_TOKEN = env('MONITORING_INGEST_TOKEN', default='')
+
+# Upper bound on samples accepted in a single ingest request
+MONITORING_MAX_BATCH_SIZE = env.int('MONITORING_MAX_BATCH_SIZE', default=5000)
+
+# Days of raw telemetry kept; older daily partitions are dropped whole
+MONITORING_RETENTION_DAYS = env.int('MONITORING_RETENTION_DAYS', default=30)
+
+# Daily partitions created ahead of time by `manage.py manage_partitions`
+MONITORING_PARTITION_DAYS_AHEAD = env.int('MONITORING_PARTITION_DAYS_AHEAD', default=7)
+
+# Days of 1-minute and 1-hour metric rollups kept (1-day rollups are kept forever)
+MONITORING_ROLLUP_1M_RETENTION_DAYS = env.int('MONITORING_ROLLUP_1M_RETENTION_DAYS', default=14)
+MONITORING_ROLLUP_1H_RETENTION_DAYS = env.int('MONITORING_ROLLUP_1H_RETENTION_DAYS', default=400)
+
+# A host's latest snapshot older than this is shown as stale
+MONITORING_SNAPSHOT_STALE_SECONDS = env.int('MONITORING_SNAPSHOT_STALE_SECONDS', default=300)
+
+# Live metric WebSockets send at most one frame per client per this many seconds
+MONITORING_PUSH_INTERVAL = env.float('MONITORING_PUSH_INTERVAL', default=2.0)
+
+# ------------------------------------------------------------------------------
+# 16. SYSTEM LAYOUT
+# ------------------------------------------------------------------------------
+
+# Side of the square grid buckets LayoutItems are indexed under, in layout grid
+# cells. Changing it needs `manage.py rebuild_layout_cells`.
+LAYOUT_GRID_BUCKET = env.int('LAYOUT_GRID_BUCKET', default=8)
+
+# Days of layout change log kept for delta sync; clients further behind reload
+LAYOUT_CHANGE_RETENTION_DAYS = env.int('LAYOUT_CHANGE_RETENTION_DAYS', default=7)
+
+# Live layout edits (ws/layout/) are written to the database at most once per
+# editor per this many seconds; a drag in between is coalesced into one write
+LAYOUT_EDIT_FLUSH_INTERVAL = env.float('LAYOUT_EDIT_FLUSH_INTERVAL', default=1.0)
+
+# Deleting a layout subtree removes this many LayoutItems per transaction.
+# Subtrees up to the inline limit are deleted during the request; larger ones
+# are queued for `manage.py run_layout_deletions`
+LAYOUT_DELETE_BATCH_SIZE = env.int('LAYOUT_DELETE_BATCH_SIZE', default=500)
+LAYOUT_DELETE_INLINE_LIMIT = env.int('LAYOUT_DELETE_INLINE_LIMIT', default=200)
+
+# ------------------------------------------------------------------------------
+# 17. FAULT REPORTS
+# ------------------------------------------------------------------------------
+
+# A new fault report is folded into an open report of the same system filed
+# within this many hours whose description is at least FAULT_DUPLICATE_THRESHOLD
+# alike (estimated Jaccard similarity of character shingles, 0 to 1)
+FAULT_DUPLICATE_WINDOW_HOURS = env.int('FAULT_DUPLICATE_WINDOW_HOURS', default=72)
+FAULT_DUPLICATE_THRESHOLD = env.float('FAULT_DUPLICATE_THRESHOLD', default=0.5)
+
+# Most fault reports one bulk triage may change; each selected row is locked
+# until the update commits
+FAULT_TRIAGE_MAX_SELECTION = env.int('FAULT_TRIAGE_MAX_SELECTION', default=500)
@@ -3,3 +3,9 @@ from django.apps import AppConfig
 class DashboardConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dashboard'
+
+    def ready(self):
+        from . import facts, live, repairs
+        facts.connect_signals()
+        live.connect_signals()
+        repairs.connect_signals()
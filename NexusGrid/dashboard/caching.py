@@ -0,0 +1,73 @@
+"""
+Stale-while-revalidate caching with a single-flight lock.
+
+Entries are stored with a "fresh until" time and kept for a further grace
+period after it. Once an entry goes stale, the first request to notice takes
+a short cache lock (cache.add is atomic) and recomputes; everyone else keeps
+serving the stale value instead of piling onto the database. Only a cold
+cache makes callers wait, and then only briefly, for the lock holder.
+"""
+import time
+
+from django.core.cache import cache
+
+# How long a stale value may still be served while it is being recomputed
+STALE_GRACE = 60 * 60
+
+# Upper bound on one recomputation; the lock expires by itself after this
+LOCK_TIMEOUT = 30
+
+# How long a caller with a cold cache waits for another worker's result
+COLD_WAIT = 2.0
+COLD_POLL = 0.05
+
+
+def _lock_key(key):
+    return f'{key}:lock'
+
+
+def store(key, value, ttl):
+    cache.set(key, {'value': value, 'fresh_until': time.time() + ttl}, ttl + STALE_GRACE)
+    return value
+
+
+def expire(*keys):
+    """
+    Mark entries stale without dropping them, so the next reader recomputes
+    while concurrent ones still get the previous value.
+    """
+    entries = cache.get_many(keys)
+    for key, entry in entries.items():
+        cache.set(key, {'value': entry['value'], 'fresh_until': 0}, STALE_GRACE)
+
+
+def _recompute(key, compute, ttl):
+    try:
+        return store(key, compute(), ttl)
+    finally:
+        cache.delete(_lock_key(key))
+
+
+def get_or_revalidate(key, compute, ttl):
+    """
+    Cached result of compute(), recomputed by at most one caller at a time.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        if entry['fresh_until'] > time.time():
+            return entry['value']
+        if cache.add(_lock_key(key), 1, LOCK_TIMEOUT):
+            return _recompute(key, compute, ttl)
+        return entry['value']
+
+    # Cold cache: one caller computes, the rest wait for its result
+    if cache.add(_lock_key(key), 1, LOCK_TIMEOUT):
+        return _recompute(key, compute, ttl)
+    deadline = time.monotonic() + COLD_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(COLD_POLL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry['value']
+    # The lock holder is taking too long (or died); don't fail the request
+    return store(key, compute(), ttl)
@@ -0,0 +1,31 @@
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .live import DASHBOARD_GROUP
+
+
+class DashboardConsumer(AsyncJsonWebsocketConsumer):
+    """
+    ws/dashboard/: sends the full metrics on connect, then only the metrics
+    that changed whenever dashboard.live broadcasts.
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if not user or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+        await self.channel_layer.group_add(DASHBOARD_GROUP, self.channel_name)
+        await self.accept()
+        await self.send_json({'type': 'metrics', 'changed': await self.current_metrics()})
+
+    async def disconnect(self, code):
+        await self.channel_layer.group_discard(DASHBOARD_GROUP, self.channel_name)
+
+    @database_sync_to_async
+    def current_metrics(self):
+        from .views import get_dashboard_metrics
+        return get_dashboard_metrics()
+
+    async def dashboard_metrics(self, event):
+        await self.send_json({'type': 'metrics', 'changed': event['changed']})
@@ -0,0 +1,223 @@
+"""
+ReportDailyCount maintenance and the chart queries that read it.
+
+A report counts once under (day filed, lab, type, current status). Creating
+one adds 1 to its row; a status change (or a move to another system/type)
+moves the 1 between rows; deleting one subtracts it. Deletes are counted in
+pre_delete, while the report's system and lab can still be looked up.
+queryset.update() bypasses signals: code that changes statuses in bulk
+should call restatus_reports(), code that deletes in bulk subtract_reports(),
+and code that moves systems to another lab relabel_reports(), or run
+`manage.py backfill_report_counts`.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate, TruncMonth
+from django.db.models.signals import post_save, pre_delete, pre_save
+from django.utils import timezone
+
+from faults.models import FaultReport
+from resources.models import ResourceRequest
+from system_layout.models import System
+
+from .models import ReportDailyCount
+
+# model -> (kind, timestamp field, category field or None)
+REPORT_MODELS = {
+    FaultReport: ('fault', 'reported_at', 'fault_type'),
+    ResourceRequest: ('resource', 'requested_at', None),
+}
+
+
+def bump(key, delta):
+    """
+    Add `delta` to the ReportDailyCount row for `key`, creating it if needed.
+    """
+    rows = ReportDailyCount.objects.filter(**key)
+    if rows.update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            ReportDailyCount.objects.create(count=delta, **key)
+    except IntegrityError:
+        # Someone else created it in the meantime
+        rows.update(count=F('count') + delta)
+
+
+def move_counts(old_key, new_key, count=1):
+    if old_key == new_key:
+        return
+    if old_key:
+        bump(old_key, -count)
+    if new_key:
+        bump(new_key, count)
+
+
+def _report_counts(model, reports):
+    """
+    {(day, lab_id, category, status): n} for the `reports` queryset of `model`.
+    """
+    _, timestamp_field, category_field = REPORT_MODELS[model]
+    fields = ['system_name__lab_id', 'status', timestamp_field] + ([category_field] if category_field else [])
+    counts = Counter()
+    for row in reports.values_list(*fields):
+        lab_id, status, timestamp = row[:3]
+        category = row[3] if len(row) > 3 else ''
+        if lab_id is None or timestamp is None:
+            continue
+        counts[(timezone.localdate(timestamp), lab_id, category or '', status)] += 1
+    return counts
+
+
+def subtract_reports(model, reports):
+    """
+    Take the `reports` queryset of `model` out of ReportDailyCount before it
+    is deleted without signals: one read, then one bump per distinct row.
+    """
+    kind = REPORT_MODELS[model][0]
+    for (day, lab_id, category, status), count in _report_counts(model, reports).items():
+        bump({'day': day, 'lab_id': lab_id, 'kind': kind, 'category': category, 'status': status}, -count)
+
+
+def relabel_reports(model, reports, lab_id):
+    """
+    Move the `reports` queryset of `model` to `lab_id` in ReportDailyCount,
+    before their systems are moved there without signals.
+    """
+    kind = REPORT_MODELS[model][0]
+    for (day, old_lab_id, category, status), count in _report_counts(model, reports).items():
+        key = {'day': day, 'kind': kind, 'category': category, 'status': status}
+        move_counts(dict(key, lab_id=old_lab_id), dict(key, lab_id=lab_id), count)
+
+
+def restatus_reports(model, reports, status):
+    """
+    Move the `reports` queryset of `model` to `status` in ReportDailyCount,
+    before their status is changed without signals.
+    """
+    kind = REPORT_MODELS[model][0]
+    for (day, lab_id, category, old_status), count in _report_counts(model, reports).items():
+        key = {'day': day, 'lab_id': lab_id, 'kind': kind, 'category': category}
+        move_counts(dict(key, status=old_status), dict(key, status=status), count)
+
+
+def _key(model, system_id, timestamp, category, status):
+    lab_id = System.objects.filter(pk=system_id).values_list('lab_id', flat=True).first()
+    if lab_id is None or timestamp is None:
+        return None
+    return {
+        'day': timezone.localdate(timestamp),
+        'lab_id': lab_id,
+        'kind': REPORT_MODELS[model][0],
+        'category': category or '',
+        'status': status,
+    }
+
+
+def _fields(model):
+    _, timestamp_field, category_field = REPORT_MODELS[model]
+    return ['system_name_id', 'status', timestamp_field] + ([category_field] if category_field else [])
+
+
+def _instance_key(model, instance):
+    values = [getattr(instance, name) for name in _fields(model)]
+    return _key_from_values(model, values)
+
+
+def _key_from_values(model, values):
+    system_id, status, timestamp = values[:3]
+    category = values[3] if len(values) > 3 else ''
+    return _key(model, system_id, timestamp, category, status)
+
+
+def _remember(sender, instance, **kwargs):
+    previous = None
+    if not instance._state.adding and instance.pk is not None:
+        previous = sender.objects.filter(pk=instance.pk).values_list(*_fields(sender)).first()
+    instance._fact_previous = previous
+
+
+def _saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_fact_previous', None)
+    old_key = _key_from_values(sender, previous) if previous else None
+    move_counts(old_key, _instance_key(sender, instance))
+
+
+def _deleted(sender, instance, **kwargs):
+    move_counts(_instance_key(sender, instance), None)
+
+
+def connect_signals():
+    for model in REPORT_MODELS:
+        uid = f'report_facts_{model.__name__}'
+        pre_save.connect(_remember, sender=model, dispatch_uid=uid)
+        post_save.connect(_saved, sender=model, dispatch_uid=uid)
+        pre_delete.connect(_deleted, sender=model, dispatch_uid=uid)
+
+
+def rebuild_counts():
+    """
+    Recount ReportDailyCount from the report tables. Returns the row count.
+    """
+    rows = []
+    for model, (kind, timestamp_field, category_field) in REPORT_MODELS.items():
+        group_by = ['day', 'system_name__lab_id', 'status'] + ([category_field] if category_field else [])
+        grouped = (
+            model.objects.order_by()
+            .annotate(day=TruncDate(timestamp_field))
+            .values(*group_by)
+            .annotate(n=Count('pk'))
+        )
+        rows.extend(
+            ReportDailyCount(
+                day=group['day'],
+                lab_id=group['system_name__lab_id'],
+                kind=kind,
+                category=(group[category_field] or '') if category_field else '',
+                status=group['status'],
+                count=group['n'],
+            )
+            for group in grouped
+        )
+    with transaction.atomic():
+        ReportDailyCount.objects.all().delete()
+        ReportDailyCount.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def _counts(kind, since=None, until=None, lab_id=None):
+    rows = ReportDailyCount.objects.filter(kind=kind, count__gt=0)
+    if since:
+        rows = rows.filter(day__gte=since)
+    if until:
+        rows = rows.filter(day__lt=until)
+    if lab_id:
+        rows = rows.filter(lab_id=lab_id)
+    return rows.order_by()
+
+
+def monthly_counts(kind, since=None, until=None, lab_id=None):
+    """
+    [{'month': date, 'count': n}] for reports filed in [since, until).
+    """
+    return list(
+        _counts(kind, since, until, lab_id)
+        .annotate(month=TruncMonth('day'))
+        .values('month')
+        .annotate(count=Sum('count'))
+        .order_by('month')
+    )
+
+
+def category_counts(kind, since=None, until=None, lab_id=None):
+    """
+    [{'category': ..., 'count': n}], largest first.
+    """
+    return list(
+        _counts(kind, since, until, lab_id)
+        .values('category')
+        .annotate(count=Sum('count'))
+        .order_by('-count')
+    )
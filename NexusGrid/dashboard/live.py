@@ -0,0 +1,89 @@
+"""
+Server push for the dashboard.
+
+Once a transaction that saved or deleted System, FaultReport or
+ResourceRequest rows commits, the dashboard metrics are recomputed into the
+cache, the cached charts and activity are marked stale, and the metrics that
+changed are broadcast to every open dashboard (DashboardConsumer). Code that
+changes these tables with queryset.update() bypasses signals and should call
+notify_dashboard_changed() itself.
+"""
+import logging
+import threading
+import weakref
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from faults.models import FaultReport
+from resources.models import ResourceRequest
+from system_layout.models import System
+
+from . import caching
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_GROUP = 'dashboard'
+
+# Metrics as last broadcast; deltas are computed against this
+BROADCAST_CACHE_KEY = 'dashboard_metrics_broadcast'
+
+_queued = threading.local()
+
+
+def metric_delta(previous, current):
+    if not previous:
+        return dict(current)
+    return {key: value for key, value in current.items() if previous.get(key) != value}
+
+
+def broadcast_dashboard_metrics():
+    from . import views
+
+    # Readers keep getting the old charts/activity until one recomputes them
+    caching.expire(views.CHART_DATA_KEY, views.RECENT_ACTIVITY_KEY)
+    metrics = caching.store(views.DASHBOARD_METRICS_KEY, views.compute_dashboard_metrics(),
+                            views.DASHBOARD_METRICS_TTL)
+    changed = metric_delta(cache.get(BROADCAST_CACHE_KEY), metrics)
+    cache.set(BROADCAST_CACHE_KEY, metrics, None)
+    if not changed:
+        return
+
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    try:
+        async_to_sync(layer.group_send)(DASHBOARD_GROUP, {'type': 'dashboard.metrics', 'changed': changed})
+    except Exception as e:
+        logger.warning(f"Dashboard push failed: {str(e)}")
+
+
+def notify_dashboard_changed():
+    # One broadcast per transaction, however many rows it touched. _queued
+    # holds a weak reference to the callback this thread has queued: the
+    # callback clears it when it runs, and if the transaction (or the
+    # savepoint that queued it) rolls back, Django drops the callback and
+    # the reference dies with it.
+    queued = getattr(_queued, 'callback', None)
+    if queued is not None and queued() is not None:
+        return
+
+    def broadcast():
+        _queued.callback = None
+        broadcast_dashboard_metrics()
+
+    _queued.callback = weakref.ref(broadcast)
+    transaction.on_commit(broadcast)
+
+
+def _model_changed(sender, **kwargs):
+    notify_dashboard_changed()
+
+
+def connect_signals():
+    for model in (System, FaultReport, ResourceRequest):
+        post_save.connect(_model_changed, sender=model, dispatch_uid=f'dashboard_live_save_{model.__name__}')
+        post_delete.connect(_model_changed, sender=model, dispatch_uid=f'dashboard_live_delete_{model.__name__}')
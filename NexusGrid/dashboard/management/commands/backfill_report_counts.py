@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.facts import rebuild_counts
+
+
+class Command(BaseCommand):
+    help = "Recount the per-day fault/resource chart counts from FaultReport and ResourceRequest rows."
+
+    def handle(self, *args, **options):
+        count = rebuild_counts()
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} daily count rows."))
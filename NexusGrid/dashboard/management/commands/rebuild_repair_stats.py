@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.repairs import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-lab and per-system MTTR and backlog totals from the fault status history."
+
+    def handle(self, *args, **options):
+        count = rebuild_stats()
+        self.stdout.write(self.style.SUCCESS(f"Wrote repair stats for {count} systems."))
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_counts(apps, schema_editor):
+    """
+    Count the existing reports; a copy of dashboard.facts.rebuild_counts()
+    frozen against the historical models.
+    """
+    ReportDailyCount = apps.get_model('dashboard', 'ReportDailyCount')
+    sources = [
+        (apps.get_model('faults', 'FaultReport'), 'fault', 'reported_at', 'fault_type'),
+        (apps.get_model('resources', 'ResourceRequest'), 'resource', 'requested_at', None),
+    ]
+    rows = []
+    for model, kind, timestamp_field, category_field in sources:
+        group_by = ['day', 'system_name__lab_id', 'status'] + ([category_field] if category_field else [])
+        grouped = (
+            model.objects.order_by()
+            .annotate(day=TruncDate(timestamp_field))
+            .values(*group_by)
+            .annotate(n=Count('pk'))
+        )
+        for group in grouped:
+            rows.append(ReportDailyCount(
+                day=group['day'],
+                lab_id=group['system_name__lab_id'],
+                kind=kind,
+                category=(group[category_field] or '') if category_field else '',
+                status=group['status'],
+                count=group['n'],
+            ))
+    ReportDailyCount.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('system_layout', '0009_layout_rollup'),
+        ('faults', '0002_initial'),
+        ('resources', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportDailyCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('kind', models.CharField(choices=[('fault', 'Fault report'), ('resource', 'Resource request')], max_length=10)),
+                ('category', models.CharField(blank=True, default='', max_length=20)),
+                ('status', models.CharField(max_length=30)),
+                ('count', models.IntegerField(default=0)),
+                ('lab', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='system_layout.lab')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'day'], name='dashboard_r_kind_dcd8ae_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'lab', 'kind', 'category', 'status'), name='unique_report_daily_count')],
+            },
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 5.2.3 on 2026-10-18 15:07
+
+import django.db.models.deletion
+from collections import defaultdict
+
+from django.db import migrations, models
+
+OPEN_STATUSES = ['unaddressed', 'in-progress', 'scheduled']
+COUNTERS = ['repairs', 'repair_seconds', 'open_faults', 'open_since_total']
+
+
+def backfill_stats(apps, schema_editor):
+    """
+    Replay the fault status history into per-system and per-lab totals; a
+    copy of dashboard.repairs.rebuild_stats() frozen against the historical
+    models.
+    """
+    FaultStatusChange = apps.get_model('faults', 'FaultStatusChange')
+    SystemRepairStats = apps.get_model('dashboard', 'SystemRepairStats')
+    LabRepairStats = apps.get_model('dashboard', 'LabRepairStats')
+    systems = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    labs = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    rows = FaultStatusChange.objects.order_by('fault_report_id', 'changed_at', 'id').values_list(
+        'fault_report_id', 'fault_report__system_name_id', 'fault_report__system_name__lab_id',
+        'from_status', 'to_status', 'changed_at',
+    )
+    current, open_since = None, None
+    for fault_id, system_id, lab_id, from_status, to_status, changed_at in rows.iterator(chunk_size=2000):
+        if fault_id != current:
+            current, open_since = fault_id, None
+        was_open, now_open = from_status in OPEN_STATUSES, to_status in OPEN_STATUSES
+        deltas = {}
+        if was_open and not now_open:
+            deltas = {'open_faults': -1, 'open_since_total': -int(open_since.timestamp())}
+            if to_status == 'resolved':
+                deltas.update(repairs=1, repair_seconds=int((changed_at - open_since).total_seconds()))
+            open_since = None
+        elif now_open and not was_open:
+            deltas = {'open_faults': 1, 'open_since_total': int(changed_at.timestamp())}
+            open_since = changed_at
+        for name, value in deltas.items():
+            systems[system_id][name] += value
+            if lab_id is not None:
+                labs[lab_id][name] += value
+    SystemRepairStats.objects.bulk_create(
+        [SystemRepairStats(system_id=system_id, **totals) for system_id, totals in systems.items()],
+        batch_size=1000,
+    )
+    LabRepairStats.objects.bulk_create(
+        [LabRepairStats(lab_id=lab_id, **totals) for lab_id, totals in labs.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+        ('faults', '0007_fault_status_history'),
+        ('system_layout', '0015_layout_item_placement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LabRepairStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('repairs', models.IntegerField(default=0)),
+                ('repair_seconds', models.BigIntegerField(default=0)),
+                ('open_faults', models.IntegerField(default=0)),
+                ('open_since_total', models.BigIntegerField(default=0)),
+                ('lab', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='repair_stats', to='system_layout.lab')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='SystemRepairStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('repairs', models.IntegerField(default=0)),
+                ('repair_seconds', models.BigIntegerField(default=0)),
+                ('open_faults', models.IntegerField(default=0)),
+                ('open_since_total', models.BigIntegerField(default=0)),
+                ('system', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='repair_stats', to='system_layout.system')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
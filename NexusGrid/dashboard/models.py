@@ -1,3 +1,85 @@
+from datetime import datetime, timedelta, timezone
+
 from django.db import models
 
-# Create your models here.
+
+class ReportDailyCount(models.Model):
+    """
+    How many fault reports / resource requests were filed per day, lab,
+    type and (current) status. Kept current by dashboard.facts so charts
+    sum a few hundred rows instead of scanning the report tables.
+    """
+    KIND_CHOICES = [
+        ('fault', 'Fault report'),
+        ('resource', 'Resource request'),
+    ]
+
+    day = models.DateField()
+    lab = models.ForeignKey('system_layout.Lab', on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # fault_type for faults; resource requests have no type and use ''
+    category = models.CharField(max_length=20, blank=True, default='')
+    status = models.CharField(max_length=30)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'lab', 'kind', 'category', 'status'],
+                name='unique_report_daily_count'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['kind', 'day']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.day} lab={self.lab_id} {self.category or '-'} {self.status}: {self.count}"
+
+
+class RepairStats(models.Model):
+    """
+    Running totals behind MTTR and backlog age, kept current by
+    dashboard.repairs as fault reports change status.
+    """
+    COUNTERS = ['repairs', 'repair_seconds', 'open_faults', 'open_since_total']
+
+    # Changes from an open status to resolved, and how long the faults were open
+    repairs = models.IntegerField(default=0)
+    repair_seconds = models.BigIntegerField(default=0)
+    # Faults open now, and the sum of when they became open (epoch seconds)
+    open_faults = models.IntegerField(default=0)
+    open_since_total = models.BigIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def mttr(self):
+        if self.repairs <= 0:
+            return None
+        return timedelta(seconds=self.repair_seconds / self.repairs)
+
+    @property
+    def mean_opened_at(self):
+        """
+        When the open faults became open, on average; their mean age is the
+        time since.
+        """
+        if self.open_faults <= 0:
+            return None
+        return datetime.fromtimestamp(self.open_since_total / self.open_faults, tz=timezone.utc)
+
+
+class LabRepairStats(RepairStats):
+    lab = models.OneToOneField('system_layout.Lab', on_delete=models.CASCADE, related_name='repair_stats')
+
+    def __str__(self):
+        return f"Repair stats of lab {self.lab_id}"
+
+
+class SystemRepairStats(RepairStats):
+    system = models.OneToOneField('system_layout.System', on_delete=models.CASCADE, related_name='repair_stats')
+
+    def __str__(self):
+        return f"Repair stats of system {self.system_id}"
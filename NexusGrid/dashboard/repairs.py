@@ -0,0 +1,329 @@
+"""
+Fault status history, and the MTTR and backlog aggregates kept from it.
+
+Every status change of a FaultReport appends a FaultStatusChange row and
+adds its effect to the SystemRepairStats row of the report's system and the
+LabRepairStats row of that system's lab:
+
+- a fault is open while its status is one of FaultReport.OPEN_STATUSES,
+  counting from the change that opened it: its filing, or the reopening
+  recorded in FaultReport.opened_at;
+- going from open to resolved is a repair, which adds 1 to repairs and the
+  time the fault was open to repair_seconds;
+- open_faults and open_since_total, the sum of when the open faults became
+  open, give the backlog's mean age at any moment.
+
+A system's row therefore equals replay() of its reports' history, and a
+lab's row the sum of its systems' rows. SLA figures read a few of these
+rows and never the history. A report moved to another system takes its
+replayed totals along, and a system moved to another lab takes its row's.
+
+Signal handlers cover save() and delete(). Code that changes statuses with
+queryset.update() must call record_status_changes() first, code that
+deletes reports without signals forget_reports(), and code that moves
+systems to another lab move_systems(). `manage.py rebuild_repair_stats`
+recomputes every row from the history.
+"""
+from collections import defaultdict
+from itertools import groupby
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.signals import post_save, pre_delete, pre_save
+from django.utils import timezone
+
+from faults.models import FaultReport, FaultStatusChange
+from system_layout.models import System
+
+from .models import LabRepairStats, RepairStats, SystemRepairStats
+
+REPAIRED = 'resolved'
+
+
+def _is_open(status):
+    return status in FaultReport.OPEN_STATUSES
+
+
+def _epoch(moment):
+    return int(moment.timestamp())
+
+
+def transition(old_status, new_status, open_since, at):
+    """
+    (deltas, open_since) for a report going from old_status, open since
+    `open_since` if it was open, to new_status at `at`.
+    """
+    was_open, now_open = _is_open(old_status), _is_open(new_status)
+    if was_open and not now_open:
+        deltas = {'open_faults': -1, 'open_since_total': -_epoch(open_since)}
+        if new_status == REPAIRED:
+            deltas.update(repairs=1, repair_seconds=int((at - open_since).total_seconds()))
+        return deltas, None
+    if now_open and not was_open:
+        return {'open_faults': 1, 'open_since_total': _epoch(at)}, at
+    return {}, open_since
+
+
+def replay(changes):
+    """
+    The totals a report contributes, from its [(from_status, to_status,
+    changed_at)] in order.
+    """
+    totals = dict.fromkeys(RepairStats.COUNTERS, 0)
+    open_since = None
+    for from_status, to_status, changed_at in changes:
+        deltas, open_since = transition(from_status, to_status, open_since, changed_at)
+        _add(totals, deltas)
+    return totals
+
+
+def _add(totals, deltas, sign=1):
+    for name, value in deltas.items():
+        totals[name] = totals.get(name, 0) + sign * value
+    return totals
+
+
+def _bump(model, field, key_id, deltas):
+    """
+    Add `deltas` to the `model` row whose `field` is key_id, creating it if
+    needed.
+    """
+    deltas = {name: value for name, value in deltas.items() if value}
+    if key_id is None or not deltas:
+        return
+    rows = model.objects.filter(**{field: key_id})
+    changes = {name: F(name) + value for name, value in deltas.items()}
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**{field: key_id}, **deltas)
+    except IntegrityError:
+        # Someone else created it in the meantime
+        rows.update(**changes)
+
+
+def apply_system_deltas(system_deltas):
+    """
+    Add {system_id: deltas} to the systems' rows and their labs' rows.
+    """
+    system_deltas = {system_id: deltas for system_id, deltas in system_deltas.items() if any(deltas.values())}
+    if not system_deltas:
+        return
+    labs = dict(System.objects.filter(pk__in=system_deltas).values_list('id', 'lab_id'))
+    lab_deltas = defaultdict(dict)
+    for system_id, deltas in system_deltas.items():
+        _bump(SystemRepairStats, 'system_id', system_id, deltas)
+        _add(lab_deltas[labs.get(system_id)], deltas)
+    for lab_id, deltas in lab_deltas.items():
+        _bump(LabRepairStats, 'lab_id', lab_id, deltas)
+
+
+def _history(fault_ids):
+    """
+    {fault_id: [(from_status, to_status, changed_at)]} in order.
+    """
+    rows = (
+        FaultStatusChange.objects.filter(fault_report_id__in=list(fault_ids))
+        .order_by('fault_report_id', 'changed_at', 'id')
+        .values_list('fault_report_id', 'from_status', 'to_status', 'changed_at')
+    )
+    return {
+        fault_id: [row[1:] for row in changes]
+        for fault_id, changes in groupby(rows, key=lambda row: row[0])
+    }
+
+
+def record_status_changes(reports, status, user=None):
+    """
+    Record the `reports` queryset moving to `status`, before it is changed
+    without signals: one history row per report that changes, with the
+    deltas applied once per system.
+    """
+    at = timezone.now()
+    changes = []
+    reopened = []
+    system_deltas = defaultdict(dict)
+    rows = reports.exclude(status=status).values_list('pk', 'system_name_id', 'status', 'opened_at', 'reported_at')
+    for fault_id, system_id, old_status, opened_at, reported_at in rows:
+        deltas, _ = transition(old_status, status, opened_at or reported_at, at)
+        _add(system_deltas[system_id], deltas)
+        if _is_open(status) and not _is_open(old_status):
+            reopened.append(fault_id)
+        changes.append(FaultStatusChange(
+            fault_report_id=fault_id, from_status=old_status, to_status=status, changed_at=at, changed_by=user,
+        ))
+    FaultStatusChange.objects.bulk_create(changes)
+    if reopened:
+        FaultReport.objects.filter(pk__in=reopened).update(opened_at=at)
+    apply_system_deltas(system_deltas)
+
+
+def forget_reports(fault_ids):
+    """
+    Take these reports' totals off their systems and labs, before they are
+    deleted without signals.
+    """
+    systems = dict(FaultReport.objects.filter(pk__in=list(fault_ids)).values_list('pk', 'system_name_id'))
+    system_deltas = defaultdict(dict)
+    for fault_id, changes in _history(systems).items():
+        _add(system_deltas[systems[fault_id]], replay(changes), -1)
+    apply_system_deltas(system_deltas)
+
+
+def move_systems(systems, lab_id):
+    """
+    Move the totals of `systems` ([(system_id, current lab id)]) to the row
+    of `lab_id`, before the systems themselves are moved there.
+    """
+    current_labs = dict(systems)
+    lab_deltas = defaultdict(dict)
+    for row in SystemRepairStats.objects.filter(system_id__in=current_labs).values('system_id', *RepairStats.COUNTERS):
+        old_lab_id = current_labs[row.pop('system_id')]
+        if old_lab_id != lab_id:
+            _add(lab_deltas[old_lab_id], row, -1)
+            _add(lab_deltas[lab_id], row)
+    for target_id, deltas in lab_deltas.items():
+        _bump(LabRepairStats, 'lab_id', target_id, deltas)
+
+
+def _remember_report(sender, instance, **kwargs):
+    instance._repair_state = None
+    if instance._state.adding or instance.pk is None:
+        return
+    stored = FaultReport.objects.filter(pk=instance.pk).values_list(
+        'status', 'system_name_id', 'opened_at', 'reported_at'
+    ).first()
+    if stored is None:
+        return
+    old_status, old_system_id, opened_at, reported_at = stored
+    at = timezone.now()
+    deltas, _ = transition(old_status, instance.status, opened_at or reported_at, at)
+    if _is_open(instance.status) and not _is_open(old_status):
+        instance.opened_at = at
+    instance._repair_state = (old_status, old_system_id, deltas, at)
+
+
+def _report_saved(sender, instance, created, **kwargs):
+    if created:
+        FaultStatusChange.objects.create(
+            fault_report=instance, to_status=instance.status,
+            changed_at=instance.reported_at, changed_by_id=instance.reported_by_id,
+        )
+        deltas, _ = transition('', instance.status, None, instance.reported_at)
+        apply_system_deltas({instance.system_name_id: deltas})
+        return
+
+    state = getattr(instance, '_repair_state', None)
+    if state is None:
+        return
+    old_status, old_system_id, deltas, at = state
+    if old_system_id != instance.system_name_id:
+        # The report's whole history moves with it
+        before = replay(_history([instance.pk]).get(instance.pk, []))
+        apply_system_deltas({
+            old_system_id: _add({}, before, -1),
+            instance.system_name_id: _add(dict(before), deltas),
+        })
+    else:
+        apply_system_deltas({instance.system_name_id: deltas})
+    if old_status != instance.status:
+        FaultStatusChange.objects.create(
+            fault_report_id=instance.pk, from_status=old_status, to_status=instance.status,
+            changed_at=at, changed_by=getattr(instance, '_status_changed_by', None),
+        )
+
+
+def _report_deleted(sender, instance, **kwargs):
+    changes = _history([instance.pk]).get(instance.pk, [])
+    apply_system_deltas({instance.system_name_id: _add({}, replay(changes), -1)})
+
+
+def _remember_system(sender, instance, **kwargs):
+    instance._repair_lab = None
+    if not instance._state.adding and instance.pk is not None:
+        instance._repair_lab = System.objects.filter(pk=instance.pk).values_list('lab_id', flat=True).first()
+
+
+def _system_saved(sender, instance, created, **kwargs):
+    old_lab_id = getattr(instance, '_repair_lab', None)
+    if not created and old_lab_id is not None and old_lab_id != instance.lab_id:
+        move_systems([(instance.pk, old_lab_id)], instance.lab_id)
+
+
+def connect_signals():
+    pre_save.connect(_remember_report, sender=FaultReport, dispatch_uid='fault_repairs_FaultReport')
+    post_save.connect(_report_saved, sender=FaultReport, dispatch_uid='fault_repairs_FaultReport')
+    pre_delete.connect(_report_deleted, sender=FaultReport, dispatch_uid='fault_repairs_FaultReport')
+    pre_save.connect(_remember_system, sender=System, dispatch_uid='fault_repairs_System')
+    post_save.connect(_system_saved, sender=System, dispatch_uid='fault_repairs_System')
+
+
+def rebuild_stats():
+    """
+    Recompute every SystemRepairStats and LabRepairStats row from the
+    history, first recording the filing of reports that have none (written
+    with bulk_create()). Returns the number of systems with a row.
+    """
+    FaultStatusChange.objects.bulk_create(
+        [
+            FaultStatusChange(
+                fault_report_id=fault_id, to_status=status, changed_at=reported_at, changed_by_id=user_id,
+            )
+            for fault_id, status, reported_at, user_id in FaultReport.objects.filter(
+                status_changes__isnull=True
+            ).values_list('pk', 'status', 'reported_at', 'reported_by_id')
+        ],
+        batch_size=1000,
+    )
+
+    systems = defaultdict(dict)
+    labs = defaultdict(dict)
+    rows = (
+        FaultStatusChange.objects.order_by('fault_report_id', 'changed_at', 'id')
+        .values_list(
+            'fault_report_id', 'fault_report__system_name_id', 'fault_report__system_name__lab_id',
+            'from_status', 'to_status', 'changed_at',
+        )
+    )
+    for (_, system_id, lab_id), changes in groupby(rows.iterator(chunk_size=2000), key=lambda row: row[:3]):
+        totals = replay(row[3:] for row in changes)
+        _add(systems[system_id], totals)
+        _add(labs[lab_id], totals)
+
+    with transaction.atomic():
+        SystemRepairStats.objects.all().delete()
+        LabRepairStats.objects.all().delete()
+        SystemRepairStats.objects.bulk_create(
+            [SystemRepairStats(system_id=system_id, **totals) for system_id, totals in systems.items()],
+            batch_size=1000,
+        )
+        LabRepairStats.objects.bulk_create(
+            [LabRepairStats(lab_id=lab_id, **totals) for lab_id, totals in labs.items() if lab_id is not None],
+            batch_size=1000,
+        )
+    return len(systems)
+
+
+def sla_summary(lab_id=None):
+    """
+    [{id, name, repairs, mttr_seconds, open_faults, mean_opened_at}] per lab,
+    or per system of `lab_id`, read from the aggregate rows alone.
+    """
+    if lab_id is None:
+        rows = LabRepairStats.objects.select_related('lab').order_by('lab__lab_name')
+        named = [(row, row.lab_id, row.lab.lab_name) for row in rows]
+    else:
+        rows = SystemRepairStats.objects.filter(system__lab_id=lab_id).select_related('system').order_by('system__host_name')
+        named = [(row, row.system_id, row.system.host_name) for row in rows]
+    return [
+        {
+            'id': key,
+            'name': name,
+            'repairs': row.repairs,
+            'mttr_seconds': round(row.mttr.total_seconds()) if row.mttr is not None else None,
+            'open_faults': row.open_faults,
+            'mean_opened_at': row.mean_opened_at,
+        }
+        for row, key, name in named
+    ]
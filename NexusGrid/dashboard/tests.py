@@ -1,3 +1,353 @@
-from django.test import TestCase
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
 
-# Create your tests here.
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from faults.models import FaultReport
+from faults.triage import triage
+from login_manager.models import User
+from resources.models import ResourceRequest
+from system_layout.models import Lab, LayoutItem, System
+
+from .facts import rebuild_counts
+from .models import LabRepairStats, ReportDailyCount, RepairStats, SystemRepairStats
+from .repairs import rebuild_stats, sla_summary
+from .routing import websocket_urlpatterns
+
+
+def _lab(name='Lab 1'):
+    floor = LayoutItem.objects.create(name=f'{name} floor', item_type='floor')
+    room = LayoutItem.objects.create(name=name, item_type='room', parent=floor)
+    return Lab.objects.create(layout_item=room, lab_name=name)
+
+
+def _system(lab, name, status='active'):
+    item = LayoutItem.objects.create(name=name, item_type='computer', parent=lab.layout_item)
+    return System.objects.create(layout_item=item, lab=lab, host_name=name, status=status)
+
+
+def _report(system, user, status='unaddressed', fault_type='Hardware'):
+    return FaultReport.objects.create(
+        system_name=system, reported_by=user, fault_type=fault_type, description='Fan is loud', status=status,
+    )
+
+
+@override_settings(TIME_ZONE='Asia/Kolkata')
+class ReportDailyCountTests(TestCase):
+    """
+    The counts kept by dashboard.facts must equal a full rebuild_counts().
+    Days are local: 20:00 UTC is already the next day in Asia/Kolkata.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='staff', email='staff@example.com', password='x')
+        cls.lab = _lab('Lab 1')
+        cls.other_lab = _lab('Lab 2')
+        cls.pc1 = _system(cls.lab, 'pc-1')
+        cls.pc2 = _system(cls.other_lab, 'pc-2')
+
+    def counts(self):
+        rows = ReportDailyCount.objects.exclude(count=0)
+        return sorted(rows.values_list('day', 'lab_id', 'kind', 'category', 'status', 'count'))
+
+    def assertMatchesRebuild(self):
+        kept = self.counts()
+        self.assertFalse(ReportDailyCount.objects.filter(count__lt=0).exists())
+        rebuild_counts()
+        self.assertEqual(kept, self.counts())
+
+    def test_create_and_status_change(self):
+        fault = _report(self.pc1, self.user)
+        _report(self.pc2, self.user, fault_type='Network')
+        request = ResourceRequest.objects.create(
+            system_name=self.pc1, requested_by=self.user, resource_name='Cable', description='Spare cable',
+        )
+        self.assertMatchesRebuild()
+
+        fault.status = 'resolved'
+        fault.save()
+        request.status = 'Fulfilled'
+        request.save()
+        self.assertMatchesRebuild()
+
+    def test_status_change_days_after_filing(self):
+        fault = _report(self.pc1, self.user)
+        filed = datetime.combine(timezone.now().date() - timedelta(days=2), datetime.min.time(), dt_timezone.utc)
+        FaultReport.objects.filter(pk=fault.pk).update(reported_at=filed + timedelta(hours=20))
+        # Backdated with update(), so recount as the facts module asks
+        rebuild_counts()
+
+        local_day = (filed + timedelta(days=1)).date()
+
+        fault.refresh_from_db()
+        fault.status = 'in-progress'
+        fault.save()
+        self.assertMatchesRebuild()
+        self.assertEqual(ReportDailyCount.objects.get(status='in-progress').day, local_day)
+
+        triage([fault.pk], self.user, status='resolved')
+        self.assertMatchesRebuild()
+        self.assertEqual(ReportDailyCount.objects.get(status='resolved').day, local_day)
+
+    def test_bulk_status_change(self):
+        reports = [
+            _report(self.pc1, self.user), _report(self.pc1, self.user, 'scheduled'), _report(self.pc2, self.user),
+        ]
+        triage([report.pk for report in reports], self.user, status='ignored')
+        self.assertMatchesRebuild()
+
+    def test_system_moved_to_another_lab(self):
+        _report(self.pc1, self.user)
+        item = self.pc1.layout_item
+        item.parent = self.other_lab.layout_item
+        item.save()
+        self.assertEqual(System.objects.get(pk=self.pc1.pk).lab_id, self.other_lab.pk)
+        self.assertMatchesRebuild()
+
+    def test_delete(self):
+        fault = _report(self.pc1, self.user)
+        _report(self.pc2, self.user)
+        fault.delete()
+        self.assertMatchesRebuild()
+        self.pc2.delete()
+        self.assertMatchesRebuild()
+
+
+class RepairStatsTests(TestCase):
+    """
+    The MTTR and backlog rows kept by dashboard.repairs must equal a full
+    rebuild_stats(). The clock moves on by the hour so repairs take time.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='staff', email='staff@example.com', password='x')
+        cls.lab = _lab('Lab 1')
+        cls.other_lab = _lab('Lab 2')
+        cls.pc1 = _system(cls.lab, 'pc-1')
+        cls.pc2 = _system(cls.lab, 'pc-2')
+        cls.pc3 = _system(cls.other_lab, 'pc-3')
+
+    def setUp(self):
+        self.clock = datetime(2026, 3, 2, 9, 0, tzinfo=dt_timezone.utc)
+        patcher = mock.patch('django.utils.timezone.now', lambda: self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def later(self, hours):
+        self.clock += timedelta(hours=hours)
+
+    def rows(self):
+        counters = RepairStats.COUNTERS
+        return (
+            sorted(tuple(row) for row in SystemRepairStats.objects.values_list('system_id', *counters) if any(row[1:])),
+            sorted(tuple(row) for row in LabRepairStats.objects.values_list('lab_id', *counters) if any(row[1:])),
+        )
+
+    def sla(self):
+        # A lab or system left with nothing keeps an all-zero row until rebuilt
+        return [
+            [row for row in rows if row['repairs'] or row['open_faults']]
+            for rows in [sla_summary(), sla_summary(self.lab.pk), sla_summary(self.other_lab.pk)]
+        ]
+
+    def assertMatchesRebuild(self):
+        kept, kept_sla = self.rows(), self.sla()
+        rebuild_stats()
+        self.assertEqual(self.rows(), kept)
+        self.assertEqual(self.sla(), kept_sla)
+
+    def test_repairs_and_reopening(self):
+        fault = _report(self.pc1, self.user)
+        self.later(2)
+        _report(self.pc1, self.user)
+        _report(self.pc3, self.user, 'scheduled')
+        self.later(3)
+        fault.status = 'resolved'
+        fault.save()
+        self.assertMatchesRebuild()
+        self.assertEqual(sla_summary(self.lab.pk)[0]['mttr_seconds'], 5 * 3600)
+
+        self.later(1)
+        fault.status = 'unaddressed'
+        fault.save()
+        self.later(4)
+        fault.status = 'resolved'
+        fault.save()
+        self.assertMatchesRebuild()
+        # Open 5 hours, then 4 more after reopening
+        self.assertEqual(sla_summary(self.lab.pk)[0]['mttr_seconds'], 9 * 3600 // 2)
+
+    def test_bulk_triage(self):
+        reports = [_report(self.pc1, self.user), _report(self.pc2, self.user), _report(self.pc3, self.user)]
+        self.later(6)
+        triage([report.pk for report in reports[:2]], self.user, status='resolved')
+        self.later(1)
+        triage([report.pk for report in reports], self.user, status='ignored')
+        self.assertMatchesRebuild()
+        self.later(2)
+        triage([reports[0].pk], self.user, status='in-progress')
+        self.assertMatchesRebuild()
+
+    def test_backlog_age(self):
+        _report(self.pc1, self.user)
+        self.later(10)
+        _report(self.pc2, self.user)
+        self.assertMatchesRebuild()
+        self.assertEqual([row['mean_opened_at'] for row in sla_summary()], [self.clock - timedelta(hours=5)])
+
+    def test_moves_and_deletes(self):
+        fault = _report(self.pc1, self.user)
+        moved = _report(self.pc1, self.user)
+        self.later(3)
+        fault.status = 'resolved'
+        fault.save()
+
+        moved.system_name = self.pc3
+        moved.save()
+        self.assertMatchesRebuild()
+
+        item = self.pc1.layout_item
+        item.parent = self.other_lab.layout_item
+        item.save()
+        self.assertEqual(System.objects.get(pk=self.pc1.pk).lab_id, self.other_lab.pk)
+        self.assertMatchesRebuild()
+
+        fault.delete()
+        self.assertMatchesRebuild()
+
+
+@override_settings(COMPRESS_ENABLED=False, COMPRESS_OFFLINE=False)
+class DashboardApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='staff', email='staff@example.com', password='x')
+        cls.lab = _lab()
+        _report(_system(cls.lab, 'pc-1'), cls.user)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def get(self, **params):
+        return self.client.get(reverse('dashboard_api'), params)
+
+    def test_sla_per_lab_and_per_system(self):
+        self.assertEqual([row['name'] for row in self.get(action='sla').json()['data']], ['Lab 1'])
+        response = self.get(action='sla', lab=self.lab.pk)
+        self.assertEqual([row['name'] for row in response.json()['data']], ['pc-1'])
+
+    def test_sla_rejects_a_malformed_lab(self):
+        for lab in ['abc', '-1', '1.5']:
+            response = self.get(action='sla', lab=lab)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {'error': 'Invalid lab'})
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class DashboardConsumerTests(TransactionTestCase):
+    # The consumers' database_sync_to_async closes connections left inside
+    # a transaction, so these tests can't run in one
+
+    def setUp(self):
+        cache.clear()
+        self.lab = _lab()
+        _system(self.lab, 'pc-1')
+        self.user = User.objects.create_user(username='viewer', email='viewer@example.com', password='x')
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/dashboard/')
+        communicator.scope['user'] = user
+        connected, code = await communicator.connect()
+        return communicator, connected, code
+
+    @database_sync_to_async
+    def add_system(self, name, status):
+        # Broadcast by dashboard.live once the save commits
+        _system(self.lab, name, status)
+
+    @database_sync_to_async
+    def add_systems(self, names, rollback=False):
+        try:
+            with transaction.atomic():
+                for name in names:
+                    _system(self.lab, name, 'non-functional')
+                if rollback:
+                    raise DatabaseError('rolled back')
+        except DatabaseError:
+            pass
+
+    @database_sync_to_async
+    def add_system_after_savepoint_rollback(self):
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    _system(self.lab, 'pc-2', 'active')
+                    raise DatabaseError('rolled back')
+            except DatabaseError:
+                pass
+            _system(self.lab, 'pc-3', 'active')
+
+    async def connected(self):
+        communicator, _, _ = await self.connect(self.user)
+        await communicator.receive_json_from()
+        return communicator
+
+    async def test_anonymous_socket_is_closed(self):
+        _, connected, code = await self.connect(AnonymousUser())
+        self.assertFalse(connected)
+        self.assertEqual(code, 4401)
+
+    async def test_authenticated_socket_receives_changed_metrics(self):
+        communicator, connected, _ = await self.connect(self.user)
+        self.assertTrue(connected)
+        frame = await communicator.receive_json_from()
+        self.assertEqual(frame['type'], 'metrics')
+        self.assertEqual(frame['changed']['total_systems'], 1)
+
+        await self.add_system('pc-2', 'inactive')
+
+        frame = await communicator.receive_json_from()
+        self.assertEqual(frame['type'], 'metrics')
+        self.assertEqual((frame['changed']['total_systems'], frame['changed']['active_percent']), (2, 50.0))
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_one_frame_per_transaction(self):
+        communicator = await self.connected()
+
+        await self.add_systems(['pc-2', 'pc-3', 'pc-4'])
+
+        frame = await communicator.receive_json_from()
+        self.assertEqual((frame['changed']['total_systems'], frame['changed']['critical_count']), (4, 3))
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_rolled_back_transaction_does_not_hold_back_the_next_broadcast(self):
+        communicator = await self.connected()
+
+        await self.add_systems(['pc-2'], rollback=True)
+        self.assertTrue(await communicator.receive_nothing())
+        await self.add_systems(['pc-3'])
+
+        frame = await communicator.receive_json_from()
+        self.assertEqual(frame['changed']['total_systems'], 2)
+        await communicator.disconnect()
+
+    async def test_savepoint_rollback_does_not_hold_back_the_broadcast(self):
+        communicator = await self.connected()
+
+        await self.add_system_after_savepoint_rollback()
+
+        frame = await communicator.receive_json_from()
+        self.assertEqual(frame['changed']['total_systems'], 2)
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
@@ -5,19 +5,35 @@ from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
 from django.urls import reverse
 from django.core.cache import cache
-from django.db.models.functions import TruncMonth
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from django.db.models import Count, Q
-from django.utils.timezone import now
+from django.utils.timezone import localdate, now
 from datetime import timedelta
+import hashlib
 import json
 import logging
 
 from faults.models import FaultReport
 from resources.models import ResourceRequest
-from system_layout.models import Lab, System
+from system_layout.models import Lab, LayoutRollup, System
+
+from . import facts
+from .repairs import sla_summary
+from .caching import get_or_revalidate
 
 logger = logging.getLogger(__name__)
 
+# Cache keys and freshness (seconds); stale values are still served while
+# one worker recomputes, see dashboard.caching
+DASHBOARD_METRICS_KEY = 'dashboard_metrics'
+DASHBOARD_METRICS_TTL = 300
+CHART_DATA_KEY = 'dashboard_charts'
+CHART_DATA_TTL = 600
+RECENT_ACTIVITY_KEY = 'recent_activity'
+RECENT_ACTIVITY_TTL = 120
+
 @login_required(login_url="/login/")
 def dashboard_view(request):
     """
@@ -61,78 +77,26 @@ def get_dashboard_metrics():
     """
     Calculate all dashboard metrics on server-side
     """
-    cache_key = 'dashboard_metrics'
-    cached_data = cache.get(cache_key)
-    
-    if cached_data:
-        return cached_data
-    
-    # System counts
-    total_systems = System.objects.count()
-    functional_count = System.objects.filter(
-        status__in=['active', 'inactive']
-    ).count()
-    critical_count = System.objects.filter(status='non-functional').count()
-    active_count = System.objects.filter(status='active').count()
-    
-    # Calculate percentages
-    if total_systems > 0:
-        functional_percent = round((functional_count / total_systems) * 100, 1)
-        critical_percent = round((critical_count / total_systems) * 100, 1)
-        active_percent = round((active_count / total_systems) * 100, 1)
-        system_utilization = round(
-            (active_count / (functional_count if functional_count > 0 else 1)) * 100, 1
-        )
-    else:
-        functional_percent = critical_percent = active_percent = system_utilization = 0
-
-    # Recent counts
-    fault_reports_count = FaultReport.objects.filter(
-        status__in=['open', 'in_progress']
-    ).count()
-    
-    resource_requests_count = ResourceRequest.objects.filter(
-        status='pending'
-    ).count()
+    return get_or_revalidate(DASHBOARD_METRICS_KEY, compute_dashboard_metrics, DASHBOARD_METRICS_TTL)
 
-    metrics = {
-        'total_systems': total_systems,
-        'functional_count': functional_count,
-        'critical_count': critical_count,
-        'active_count': active_count,
-        'functional_percent': functional_percent,
-        'critical_percent': critical_percent,
-        'active_percent': active_percent,
-        'system_utilization': system_utilization,
-        'fault_reports_count': fault_reports_count,
-        'resource_requests_count': resource_requests_count,
-    }
-    
-    # Cache for 5 minutes
-    cache.set(cache_key, metrics, 300)
-    return metrics
+def compute_dashboard_metrics():
+    """
+    Whole-hierarchy totals: the sum of the root items' LayoutRollup rows,
+    which system_layout.rollups keeps current.
+    """
+    return LayoutRollup.objects.stats_for(None)
 
 def get_chart_data():
     """
     Generate chart data on server-side with proper formatting
     """
-    cache_key = 'dashboard_charts'
-    cached_data = cache.get(cache_key)
-    
-    if cached_data:
-        return cached_data
-    
-    six_months_ago = now() - timedelta(days=180)
+    return get_or_revalidate(CHART_DATA_KEY, compute_chart_data, CHART_DATA_TTL)
+
+def compute_chart_data():
+    six_months_ago = localdate() - timedelta(days=180)
     
     # Fault Trend Chart Data
-    fault_trend_data = list(
-        FaultReport.objects
-        .filter(reported_at__gte=six_months_ago)
-        .annotate(month=TruncMonth("reported_at"))
-        .values("month")
-        .annotate(count=Count("fault_id"))
-        .order_by("month")
-    )
+    fault_trend_data = facts.monthly_counts('fault', since=six_months_ago)
     
     # Format for frontend consumption
     fault_trend_formatted = {
@@ -143,29 +107,17 @@ def get_chart_data():
     }
     
     # Fault Distribution Chart Data
-    fault_distribution_data = list(
-        FaultReport.objects
-        .values("fault_type")
-        .annotate(count=Count("fault_id"))
-        .order_by('-count')
-    )
+    fault_distribution_data = facts.category_counts('fault')
     
     fault_distribution_formatted = {
-        'labels': [item['fault_type'] for item in fault_distribution_data],
+        'labels': [item['category'] for item in fault_distribution_data],
         'data': [item['count'] for item in fault_distribution_data],
         'title': 'Fault Type Distribution',
         'type': 'pie'
     }
     
     # Resource Request Trend
-    resource_trend_data = list(
-        ResourceRequest.objects
-        .filter(requested_at__gte=six_months_ago)
-        .annotate(month=TruncMonth("requested_at"))
-        .values("month")
-        .annotate(count=Count("resource_id"))
-        .order_by("month")
-    )
+    resource_trend_data = facts.monthly_counts('resource', since=six_months_ago)
     
     resource_trend_formatted = {
         'labels': [item['month'].strftime('%b %Y') for item in resource_trend_data],
@@ -194,21 +146,15 @@ def get_chart_data():
         'resource_trend': resource_trend_formatted,
         'system_status': system_status_formatted,
     }
-    
-    # Cache for 10 minutes
-    cache.set(cache_key, chart_data, 600)
     return chart_data
 
 def get_recent_activity():
     """
     Get recent activity data for the dashboard
     """
-    cache_key = 'recent_activity'
-    cached_data = cache.get(cache_key)
-    
-    if cached_data:
-        return cached_data
-    
+    return get_or_revalidate(RECENT_ACTIVITY_KEY, compute_recent_activity, RECENT_ACTIVITY_TTL)
+
+def compute_recent_activity():
     # Get recent fault reports
     recent_faults = FaultReport.objects.filter(
         reported_at__gte=now() - timedelta(hours=24)
@@ -246,9 +192,6 @@ def get_recent_activity():
     # Sort by timestamp and limit to 10
     activities.sort(key=lambda x: x['timestamp'], reverse=True)
     activities = activities[:10]
-    
-    # Cache for 2 minutes
-    cache.set(cache_key, activities, 120)
     return activities
 
 def get_time_ago(timestamp):
@@ -271,7 +214,9 @@ def get_time_ago(timestamp):
 @login_required(login_url="/login/")
 def dashboard_api(request):
     """
-    API endpoint for AJAX requests (reduced functionality)
+    API endpoint for AJAX requests (reduced functionality).
+    Polling fallback for the ws/dashboard/ push channel: responses carry an
+    ETag of the data, and If-None-Match gets a bodyless 304 when unchanged.
     """
     try:
         action = request.GET.get('action', 'metrics')
@@ -282,14 +227,33 @@ def dashboard_api(request):
             data = get_chart_data()
         elif action == 'activity':
             data = get_recent_activity()
+        elif action == 'sla':
+            # MTTR and backlog per lab, or per system of ?lab=
+            lab_id = request.GET.get('lab') or None
+            if lab_id is not None:
+                if not lab_id.isdigit():
+                    return JsonResponse({'error': 'Invalid lab'}, status=400)
+                lab_id = int(lab_id)
+            data = sla_summary(lab_id)
         else:
             return JsonResponse({'error': 'Invalid action'}, status=400)
-        
-        return JsonResponse({
+
+        etag = quote_etag(hashlib.md5(
+            json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder).encode()
+        ).hexdigest())
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        response = JsonResponse({
             'success': True,
             'data': data,
             'timestamp': now().isoformat()
         })
+        response['ETag'] = etag
+        # Let the browser keep the copy but always revalidate it
+        response['Cache-Control'] = 'private, no-cache'
+        return response
         
     except Exception as e:
         logger.error(f"Dashboard API error: {str(e)}")
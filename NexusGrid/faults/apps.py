@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class FaultsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'faults'
+
+    def ready(self):
+        from . import duplicates, search
+        search.connect_signals()
+        duplicates.connect_signals()
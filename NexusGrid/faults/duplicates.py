@@ -0,0 +1,208 @@
+"""
+Near-duplicate detection for new fault reports.
+
+A report's description is cut into overlapping character shingles and
+summarised by a MinHash signature (FaultReport.fingerprint) of NUM_HASHES
+minimums; the share of positions on which two signatures agree estimates
+the Jaccard similarity of the two shingle sets. The signature is split into
+BANDS bands of ROWS values, and each band is hashed into a FaultBand row
+under the report's system. Two reports s alike share a band with
+probability 1 - (1 - s ** ROWS) ** BANDS, so a new report's candidates come
+from one lookup per band on the (system, band) index, however many reports
+the system has; they are then checked against their full signatures. The
+bands are sized for the default FAULT_DUPLICATE_THRESHOLD of 0.5: a pair at
+the threshold is a candidate 99% of the time (16 bands of 2), where 8 bands
+of 4 would find it only 40% of the time. A much lower threshold needs more,
+narrower bands.
+
+file_report() folds a submission that matches an open report of the same
+system (and so the same lab) filed within FAULT_DUPLICATE_WINDOW_HOURS into
+that report's duplicate_count, instead of filing another report.
+
+Bands are written by a post_save handler when a report is created or its
+description or system changes. bulk_create() and queryset.update() skip it;
+run `manage.py rebuild_fault_bands` after writing reports that way.
+"""
+import hashlib
+import random
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, pre_save
+from django.utils import timezone
+
+from system_layout.models import System
+
+from .models import FaultBand, FaultReport
+
+SHINGLE_SIZE = 4
+# Changing these needs `manage.py rebuild_fault_bands`
+BANDS = 16
+ROWS = 2
+NUM_HASHES = BANDS * ROWS
+
+# Hash family (a * x + b) mod PRIME; fixed seed, as stored signatures depend on it
+PRIME = (1 << 61) - 1
+_random = random.Random(61)
+PERMUTATIONS = [(_random.randrange(1, PRIME), _random.randrange(PRIME)) for _ in range(NUM_HASHES)]
+
+CHUNK_SIZE = 1000
+
+WORD = re.compile(r'\w+')
+
+
+def window():
+    return timedelta(hours=getattr(settings, 'FAULT_DUPLICATE_WINDOW_HOURS', 72))
+
+
+def threshold():
+    return getattr(settings, 'FAULT_DUPLICATE_THRESHOLD', 0.5)
+
+
+def _hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), 'big')
+
+
+def shingles(text):
+    text = ' '.join(WORD.findall(text.lower()))
+    if len(text) <= SHINGLE_SIZE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def fingerprint(text):
+    """
+    The MinHash signature of `text`: NUM_HASHES ints, or [] if it has no words.
+    """
+    hashes = [_hash64(shingle) % PRIME for shingle in shingles(text or '')]
+    if not hashes:
+        return []
+    return [min((a * value + b) % PRIME for value in hashes) for a, b in PERMUTATIONS]
+
+
+def band_keys(signature):
+    """
+    One signed 64-bit key per band of `signature`, which also encodes the
+    band's position.
+    """
+    if len(signature) != NUM_HASHES:
+        return []
+    keys = []
+    for band in range(BANDS):
+        rows = ','.join(str(value) for value in signature[band * ROWS:(band + 1) * ROWS])
+        digest = hashlib.blake2b(f'{band}:{rows}'.encode(), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'big', signed=True))
+    return keys
+
+
+def similarity(signature, other):
+    if len(signature) != NUM_HASHES or len(other) != NUM_HASHES:
+        return 0.0
+    return sum(a == b for a, b in zip(signature, other)) / NUM_HASHES
+
+
+def find_duplicate(system_id, signature):
+    """
+    The id of the open report of `system_id`, filed within the window, most
+    like `signature` (the oldest on a tie), or None if none reaches the
+    threshold.
+    """
+    keys = band_keys(signature)
+    if not keys:
+        return None
+    candidates = dict(
+        FaultBand.objects.filter(
+            system_id=system_id,
+            band__in=keys,
+            report__status__in=FaultReport.OPEN_STATUSES,
+            report__reported_at__gte=timezone.now() - window(),
+        ).values_list('report_id', 'report__fingerprint')
+    )
+    scored = [(similarity(signature, other), -report_id) for report_id, other in candidates.items()]
+    scored = [match for match in scored if match[0] >= threshold()]
+    return -max(scored)[1] if scored else None
+
+
+def file_report(system_id, user, fault_type, description):
+    """
+    File a fault report, or fold it into an open near-duplicate. Returns
+    (report, created); when created is False, report is the existing one,
+    whose duplicate_count has been raised.
+    """
+    signature = fingerprint(description)
+    with transaction.atomic():
+        # Submissions for one system take turns, so two copies can't both be filed
+        System.objects.select_for_update().only('pk').get(pk=system_id)
+        duplicate_id = find_duplicate(system_id, signature)
+        if duplicate_id is not None:
+            FaultReport.objects.filter(pk=duplicate_id).update(duplicate_count=F('duplicate_count') + 1)
+            return FaultReport.objects.get(pk=duplicate_id), False
+        report = FaultReport.objects.create(
+            system_name_id=system_id,
+            reported_by=user,
+            fault_type=fault_type,
+            description=description,
+            fingerprint=signature,
+        )
+    return report, True
+
+
+def write_bands(reports):
+    """
+    Replace the FaultBand rows of `reports` (with fingerprints set).
+    """
+    reports = list(reports)
+    FaultBand.objects.filter(report_id__in=[report.pk for report in reports]).delete()
+    FaultBand.objects.bulk_create(
+        [
+            FaultBand(report_id=report.pk, system_id=report.system_name_id, band=key)
+            for report in reports
+            for key in band_keys(report.fingerprint)
+        ],
+        batch_size=CHUNK_SIZE,
+    )
+
+
+def rebuild_bands():
+    """
+    Recompute every report's fingerprint and bands; returns how many reports
+    there are.
+    """
+    FaultBand.objects.all().delete()
+    fault_ids = list(FaultReport.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(fault_ids), CHUNK_SIZE):
+        reports = list(
+            FaultReport.objects.filter(pk__in=fault_ids[start:start + CHUNK_SIZE])
+            .only('pk', 'system_name_id', 'description', 'fingerprint')
+        )
+        for report in reports:
+            report.fingerprint = fingerprint(report.description)
+        with transaction.atomic():
+            FaultReport.objects.bulk_update(reports, ['fingerprint'])
+            write_bands(reports)
+    return len(fault_ids)
+
+
+def _remember(sender, instance, raw=False, **kwargs):
+    stored = None
+    if not instance._state.adding and instance.pk is not None:
+        stored = FaultReport.objects.filter(pk=instance.pk).values_list('description', 'system_name_id').first()
+    instance._band_state = stored
+    if raw:
+        return
+    if not instance.fingerprint or (stored and stored[0] != instance.description):
+        instance.fingerprint = fingerprint(instance.description)
+
+
+def _saved(sender, instance, created, **kwargs):
+    if not created and getattr(instance, '_band_state', None) == (instance.description, instance.system_name_id):
+        return
+    write_bands([instance])
+
+
+def connect_signals():
+    pre_save.connect(_remember, sender=FaultReport, dispatch_uid='fault_duplicates_FaultReport')
+    post_save.connect(_saved, sender=FaultReport, dispatch_uid='fault_duplicates_FaultReport')
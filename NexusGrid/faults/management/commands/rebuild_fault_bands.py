@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from faults.duplicates import rebuild_bands
+
+
+class Command(BaseCommand):
+    help = "Recompute the duplicate-detection fingerprints and bands of every fault report."
+
+    def handle(self, *args, **options):
+        count = rebuild_bands()
+        self.stdout.write(self.style.SUCCESS(f"Fingerprinted {count} fault reports."))
@@ -0,0 +1,71 @@
+"""
+Full-text search documents for fault reports (see faults.search).
+
+PostgreSQL gets a tsvector column with a GIN index, SQLite an FTS5 table
+keyed by fault_id. Both are filled from the existing reports. Other
+backends get nothing and search with icontains.
+"""
+from django.db import migrations
+
+REPORT_TABLE = 'faults_faultreport'
+FTS_TABLE = 'faults_faultreport_fts'
+INDEX = 'faults_faultreport_search_idx'
+
+
+def _words(column):
+    return f"to_tsvector('english', regexp_replace(coalesce({column}, ''), '[^[:alnum:]_]+', ' ', 'g'))"
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f"ALTER TABLE {REPORT_TABLE} ADD COLUMN search_vector tsvector")
+            cursor.execute(
+                f"""
+                UPDATE {REPORT_TABLE} AS f SET search_vector =
+                    setweight({_words('s.host_name')}, 'A') ||
+                    setweight({_words('l.lab_name')}, 'A') ||
+                    setweight({_words('f.fault_type')}, 'B') ||
+                    setweight({_words('f.description')}, 'C')
+                FROM system_layout_system s LEFT JOIN system_layout_lab l ON l.id = s.lab_id
+                WHERE s.id = f.system_name_id
+                """
+            )
+            cursor.execute(f"CREATE INDEX {INDEX} ON {REPORT_TABLE} USING gin (search_vector)")
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                f"host_name, lab_name, fault_type, description, tokenize = 'porter unicode61')"
+            )
+            cursor.execute(
+                f"""
+                INSERT INTO {FTS_TABLE} (rowid, host_name, lab_name, fault_type, description)
+                SELECT f.fault_id, coalesce(s.host_name, ''), coalesce(l.lab_name, ''), f.fault_type, f.description
+                FROM {REPORT_TABLE} f
+                JOIN system_layout_system s ON s.id = f.system_name_id
+                LEFT JOIN system_layout_lab l ON l.id = s.lab_id
+                """
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f"DROP INDEX IF EXISTS {INDEX}")
+            cursor.execute(f"ALTER TABLE {REPORT_TABLE} DROP COLUMN IF EXISTS search_vector")
+        elif connection.vendor == 'sqlite':
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('faults', '0002_initial'),
+        ('system_layout', '0015_layout_item_placement'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
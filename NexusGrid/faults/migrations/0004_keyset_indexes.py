@@ -0,0 +1,29 @@
+# Generated by Django 5.2.3 on 2026-10-18 14:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('faults', '0003_fault_search'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='faultreport',
+            name='faults_faul_status_a7915e_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='faultreport',
+            name='faults_faul_reporte_9634de_idx',
+        ),
+        migrations.AddIndex(
+            model_name='faultreport',
+            index=models.Index(fields=['reported_at', 'fault_id'], name='faults_faul_reporte_5cd6e6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='faultreport',
+            index=models.Index(fields=['status', 'reported_at', 'fault_id'], name='faults_faul_status_cc811b_idx'),
+        ),
+    ]
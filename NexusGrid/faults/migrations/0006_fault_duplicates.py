@@ -0,0 +1,56 @@
+# Generated by Django 5.2.3 on 2026-10-18 15:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from faults.duplicates import CHUNK_SIZE, band_keys, fingerprint
+
+
+def fingerprint_reports(apps, schema_editor):
+    FaultReport = apps.get_model('faults', 'FaultReport')
+    FaultBand = apps.get_model('faults', 'FaultBand')
+    fault_ids = list(FaultReport.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(fault_ids), CHUNK_SIZE):
+        reports = list(FaultReport.objects.filter(pk__in=fault_ids[start:start + CHUNK_SIZE]))
+        for report in reports:
+            report.fingerprint = fingerprint(report.description)
+        FaultReport.objects.bulk_update(reports, ['fingerprint'])
+        FaultBand.objects.bulk_create([
+            FaultBand(report_id=report.pk, system_id=report.system_name_id, band=key)
+            for report in reports
+            for key in band_keys(report.fingerprint)
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('faults', '0005_fault_assignee'),
+        ('system_layout', '0015_layout_item_placement'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='faultreport',
+            name='duplicate_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='faultreport',
+            name='fingerprint',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.CreateModel(
+            name='FaultBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.BigIntegerField()),
+                ('report', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bands', to='faults.faultreport')),
+                ('system', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='system_layout.system')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['system', 'band'], name='faults_faul_system__2728df_idx')],
+            },
+        ),
+        migrations.RunPython(fingerprint_reports, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.3 on 2026-10-18 15:07
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+def record_history(apps, schema_editor):
+    """
+    Start each report's history from what is known: its filing, and for a
+    resolved report with a resolution summary, an open -> resolved change at
+    resolved_at. Other statuses are recorded as filed that way, since when
+    they were set is unknown.
+    """
+    FaultReport = apps.get_model('faults', 'FaultReport')
+    FaultStatusChange = apps.get_model('faults', 'FaultStatusChange')
+    Resolved = apps.get_model('faults', 'Resolved')
+    resolutions = {
+        fault_id: (resolved_at, user_id)
+        for fault_id, resolved_at, user_id in Resolved.objects.values_list(
+            'fault_report_id', 'resolved_at', 'resolved_by_id'
+        )
+    }
+    rows = []
+    reports = FaultReport.objects.values_list('pk', 'status', 'reported_at', 'reported_by_id')
+    for fault_id, status, reported_at, user_id in reports.iterator(chunk_size=2000):
+        resolution = resolutions.get(fault_id) if status == 'resolved' else None
+        if resolution and resolution[0] >= reported_at:
+            rows.append(FaultStatusChange(
+                fault_report_id=fault_id, to_status='unaddressed', changed_at=reported_at, changed_by_id=user_id,
+            ))
+            rows.append(FaultStatusChange(
+                fault_report_id=fault_id, from_status='unaddressed', to_status='resolved',
+                changed_at=resolution[0], changed_by_id=resolution[1],
+            ))
+        else:
+            rows.append(FaultStatusChange(
+                fault_report_id=fault_id, to_status=status, changed_at=reported_at, changed_by_id=user_id,
+            ))
+    FaultStatusChange.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('faults', '0006_fault_duplicates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='faultreport',
+            name='opened_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='FaultStatusChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(blank=True, default='', max_length=30)),
+                ('to_status', models.CharField(max_length=30)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('changed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('fault_report', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_changes', to='faults.faultreport')),
+            ],
+            options={
+                'ordering': ['changed_at', 'id'],
+                'indexes': [models.Index(fields=['fault_report', 'changed_at'], name='faults_faul_fault_r_85092c_idx')],
+            },
+        ),
+        migrations.RunPython(record_history, migrations.RunPython.noop),
+    ]
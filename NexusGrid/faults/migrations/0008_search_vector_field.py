@@ -0,0 +1,46 @@
+"""
+Declare the search_vector column 0003 added on PostgreSQL as a model field,
+so faults.search can query it with django.contrib.postgres.search. Other
+backends get a plain nullable column that stays empty; they search FTS5 or
+with icontains as before.
+"""
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+def _column():
+    field = models.TextField(null=True)
+    field.set_attributes_from_name('search_vector')
+    return field
+
+
+def add_column(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.add_field(apps.get_model('faults', 'FaultReport'), _column())
+
+
+def remove_column(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.remove_field(apps.get_model('faults', 'FaultReport'), _column())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('faults', '0007_fault_status_history'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(add_column, remove_column),
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name='faultreport',
+                    name='search_vector',
+                    field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+                ),
+            ],
+        ),
+    ]
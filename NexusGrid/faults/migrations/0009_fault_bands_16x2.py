@@ -0,0 +1,34 @@
+"""
+Rewrite every FaultBand row for 16 bands of 2 rows. Fingerprints are
+unchanged (still 32 hashes); only how they are banded changed.
+"""
+from django.db import migrations
+
+from faults.duplicates import CHUNK_SIZE, band_keys
+
+
+def reband_reports(apps, schema_editor):
+    FaultReport = apps.get_model('faults', 'FaultReport')
+    FaultBand = apps.get_model('faults', 'FaultBand')
+    FaultBand.objects.all().delete()
+    fault_ids = list(FaultReport.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(fault_ids), CHUNK_SIZE):
+        reports = FaultReport.objects.filter(pk__in=fault_ids[start:start + CHUNK_SIZE]).values_list(
+            'pk', 'system_name_id', 'fingerprint'
+        )
+        FaultBand.objects.bulk_create([
+            FaultBand(report_id=fault_id, system_id=system_id, band=key)
+            for fault_id, system_id, signature in reports
+            for key in band_keys(signature)
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('faults', '0008_search_vector_field'),
+    ]
+
+    operations = [
+        migrations.RunPython(reband_reports, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
 from django.utils import timezone
 from login_manager.models import User
 from system_layout.models import System
@@ -11,6 +12,8 @@ class FaultReport(models.Model):
         ('resolved', 'Resolved'),
         ('ignored', 'Ignored'),
     ]
+    # Statuses that still need someone's attention
+    OPEN_STATUSES = ['unaddressed', 'in-progress', 'scheduled']
     FAULT_CHOICES = [
         ('Hardware', 'Hardware'),
         ('Software', 'Software'),
@@ -24,18 +27,79 @@ class FaultReport(models.Model):
     description = models.TextField()
     status = models.CharField(max_length=30, choices=STATUS_CHOICES, default='unaddressed')
     reported_at = models.DateTimeField(auto_now_add=True)
+    # Who is expected to resolve it
+    assigned_to = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='assigned_faults'
+    )
+    # Further submissions folded into this report as near-duplicates (see faults.duplicates)
+    duplicate_count = models.PositiveIntegerField(default=0)
+    # MinHash signature of the description
+    fingerprint = models.JSONField(default=list, blank=True, editable=False)
+    # When it last became open, if not when it was reported (see dashboard.repairs)
+    opened_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Full-text search document, GIN-indexed on PostgreSQL and kept by
+    # faults.search; other backends leave it empty
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         ordering = ['-reported_at']
         indexes = [
-            models.Index(fields=['status']),
-            models.Index(fields=['reported_at']),
+            # Keyset pagination orders by (reported_at, fault_id), optionally per status
+            models.Index(fields=['reported_at', 'fault_id']),
+            models.Index(fields=['status', 'reported_at', 'fault_id']),
             models.Index(fields=['system_name']),
         ]
 
     def __str__(self):
         return f"Fault {self.fault_id} - {self.system_name}"
 
+    def save(self, *args, **kwargs):
+        # Status changes adjust LayoutRollup.open_faults inside this transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+class FaultStatusChange(models.Model):
+    """
+    One status transition of a fault report. Rows are only ever added; a
+    report's first row, from '', is its filing.
+    """
+    fault_report = models.ForeignKey(FaultReport, on_delete=models.CASCADE, related_name='status_changes')
+    from_status = models.CharField(max_length=30, blank=True, default='')
+    to_status = models.CharField(max_length=30)
+    changed_at = models.DateTimeField(default=timezone.now)
+    changed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    class Meta:
+        ordering = ['changed_at', 'id']
+        indexes = [
+            models.Index(fields=['fault_report', 'changed_at']),
+        ]
+
+    def __str__(self):
+        return f"Fault {self.fault_report_id}: {self.from_status or '-'} -> {self.to_status}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Fault status history is append-only")
+        super().save(*args, **kwargs)
+
+class FaultBand(models.Model):
+    """
+    One LSH band of a report's fingerprint, keyed by its system so that a
+    new report's candidates are an index lookup per band.
+    """
+    report = models.ForeignKey(FaultReport, on_delete=models.CASCADE, related_name='bands')
+    system = models.ForeignKey(System, on_delete=models.CASCADE, related_name='+')
+    band = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['system', 'band']),
+        ]
+
+    def __str__(self):
+        return f"Band {self.band} of fault {self.report_id}"
+
 class Resolved(models.Model):
     fault_report = models.OneToOneField(FaultReport, on_delete=models.CASCADE)
     resolution_summary = models.TextField()
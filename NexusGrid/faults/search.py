@@ -0,0 +1,235 @@
+"""
+Full-text search over fault reports.
+
+A report is indexed under its system's host name and lab name (weighted
+highest), its fault type and its description. On PostgreSQL the document is
+FaultReport.search_vector, GIN-indexed, written and queried with
+django.contrib.postgres.search; on SQLite it is a row in an FTS5 table keyed
+by fault_id (see migration 0003). Other backends have no index and fall back
+to icontains.
+
+Signal handlers reindex a report when it is saved, and all of a system's
+or lab's reports when its host name, lab or lab name changes, with one
+set-based statement each. Code that deletes reports or moves systems
+without signals calls drop_reports() or index_systems() itself, or runs
+`manage.py rebuild_fault_search`.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, Func, OuterRef, Q, Subquery, TextField, Value
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from system_layout.models import Lab, System
+
+from .models import FaultReport
+
+REPORT_TABLE = FaultReport._meta.db_table
+FTS_TABLE = f'{REPORT_TABLE}_fts'
+SYSTEM_TABLE = System._meta.db_table
+LAB_TABLE = Lab._meta.db_table
+
+# PostgreSQL text search configuration, and FTS5 bm25 weights in column order
+CONFIG = 'english'
+FTS_WEIGHTS = '4.0, 4.0, 2.0, 1.0'
+
+CHUNK_SIZE = 1000
+
+WORD = re.compile(r'\w+')
+
+
+def backend():
+    if connection.vendor in ('postgresql', 'sqlite'):
+        return connection.vendor
+    return None
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
+
+
+class _Words(Func):
+    """
+    The text with runs of punctuation replaced by spaces. The default parser
+    would read "pc-03-12" as "pc", "-03", "-12", which no query built from
+    WORD can match.
+    """
+    function = 'REGEXP_REPLACE'
+    template = "%(function)s(%(expressions)s, '[^[:alnum:]_]+', ' ', 'g')"
+    output_field = TextField()
+
+
+def _document():
+    """
+    A report's weighted search document, as an expression over its row.
+    """
+    system = System.objects.filter(pk=OuterRef('system_name_id'))
+    return (
+        SearchVector(_Words(Subquery(system.values('host_name')[:1])), config=CONFIG, weight='A')
+        + SearchVector(_Words(Subquery(system.values('lab__lab_name')[:1])), config=CONFIG, weight='A')
+        + SearchVector(_Words('fault_type'), config=CONFIG, weight='B')
+        + SearchVector(_Words('description'), config=CONFIG, weight='C')
+    )
+
+
+# The reports to reindex, by ORM lookup and by column in the FTS5 statements
+SCOPES = {
+    'pk': 'f.fault_id',
+    'system_name_id': 'f.system_name_id',
+    'system_name__lab_id': 's.lab_id',
+}
+
+
+def _reindex(scope, ids):
+    """
+    Rewrite the search documents of the reports whose `scope` (a key of
+    SCOPES) is in `ids`.
+    """
+    engine = backend()
+    if engine == 'postgresql':
+        for chunk in _chunks(ids):
+            FaultReport.objects.filter(**{f'{scope}__in': chunk}).update(search_vector=_document())
+        return
+    if engine is None:
+        return
+
+    column = SCOPES[scope]
+    joins = (
+        f'JOIN {SYSTEM_TABLE} s ON s.id = f.system_name_id '
+        f'LEFT JOIN {LAB_TABLE} l ON l.id = s.lab_id'
+    )
+    with connection.cursor() as cursor:
+        for chunk in _chunks(ids):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid IN "
+                f"(SELECT f.fault_id FROM {REPORT_TABLE} f {joins} WHERE {column} IN ({placeholders}))",
+                chunk,
+            )
+            cursor.execute(
+                f"""
+                INSERT INTO {FTS_TABLE} (rowid, host_name, lab_name, fault_type, description)
+                SELECT f.fault_id, coalesce(s.host_name, ''), coalesce(l.lab_name, ''), f.fault_type, f.description
+                FROM {REPORT_TABLE} f {joins}
+                WHERE {column} IN ({placeholders})
+                """,
+                chunk,
+            )
+
+
+def index_reports(fault_ids):
+    _reindex('pk', fault_ids)
+
+
+def index_systems(system_ids):
+    _reindex('system_name_id', system_ids)
+
+
+def index_labs(lab_ids):
+    _reindex('system_name__lab_id', lab_ids)
+
+
+def drop_reports(fault_ids):
+    """
+    Remove deleted reports' documents. A PostgreSQL document goes with its
+    row; FTS5 rows have to be deleted.
+    """
+    if backend() != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for chunk in _chunks(fault_ids):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", chunk)
+
+
+def rebuild_index():
+    """
+    Reindex every report; returns how many there are.
+    """
+    if backend() == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+    fault_ids = list(FaultReport.objects.values_list('pk', flat=True))
+    index_reports(fault_ids)
+    return len(fault_ids)
+
+
+def _contains(queryset, text):
+    # No ranking without an index: every match ranks the same
+    return queryset.annotate(rank=Value(0.0)).filter(
+        Q(system_name__host_name__icontains=text) |
+        Q(system_name__lab__lab_name__icontains=text) |
+        Q(fault_type__icontains=text) |
+        Q(description__icontains=text)
+    )
+
+
+def search(queryset, text):
+    """
+    `queryset` narrowed to the reports matching every word of `text` (each
+    as a prefix, so partly typed words match), annotated with `rank`:
+    higher is more relevant.
+    """
+    words = WORD.findall(text.lower())
+    engine = backend()
+    if engine is None or not words:
+        return _contains(queryset, text)
+
+    if engine == 'postgresql':
+        query = SearchQuery(' & '.join(f'{word}:*' for word in words), config=CONFIG, search_type='raw')
+        return queryset.filter(search_vector=query).annotate(rank=SearchRank(F('search_vector'), query))
+
+    # FTS5 has no ORM support: join its table by rowid
+    query = ' '.join(f'"{word}"*' for word in words)
+    return queryset.extra(
+        select={'rank': f'-bm25({FTS_TABLE}, {FTS_WEIGHTS})'},
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = {REPORT_TABLE}.fault_id', f'{FTS_TABLE} MATCH %s'],
+        params=[query],
+    )
+
+
+def _report_saved(sender, instance, **kwargs):
+    index_reports([instance.pk])
+
+
+def _report_deleted(sender, instance, **kwargs):
+    drop_reports([instance.pk])
+
+
+def _previous(model, instance, fields):
+    if instance._state.adding or instance.pk is None:
+        return None
+    return model.objects.filter(pk=instance.pk).values_list(*fields).first()
+
+
+def _remember_system(sender, instance, **kwargs):
+    instance._search_state = _previous(System, instance, ['host_name', 'lab_id'])
+
+
+def _system_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_search_state', None)
+    if previous is not None and previous != (instance.host_name, instance.lab_id):
+        index_systems([instance.pk])
+
+
+def _remember_lab(sender, instance, **kwargs):
+    instance._search_state = _previous(Lab, instance, ['lab_name'])
+
+
+def _lab_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_search_state', None)
+    if previous is not None and previous != (instance.lab_name,):
+        index_labs([instance.pk])
+
+
+def connect_signals():
+    post_save.connect(_report_saved, sender=FaultReport, dispatch_uid='fault_search_FaultReport')
+    post_delete.connect(_report_deleted, sender=FaultReport, dispatch_uid='fault_search_FaultReport')
+    pre_save.connect(_remember_system, sender=System, dispatch_uid='fault_search_System')
+    post_save.connect(_system_saved, sender=System, dispatch_uid='fault_search_System')
+    pre_save.connect(_remember_lab, sender=Lab, dispatch_uid='fault_search_Lab')
+    post_save.connect(_lab_saved, sender=Lab, dispatch_uid='fault_search_Lab')
@@ -1,3 +1,320 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
 
-# Create your tests here.
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from login_manager.models import User
+from NexusGrid.pagination import InvalidCursor, paginate
+from system_layout.models import Lab, LayoutItem, System
+
+from .duplicates import BANDS, file_report, fingerprint, similarity
+from .models import FaultReport, FaultStatusChange
+from .search import rebuild_index, search
+from .triage import TriageError, triage
+
+
+def _lab(name):
+    floor = LayoutItem.objects.create(name=f'{name} floor', item_type='floor')
+    room = LayoutItem.objects.create(name=name, item_type='room', parent=floor)
+    return Lab.objects.create(layout_item=room, lab_name=name)
+
+
+def _system(lab, host_name):
+    item = LayoutItem.objects.create(name=host_name, item_type='computer', parent=lab.layout_item)
+    return System.objects.create(layout_item=item, lab=lab, host_name=host_name)
+
+
+class SearchTests(TestCase):
+    """
+    faults.search on the test database's backend: FTS5 on SQLite, the
+    search_vector column on PostgreSQL.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='staff', email='staff@example.com', password='x')
+        cls.chemistry = _lab('Chemistry')
+        cls.physics = _lab('Physics')
+        cls.pc1 = _system(cls.chemistry, 'chem-pc-01')
+        cls.pc2 = _system(cls.physics, 'phys-pc-02')
+        cls.projector = cls.report(cls.pc1, 'Projector flickers during lectures')
+        cls.keyboard = cls.report(cls.pc2, 'Keyboard missing keys', fault_type='Peripheral')
+        cls.mentions_chem = cls.report(cls.pc2, 'Borrowed the chem cable', fault_type='Network')
+
+    @classmethod
+    def report(cls, system, description, fault_type='Hardware'):
+        return FaultReport.objects.create(
+            system_name=system, reported_by=cls.user, fault_type=fault_type, description=description,
+        )
+
+    def found(self, text):
+        return list(search(FaultReport.objects.all(), text).order_by('-rank', 'pk'))
+
+    def test_words_match_as_prefixes(self):
+        self.assertEqual(self.found('proj'), [self.projector])
+        self.assertEqual(self.found('keyb miss'), [self.keyboard])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.found('keyboard projector'), [])
+
+    def test_host_and_lab_names_match(self):
+        self.assertEqual(self.found('phys-pc-02'), [self.keyboard, self.mentions_chem])
+        self.assertEqual(self.found('physics'), [self.keyboard, self.mentions_chem])
+        self.assertEqual(self.found('periph'), [self.keyboard])
+
+    def test_host_match_outranks_description_match(self):
+        self.assertEqual(self.found('chem'), [self.projector, self.mentions_chem])
+
+    def test_lab_rename_reindexes_its_reports(self):
+        self.chemistry.lab_name = 'Biology'
+        self.chemistry.save()
+
+        self.assertEqual(self.found('biology'), [self.projector])
+        self.assertEqual(self.found('chemistry'), [])
+
+    def test_host_rename_reindexes_its_reports(self):
+        self.pc2.host_name = 'lab-spare'
+        self.pc2.save()
+
+        self.assertEqual(self.found('spare'), [self.keyboard, self.mentions_chem])
+        self.assertEqual(self.found('phys'), [self.keyboard, self.mentions_chem])
+        self.assertEqual(self.found('phys pc'), [])
+
+    def test_edited_report_is_reindexed(self):
+        self.keyboard.description = 'Mouse wheel stuck'
+        self.keyboard.save()
+
+        self.assertEqual(self.found('wheel'), [self.keyboard])
+        self.assertEqual(self.found('keyboard'), [])
+
+    def test_deleted_report_is_dropped(self):
+        self.projector.delete()
+
+        self.assertEqual(self.found('projector'), [])
+        self.assertEqual(self.found('chem'), [self.mentions_chem])
+
+    def test_rebuild_matches_the_kept_index(self):
+        kept = {text: self.found(text) for text in ['chem', 'keyb', 'physics', 'lectures']}
+        self.assertEqual(rebuild_index(), 3)
+        self.assertEqual({text: self.found(text) for text in kept}, kept)
+
+
+class PaginationTests(TestCase):
+    keys = ['-reported_at', '-fault_id']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='staff', email='staff@example.com', password='x')
+        cls.system = _system(_lab('Chemistry'), 'chem-pc-01')
+        cls.filed = timezone.now() - timedelta(days=1)
+        for i in range(25):
+            cls.report(f'Fault {i}')
+        # Every report ties on reported_at; fault_id alone orders them
+        FaultReport.objects.update(reported_at=cls.filed)
+
+    @classmethod
+    def report(cls, description):
+        return FaultReport.objects.create(
+            system_name=cls.system, reported_by=cls.user, fault_type='Hardware', description=description,
+        )
+
+    def page(self, cursor=None):
+        return paginate(FaultReport.objects.all(), cursor, QueryDict(), self.keys)
+
+    def ids(self, page):
+        return [report.pk for report in page.object_list]
+
+    def test_ties_on_the_sort_key_page_through_once_each_way(self):
+        expected = list(FaultReport.objects.order_by('-fault_id').values_list('pk', flat=True))
+
+        pages = [self.page()]
+        while pages[-1].has_next:
+            pages.append(self.page(pages[-1].next_cursor))
+        self.assertEqual([len(page.object_list) for page in pages], [10, 10, 5])
+        self.assertEqual([pk for page in pages for pk in self.ids(page)], expected)
+
+        backwards = [pages[-1]]
+        while backwards[-1].has_previous:
+            backwards.append(self.page(backwards[-1].previous_cursor))
+        self.assertEqual([self.ids(page) for page in backwards[1:]], [self.ids(pages[1]), self.ids(pages[0])])
+
+    def test_rows_inserted_between_pages_neither_repeat_nor_skip(self):
+        first = self.page()
+        newer = self.report('Filed while paging')
+        older = self.report('Backfilled')
+        FaultReport.objects.filter(pk=older.pk).update(reported_at=self.filed - timedelta(hours=1))
+
+        seen = self.ids(first)
+        page = first
+        while page.has_next:
+            page = self.page(page.next_cursor)
+            seen += self.ids(page)
+
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertNotIn(newer.pk, seen)
+        self.assertEqual(set(seen), set(FaultReport.objects.exclude(pk=newer.pk).values_list('pk', flat=True)))
+        self.assertEqual(seen[-1], older.pk)
+
+    def test_tampered_cursor_is_rejected(self):
+        cursor = self.page().next_cursor
+        with self.assertRaises(InvalidCursor):
+            self.page(cursor[:-1] + ('A' if cursor[-1] != 'A' else 'B'))
+
+    @override_settings(COMPRESS_ENABLED=False, COMPRESS_OFFLINE=False)
+    def test_fault_list_answers_a_tampered_cursor_with_400(self):
+        self.client.force_login(self.user)
+        cursor = self.page().next_cursor
+
+        self.assertEqual(self.client.get(reverse('fault_reports'), {'cursor': cursor}).status_code, 200)
+        response = self.client.get(reverse('fault_reports'), {'cursor': cursor + 'x'})
+        self.assertEqual(response.status_code, 400)
+
+
+class TriageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='staff', email='staff@example.com', password='x')
+        cls.technician = User.objects.create_user(username='tech', email='tech@example.com', password='x')
+        system = _system(_lab('Chemistry'), 'chem-pc-01')
+        cls.reports = [
+            FaultReport.objects.create(
+                system_name=system, reported_by=cls.user, fault_type='Hardware', description=f'Fault {i}',
+                status=status, assigned_to=assignee,
+            )
+            for i, (status, assignee) in enumerate([
+                ('unaddressed', None), ('resolved', cls.technician), ('in-progress', None), ('resolved', None),
+            ])
+        ]
+        cls.ids = [report.pk for report in cls.reports]
+
+    def history(self):
+        return {
+            report.pk: list(report.status_changes.order_by('changed_at', 'id').values_list('from_status', 'to_status'))
+            for report in self.reports
+        }
+
+    def test_mixed_selection_changes_only_the_rows_that_differ(self):
+        before = self.history()
+        recorded = FaultStatusChange.objects.count()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            changed = triage(self.ids, self.user, status='resolved', assignee=self.technician)
+
+        self.assertEqual(changed, {'selected': 4, 'status': 2, 'assigned': 3, 'resolved': 0})
+        self.assertEqual(
+            set(FaultReport.objects.filter(pk__in=self.ids).values_list('status', 'assigned_to')),
+            {('resolved', self.technician.pk)},
+        )
+        after = self.history()
+        for report, old_status in zip(self.reports, ['unaddressed', 'resolved', 'in-progress', 'resolved']):
+            added = [(old_status, 'resolved')] if old_status != 'resolved' else []
+            self.assertEqual(after[report.pk], before[report.pk] + added)
+        self.assertEqual(FaultStatusChange.objects.count(), recorded + 2)
+
+    def test_empty_selection_is_rejected(self):
+        with self.assertRaisesMessage(TriageError, 'No fault reports selected'):
+            triage([], self.user, status='resolved')
+        with self.assertRaisesMessage(TriageError, 'No fault reports selected'):
+            triage([max(self.ids) + 1], self.user, status='resolved')
+
+    @override_settings(FAULT_TRIAGE_MAX_SELECTION=3)
+    def test_oversized_selection_is_rejected(self):
+        before = self.history()
+
+        with self.assertRaisesMessage(TriageError, 'at most 3'):
+            triage(self.ids, self.user, status='ignored')
+
+        self.assertFalse(FaultReport.objects.filter(status='ignored').exists())
+        self.assertEqual(self.history(), before)
+        # Duplicate ids count once
+        self.assertEqual(triage(self.ids[:3] * 2, self.user, status='ignored')['status'], 3)
+
+
+    def test_students_cannot_be_assigned(self):
+        student = User.objects.create_user(username='student', email='student@example.com', password='x', role='Students')
+        self.client.force_login(self.user)
+
+        def assign(user):
+            return self.client.post(
+                reverse('bulk_update_faults'), json.dumps({'fault_ids': self.ids[:1], 'assigned_to': user.pk}),
+                content_type='application/json',
+            ).json()
+
+        self.assertEqual(assign(student), {'success': False, 'message': 'Assignee not found'})
+        self.assertIsNone(FaultReport.objects.get(pk=self.ids[0]).assigned_to)
+        self.assertTrue(assign(self.technician)['success'])
+        self.assertEqual(FaultReport.objects.get(pk=self.ids[0]).assigned_to, self.technician)
+
+
+class DuplicateTests(TestCase):
+    description = 'Projector is not turning on, lamp blinking red.'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='staff', email='staff@example.com', password='x')
+        lab = _lab('Chemistry')
+        cls.pc1 = _system(lab, 'chem-pc-01')
+        cls.pc2 = _system(lab, 'chem-pc-02')
+
+    def file(self, description, system=None):
+        return file_report((system or self.pc1).pk, self.user, 'Hardware', description)
+
+    def test_near_duplicate_within_the_window_is_folded_in(self):
+        original, created = self.file(self.description)
+        self.assertTrue(created)
+
+        # Punctuation and case only, then a slightly reworded copy
+        for text in [
+            'projector is NOT turning on -- lamp blinking red',
+            'The projector is not turning on, lamp blinking red',
+        ]:
+            report, created = self.file(text)
+            self.assertFalse(created)
+            self.assertEqual(report.pk, original.pk)
+
+        self.assertEqual(FaultReport.objects.get().duplicate_count, 2)
+
+    def test_same_text_outside_the_window_is_filed(self):
+        original, _ = self.file(self.description)
+        FaultReport.objects.filter(pk=original.pk).update(reported_at=timezone.now() - timedelta(hours=73))
+
+        report, created = self.file(self.description)
+
+        self.assertTrue(created)
+        self.assertNotEqual(report.pk, original.pk)
+        self.assertEqual(FaultReport.objects.get(pk=original.pk).duplicate_count, 0)
+
+    @override_settings(FAULT_DUPLICATE_WINDOW_HOURS=200)
+    def test_window_follows_the_setting(self):
+        original, _ = self.file(self.description)
+        FaultReport.objects.filter(pk=original.pk).update(reported_at=timezone.now() - timedelta(hours=73))
+
+        self.assertEqual(self.file(self.description), (original, False))
+
+    def test_text_exactly_at_the_threshold_is_folded_in(self):
+        original, _ = self.file('Mouse is broken, left click does not work')
+        rewording = 'left click on the mouse is broken'
+        self.assertEqual(similarity(original.fingerprint, fingerprint(rewording)), 0.5)
+        self.assertEqual(original.bands.count(), BANDS)
+
+        self.assertEqual(self.file(rewording), (original, False))
+        with self.settings(FAULT_DUPLICATE_THRESHOLD=0.55):
+            self.assertTrue(self.file(rewording)[1])
+
+    def test_text_below_the_threshold_is_filed(self):
+        self.file(self.description)
+
+        _, created = self.file('Projector wont turn on')
+        self.assertTrue(created)
+        _, created = self.file('Keyboard missing keys')
+        self.assertTrue(created)
+
+    def test_other_systems_and_closed_reports_are_not_matched(self):
+        original, _ = self.file(self.description)
+
+        self.assertTrue(self.file(self.description, self.pc2)[1])
+        FaultReport.objects.filter(pk=original.pk).update(status='resolved')
+        self.assertTrue(self.file(self.description)[1])
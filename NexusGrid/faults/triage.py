@@ -0,0 +1,116 @@
+"""
+Bulk triage of fault reports.
+
+Changing the status of, assigning, or resolving many reports one save() at
+a time runs every signal handler once per report. triage() instead locks
+the selected rows and changes them with one UPDATE per field, in one
+transaction. It does the signal handlers' work itself, once for the batch:
+the reports' ReportDailyCount rows are moved to the new status, their
+status history and repair stats are recorded, the open fault counts of
+their LayoutRollups are adjusted with one UPDATE per distinct delta
+(dropping the cached layout stats once) and the dashboard is told once the
+transaction commits. Neither the status nor the assignee is part of a
+report's search document, so the search index is left alone.
+
+A selection is capped at FAULT_TRIAGE_MAX_SELECTION reports, so one request
+can't hold row locks on the whole table.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from dashboard.facts import restatus_reports
+from dashboard.live import notify_dashboard_changed
+from dashboard.repairs import record_status_changes
+from login_manager.models import User
+from system_layout.rollups import apply_item_deltas
+
+from .models import FaultReport, Resolved
+
+RESOLVED = 'resolved'
+
+# Sentinel for "leave the assignee as it is"; None unassigns
+UNCHANGED = object()
+
+
+class TriageError(ValueError):
+    pass
+
+
+def assignable_users():
+    """
+    The users a report can be assigned to, as offered in the fault list.
+    """
+    return User.objects.filter(is_active=True).exclude(role='Students')
+
+
+def _set_status(reports, status, user):
+    """
+    Move `reports` (a locked queryset) to `status`; returns how many changed.
+    """
+    changing = reports.exclude(status=status)
+    rows = list(changing.values_list('system_name__layout_item_id', 'status'))
+    if not rows:
+        return 0
+
+    now_open = status in FaultReport.OPEN_STATUSES
+    open_faults = Counter()
+    for item_id, old_status in rows:
+        was_open = old_status in FaultReport.OPEN_STATUSES
+        if was_open != now_open:
+            open_faults[item_id] += 1 if now_open else -1
+
+    restatus_reports(FaultReport, changing, status)
+    record_status_changes(changing, status, user)
+    apply_item_deltas({item_id: {'open_faults': delta} for item_id, delta in open_faults.items()})
+    return changing.update(status=status)
+
+
+def triage(fault_ids, user, status=None, assignee=UNCHANGED, summary=''):
+    """
+    Apply a status, an assignee and/or a resolution summary to the reports in
+    `fault_ids`. A summary is attached, as resolved by `user`, to each report
+    that has none yet, and only if every selected report is resolved once
+    the status is applied. Returns a dict of how many reports each part
+    changed.
+    """
+    if status is not None and status not in dict(FaultReport.STATUS_CHOICES):
+        raise TriageError('Invalid status selected')
+    fault_ids = set(fault_ids)
+    max_selection = getattr(settings, 'FAULT_TRIAGE_MAX_SELECTION', 500)
+    if len(fault_ids) > max_selection:
+        raise TriageError(f'Select at most {max_selection} fault reports at a time')
+
+    with transaction.atomic():
+        reports = FaultReport.objects.filter(pk__in=fault_ids)
+        # Lock in primary key order so concurrent triages can't deadlock
+        ids = list(reports.select_for_update().order_by('pk').values_list('pk', flat=True))
+        if not ids:
+            raise TriageError('No fault reports selected')
+        reports = FaultReport.objects.filter(pk__in=ids)
+
+        if summary and (status or RESOLVED) != RESOLVED:
+            raise TriageError('Fault must be marked as resolved first.')
+        if summary and status is None and reports.exclude(status=RESOLVED).exists():
+            raise TriageError('Fault must be marked as resolved first.')
+
+        changed = {'selected': len(ids), 'status': 0, 'assigned': 0, 'resolved': 0}
+        if status is not None:
+            changed['status'] = _set_status(reports, status, user)
+        if assignee is not UNCHANGED:
+            assignee_id = assignee.pk if assignee is not None else None
+            changed['assigned'] = reports.exclude(assigned_to_id=assignee_id).update(assigned_to_id=assignee_id)
+        if summary:
+            now = timezone.now()
+            unresolved = reports.filter(resolved__isnull=True).values_list('pk', flat=True)
+            created = Resolved.objects.bulk_create([
+                Resolved(fault_report_id=fault_id, resolution_summary=summary, resolved_by=user, resolved_at=now)
+                for fault_id in unresolved
+            ])
+            changed['resolved'] = len(created)
+
+        if changed['status']:
+            notify_dashboard_changed()
+    return changed
@@ -1,20 +1,23 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+from django.http import HttpResponseBadRequest, JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.views.decorators.http import require_POST
-from django.db.models import Q
 from system_layout.models import LayoutItem, Lab, System
 from .models import FaultReport, Resolved
+from .duplicates import file_report
+from .search import search as search_reports
+from .triage import UNCHANGED, TriageError, assignable_users, triage
 from django.utils import timezone
 import json
-from django.core.paginator import Paginator
+from NexusGrid.pagination import InvalidCursor, paginate
 
 @login_required
 def fault_reports(request):
     fault_reports_qs = FaultReport.objects.select_related(
         'system_name',
         'reported_by',
+        'assigned_to',
         'system_name__lab'
     )
 
@@ -22,17 +25,14 @@ def fault_reports(request):
     search = request.GET.get('search', '').strip()
     status = request.GET.get('status', '').strip()
     time = request.GET.get('time', '').strip()
-    sort = request.GET.get('sort', 'newest')
+    # Searches default to the most relevant reports first
+    sort = request.GET.get('sort', 'relevance' if search else 'newest')
     start = request.GET.get('start', '')
     end = request.GET.get('end', '')
 
     if search:
-        fault_reports_qs = fault_reports_qs.filter(
-            Q(system_name__host_name__icontains=search) |
-            Q(system_name__lab__lab_name__icontains=search) |
-            Q(fault_type__icontains=search) |
-            Q(description__icontains=search)
-        )
+        # Full-text index over host, lab, type and description; see faults.search
+        fault_reports_qs = search_reports(fault_reports_qs, search)
     if status and status != 'all':
         fault_reports_qs = fault_reports_qs.filter(status=status)
     if time and time != 'all':
@@ -51,18 +51,26 @@ def fault_reports(request):
                 fault_reports_qs = fault_reports_qs.filter(reported_at__date__gte=start)
             if end:
                 fault_reports_qs = fault_reports_qs.filter(reported_at__date__lte=end)
-    # Sorting
+    # Sorting: keyset pages by (reported_at, fault_id), see NexusGrid.pagination;
+    # ranked search results page by offset
     if sort == 'oldest':
-        fault_reports_qs = fault_reports_qs.order_by('reported_at')
+        keys = ['reported_at', 'fault_id']
+    elif sort == 'relevance' and search:
+        keys = None
+        fault_reports_qs = fault_reports_qs.order_by('-rank', '-reported_at', '-fault_id')
     else:
-        fault_reports_qs = fault_reports_qs.order_by('-reported_at')
+        keys = ['-reported_at', '-fault_id']
 
-    paginator = Paginator(fault_reports_qs, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    try:
+        page_obj = paginate(fault_reports_qs, request.GET.get('cursor'), request.GET, keys,
+                            with_total=request.GET.get('total') == '1')
+    except InvalidCursor as e:
+        return HttpResponseBadRequest(str(e))
     return render(request, 'faults/faults.html', {
         "fault_reports": page_obj.object_list,
         "page_obj": page_obj,
+        "status_choices": FaultReport.STATUS_CHOICES,
+        "assignees": assignable_users().only('id', 'username'),
     })
 
 @login_required
@@ -73,6 +81,8 @@ def update_fault_status(request, fault_id):
 
     if new_status in dict(FaultReport.STATUS_CHOICES):
         fault_report.status = new_status
+        # Recorded in the report's status history (dashboard.repairs)
+        fault_report._status_changed_by = request.user
         fault_report.save()
         if request.headers.get('x-requested-with') == 'XMLHttpRequest':
             return JsonResponse({'success': True, 'status': new_status})
@@ -84,6 +94,36 @@ def update_fault_status(request, fault_id):
 
     return redirect('fault_reports')
 
+@login_required
+@require_POST
+def bulk_update_faults(request):
+    try:
+        data = json.loads(request.body)
+        fault_ids = [int(fault_id) for fault_id in data.get('fault_ids', [])]
+    except (ValueError, TypeError):
+        return JsonResponse({'success': False, 'message': 'Invalid request'})
+
+    status = data.get('status') or None
+    assignee = UNCHANGED
+    if 'assigned_to' in data:
+        # An empty value unassigns
+        assignee = None
+        if data['assigned_to']:
+            assignee = assignable_users().filter(pk=data['assigned_to']).first()
+            if assignee is None:
+                return JsonResponse({'success': False, 'message': 'Assignee not found'})
+    summary = (data.get('resolution_summary') or '').strip()
+
+    try:
+        changed = triage(fault_ids, request.user, status=status, assignee=assignee, summary=summary)
+    except TriageError as e:
+        return JsonResponse({'success': False, 'message': str(e)})
+    return JsonResponse({
+        'success': True,
+        'message': f"Updated {changed['selected']} fault report{'s' if changed['selected'] != 1 else ''}",
+        'changed': changed,
+    })
+
 @login_required
 def create_fault_report(request):
     if request.method == 'POST':
@@ -104,12 +144,16 @@ def create_fault_report(request):
                 lab__lab_name=lab_location
             )
 
-            fault_report = FaultReport.objects.create(
-                system_name=system,
-                reported_by=request.user,
-                fault_type=fault_type,
-                description=description
-            )
+            # A near-duplicate of an open report is counted on that report instead
+            fault_report, created = file_report(system.pk, request.user, fault_type, description)
+            if not created:
+                return JsonResponse({
+                    'success': True,
+                    'message': f'Matches open fault report #{fault_report.fault_id}; '
+                               f'it has now been reported {fault_report.duplicate_count + 1} times',
+                    'fault_id': fault_report.fault_id,
+                    'duplicate': True,
+                })
 
             return JsonResponse({
                 'success': True,
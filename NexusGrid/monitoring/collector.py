@@ -0,0 +1,318 @@
+"""
+Telemetry collector for NexusGrid lab machines.
+
+    python -m monitoring.collector --url http://server/api/ingest/ --token <token>
+
+Only needs psutil and the standard library, so it can run on machines that
+don't have the Django project installed. Samples are buffered, delta-encoded
+(only fields that changed since the previous sample are sent) and uploaded
+gzip-compressed in batches. If the server can't be reached, batches are
+appended to a local spool file and replayed once it comes back. A spooled
+batch the server keeps failing on is set aside after a few attempts, so it
+can't hold back the batches behind it.
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import platform
+import socket
+import time
+import urllib.error
+import urllib.request
+
+import psutil
+
+logger = logging.getLogger('monitoring.collector')
+
+DEFAULT_SPOOL = os.path.join(os.path.expanduser('~'), '.nexusgrid', 'collector.spool')
+
+# Percentages are rounded so that tiny jitter doesn't defeat delta encoding
+PERCENT_PRECISION = 1
+
+# Outcomes of Collector.send(). A batch the server refuses outright (4xx)
+# is dropped and counts as sent; a server error may be the batch's fault.
+SENT = 'sent'
+FAILED = 'failed'
+UNREACHABLE = 'unreachable'
+
+
+class Spool:
+    """
+    Append-only JSON-lines file of undelivered batches. A sidecar ".offset"
+    file records how far replay has progressed; both are truncated once
+    everything has been delivered. Batches given up on are kept in a
+    ".rejected" file for inspection.
+    """
+
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, max_attempts=5):
+        self.path = path
+        self.offset_path = path + '.offset'
+        self.rejected_path = path + '.rejected'
+        self.max_bytes = max_bytes
+        self.max_attempts = max_attempts
+
+    def _read_offset(self):
+        try:
+            with open(self.offset_path) as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _write_offset(self, offset):
+        with open(self.offset_path, 'w') as f:
+            f.write(str(offset))
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def append(self, payload, attempts=0):
+        if self.size() >= self.max_bytes:
+            logger.warning("Spool %s is full, dropping batch of %d samples",
+                           self.path, len(payload['samples']))
+            return False
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        # The server ignores keys it doesn't know, but replay strips this one
+        line = {**payload, 'attempts': attempts} if attempts else payload
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(line, separators=(',', ':')) + '\n')
+        return True
+
+    def _reject(self, payload):
+        logger.error("Giving up on a spooled batch of %d samples after %d failed attempts; kept in %s",
+                     len(payload.get('samples', [])), self.max_attempts, self.rejected_path)
+        with open(self.rejected_path, 'a') as f:
+            f.write(json.dumps(payload, separators=(',', ':')) + '\n')
+
+    def replay(self, send):
+        """
+        Send the spooled batches, oldest first, with `send`, which returns
+        SENT, FAILED or UNREACHABLE. A batch that FAILED goes to the back of
+        the spool for a later replay, or to the rejected file once it has
+        failed max_attempts times. A line that isn't valid JSON (e.g. cut
+        short by a crash mid-append) is logged and skipped. Returns False
+        if it stopped because the server couldn't be reached.
+        """
+        if not self.size():
+            return True
+        offset = self._read_offset()
+        # Batches put back during this replay wait for the next one
+        end = self.size()
+        requeued = False
+        with open(self.path) as f:
+            f.seek(offset)
+            while offset < end:
+                line = f.readline()
+                if not line:
+                    break
+                try:
+                    payload = json.loads(line) if line.strip() else None
+                except ValueError:
+                    logger.error("Skipping corrupt line at offset %d of spool %s: %.80r",
+                                 offset, self.path, line)
+                    payload = None
+                if payload is not None:
+                    attempts = payload.pop('attempts', 0)
+                    outcome = send(payload)
+                    if outcome == UNREACHABLE:
+                        return False
+                    if outcome == FAILED:
+                        if attempts + 1 >= self.max_attempts:
+                            self._reject(payload)
+                        else:
+                            requeued = self.append(payload, attempts + 1) or requeued
+                offset = f.tell()
+                self._write_offset(offset)
+        if not requeued:
+            open(self.path, 'w').close()
+            self._write_offset(0)
+        return True
+
+
+class Collector:
+    def __init__(self, url, token='', hostname=None, interval=10, batch_size=6,
+                 spool_path=DEFAULT_SPOOL, timeout=10):
+        self.url = url
+        self.token = token
+        self.hostname = hostname or socket.gethostname()
+        self.interval = interval
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.spool = Spool(spool_path)
+        self.buffer = []
+        self.static = self.static_info()
+        self.raw_bytes = 0
+        self.sent_bytes = 0
+        # Prime cpu_percent so the first real sample isn't 0.0
+        psutil.cpu_percent(interval=None)
+
+    def static_info(self):
+        """
+        Fields that don't change while the collector is running.
+        """
+        uname = platform.uname()
+        freq = psutil.cpu_freq()
+        return {
+            'system': uname.system,
+            'version': uname.version,
+            'release': uname.release,
+            'machine': uname.machine,
+            'architecture': platform.architecture()[0],
+            'processor': uname.processor or platform.processor(),
+            'cpu_physical_cores': psutil.cpu_count(logical=False),
+            'cpu_total_cores': psutil.cpu_count(logical=True),
+            'cpu_max_freq': freq.max if freq else None,
+            'cpu_min_freq': freq.min if freq else None,
+        }
+
+    @staticmethod
+    def ip_address():
+        for addresses in psutil.net_if_addrs().values():
+            for address in addresses:
+                if address.family == socket.AF_INET and not address.address.startswith('127.'):
+                    return address.address
+        return None
+
+    def sample(self):
+        freq = psutil.cpu_freq()
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage(os.path.abspath(os.sep))
+        net = psutil.net_io_counters()
+        users = sorted({user.name for user in psutil.users()})
+        return {
+            'hostname': self.hostname,
+            'timestamp': int(time.time()),
+            **self.static,
+            'cpu_current_freq': round(freq.current) if freq else None,
+            'cpu_usage': round(psutil.cpu_percent(interval=None), PERCENT_PRECISION),
+            'memory_total': memory.total,
+            'memory_available': memory.available,
+            'memory_used': memory.used,
+            'memory_usage_percent': round(memory.percent, PERCENT_PRECISION),
+            'disk_total': disk.total,
+            'disk_used': disk.used,
+            'disk_free': disk.free,
+            'disk_usage_percent': round(disk.percent, PERCENT_PRECISION),
+            'ip_address': self.ip_address(),
+            'bytes_sent': net.bytes_sent,
+            'bytes_received': net.bytes_recv,
+            'users_count': len(users),
+            'logged_in_users': ', '.join(users),
+        }
+
+    def encode(self, samples):
+        """
+        Delta-encode a batch: the first sample is a full keyframe, later ones
+        only carry changed fields. Each batch is self-contained so spooled
+        batches can be replayed in any order.
+        """
+        encoded = []
+        previous = {}
+        for sample in samples:
+            delta = {k: v for k, v in sample.items() if k == 'timestamp' or previous.get(k, object()) != v}
+            delta.pop('hostname', None)
+            encoded.append(delta)
+            previous = sample
+        return {'hostname': self.hostname, 'delta': True, 'samples': encoded}
+
+    def send(self, payload):
+        """
+        Upload one batch; returns SENT, FAILED or UNREACHABLE.
+        """
+        body = json.dumps(payload, separators=(',', ':')).encode()
+        compressed = gzip.compress(body)
+        request = urllib.request.Request(self.url, data=compressed, method='POST', headers={
+            'Content-Type': 'application/json',
+            'Content-Encoding': 'gzip',
+            'Authorization': f'Token {self.token}',
+        })
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                outcome = SENT if 200 <= response.status < 300 else FAILED
+        except urllib.error.HTTPError as e:
+            # A 4xx means the batch itself is bad; retrying it won't help
+            if 400 <= e.code < 500:
+                logger.error("Ingest rejected batch (%s), dropping it", e.code)
+                return SENT
+            logger.warning("Ingest failed (%s)", e.code)
+            outcome = FAILED
+        except (urllib.error.URLError, OSError) as e:
+            logger.warning("Ingest endpoint unreachable: %s", e)
+            outcome = UNREACHABLE
+        if outcome == SENT:
+            self.sent_bytes += len(compressed)
+        return outcome
+
+    def flush(self):
+        if not self.buffer:
+            return
+        self.raw_bytes += sum(len(json.dumps(s)) for s in self.buffer)
+        payload = self.encode(self.buffer)
+        self.buffer = []
+
+        # A spooled batch the server fails on doesn't hold this one back;
+        # only an unreachable server does
+        if self.spool.replay(self.send) and self.send(payload) == SENT:
+            logger.info("Uploaded %d samples (%d bytes on the wire for %d raw bytes so far)",
+                        len(payload['samples']), self.sent_bytes, self.raw_bytes)
+        else:
+            self.spool.append(payload)
+
+    def run(self, iterations=None):
+        count = 0
+        next_tick = time.monotonic()
+        while iterations is None or count < iterations:
+            self.buffer.append(self.sample())
+            count += 1
+            if len(self.buffer) >= self.batch_size:
+                self.flush()
+            next_tick += self.interval
+            time.sleep(max(0, next_tick - time.monotonic()))
+        self.flush()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="NexusGrid telemetry collector")
+    parser.add_argument('--url', required=True, help='Ingest endpoint, e.g. http://server/api/ingest/')
+    parser.add_argument('--token', default=os.environ.get('NEXUSGRID_INGEST_TOKEN', ''),
+                        help='Ingest token (defaults to $NEXUSGRID_INGEST_TOKEN)')
+    parser.add_argument('--hostname', default=None, help='Override the reported hostname')
+    parser.add_argument('--interval', type=float, default=10, help='Seconds between samples')
+    parser.add_argument('--batch-size', type=int, default=6, help='Samples per upload')
+    parser.add_argument('--spool', default=DEFAULT_SPOOL, help='Spool file for undelivered batches')
+    parser.add_argument('--iterations', type=int, default=None, help='Stop after this many samples')
+    return parser
+
+
+def run_from_options(options):
+    # Stay out of the way of whatever the lab machine is actually doing
+    if hasattr(os, 'nice'):
+        try:
+            os.nice(10)
+        except OSError:
+            pass
+    collector = Collector(
+        url=options['url'],
+        token=options['token'],
+        hostname=options['hostname'],
+        interval=options['interval'],
+        batch_size=options['batch_size'],
+        spool_path=options['spool'],
+    )
+    try:
+        collector.run(options['iterations'])
+    except KeyboardInterrupt:
+        collector.flush()
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    run_from_options(vars(build_parser().parse_args(argv)))
+
+
+if __name__ == '__main__':
+    main()
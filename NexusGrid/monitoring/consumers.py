@@ -0,0 +1,70 @@
+import asyncio
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
+
+from .live import lab_group, snapshot_payload, system_group
+from .models import HostSnapshot
+
+
+class MetricsConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Streams current metrics for a lab (ws/metrics/lab/<id>/) or a single
+    system (ws/metrics/system/<id>/).
+
+    Group messages are merged into `pending` (newest values per system win)
+    and flushed at most once per MONITORING_PUSH_INTERVAL, so a busy lab
+    costs each client one frame per tick rather than one per sample.
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if not user or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+
+        kwargs = self.scope['url_route']['kwargs']
+        if 'lab_id' in kwargs:
+            self.group_name = lab_group(kwargs['lab_id'])
+            snapshots = HostSnapshot.objects.filter(monitored_system__lab_id=kwargs['lab_id'])
+        else:
+            self.group_name = system_group(kwargs['system_id'])
+            snapshots = HostSnapshot.objects.filter(monitored_system_id=kwargs['system_id'])
+
+        self.interval = getattr(settings, 'MONITORING_PUSH_INTERVAL', 2.0)
+        self.pending = {}
+        self.flush_task = None
+
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        await self.send_json({'type': 'snapshot', 'systems': await self.current_state(snapshots)})
+
+    async def disconnect(self, code):
+        if getattr(self, 'flush_task', None):
+            self.flush_task.cancel()
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    @database_sync_to_async
+    def current_state(self, snapshots):
+        # Drop snapshots taken under a host_name the System no longer has
+        current = snapshots.select_related('monitored_system')
+        return [
+            snapshot_payload(snapshot) for snapshot in current
+            if snapshot.hostname == snapshot.monitored_system.host_name
+        ]
+
+    async def metrics_update(self, event):
+        for payload in event['systems']:
+            self.pending[payload['system_id']] = payload
+        if self.flush_task is None:
+            self.flush_task = asyncio.ensure_future(self.flush_later())
+
+    async def flush_later(self):
+        await asyncio.sleep(self.interval)
+        # Cleared before sending so updates arriving mid-send start the next tick
+        self.flush_task = None
+        pending, self.pending = self.pending, {}
+        if pending:
+            await self.send_json({'type': 'metrics', 'systems': list(pending.values())})
@@ -0,0 +1,233 @@
+import csv
+import io
+import ipaddress
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import SystemInfo
+from .partitions import accepted_window, ensure_partitions_for
+from .live import publish_metrics
+from .snapshots import update_snapshots
+
+_INT_TYPES = {'IntegerField', 'BigIntegerField', 'PositiveIntegerField'}
+_FLOAT_TYPES = {'FloatField'}
+
+
+class SampleError(ValueError):
+    pass
+
+
+def _converter(field):
+    """
+    Build the cleaning function for one SystemInfo column.
+    """
+    name = field.name
+    internal_type = field.get_internal_type()
+    empty = None if field.null else ''
+
+    if internal_type in _INT_TYPES or internal_type in _FLOAT_TYPES:
+        cast = int if internal_type in _INT_TYPES else float
+        # A value the column can't hold would fail the whole batch's INSERT
+        low, high = connection.ops.integer_field_range(internal_type) if cast is int else (None, None)
+
+        def convert(value):
+            if value is None or value == '':
+                return empty
+            try:
+                value = cast(value)
+            except (TypeError, ValueError, OverflowError):
+                raise SampleError(f"Invalid value for {name}: {value!r}")
+            if (low is not None and value < low) or (high is not None and value > high):
+                raise SampleError(f"Value out of range for {name}: {value!r}")
+            return value
+        return convert
+
+    if internal_type == 'GenericIPAddressField':
+        def convert(value):
+            if value is None or value == '':
+                return empty
+            try:
+                return str(ipaddress.ip_address(value))
+            except ValueError:
+                raise SampleError(f"Invalid IP address: {value!r}")
+        return convert
+
+    max_length = field.max_length
+
+    def convert(value):
+        if value is None:
+            return empty
+        if isinstance(value, (list, tuple)):
+            value = ', '.join(str(v) for v in value)
+        value = str(value)
+        return value[:max_length] if max_length else value
+    return convert
+
+
+SAMPLE_FIELDS = [
+    (field.name, _converter(field))
+    for field in SystemInfo._meta.concrete_fields
+    if not field.primary_key and field.name not in ('hostname', 'timestamp')
+]
+COLUMNS = ['hostname', 'timestamp'] + [name for name, _ in SAMPLE_FIELDS]
+TEXT_COLUMNS = [
+    field.column for field in SystemInfo._meta.concrete_fields
+    if field.get_internal_type() in ('CharField', 'TextField') and not field.null
+]
+
+
+def parse_timestamp(value):
+    """
+    Accepts ISO-8601 strings or UNIX epoch seconds; naive values are UTC.
+    """
+    if value in (None, ''):
+        return timezone.now()
+    try:
+        if isinstance(value, (int, float)):
+            return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+        parsed = parse_datetime(str(value))
+    except (OverflowError, OSError, ValueError):
+        # Out of datetime's range, or a well-formed but impossible date
+        parsed = None
+    if parsed is None:
+        raise SampleError(f"Invalid timestamp: {value!r}")
+    if timezone.is_naive(parsed):
+        parsed = parsed.replace(tzinfo=dt_timezone.utc)
+    return parsed
+
+
+def clean_sample(sample):
+    """
+    Validate one collector sample and return a row tuple ordered like COLUMNS.
+    """
+    if not isinstance(sample, dict):
+        raise SampleError("Sample must be an object")
+    hostname = str(sample.get('hostname') or '').strip()
+    if not hostname:
+        raise SampleError("hostname is required")
+
+    get = sample.get
+    return (hostname[:255], parse_timestamp(get('timestamp'))) + tuple(
+        convert(get(name)) for name, convert in SAMPLE_FIELDS
+    )
+
+
+def expand_samples(samples, hostname=None, delta=False):
+    """
+    Apply a batch-level default hostname and, for delta-encoded batches,
+    carry each host's previous values forward so every row is complete.
+    The first sample per host in a delta batch must be a full keyframe.
+    """
+    if not hostname and not delta:
+        return samples
+
+    expanded = []
+    previous = {}
+    for sample in samples:
+        if not isinstance(sample, dict):
+            expanded.append(sample)
+            continue
+        if hostname and not sample.get('hostname'):
+            sample = {**sample, 'hostname': hostname}
+        if delta:
+            host = sample.get('hostname')
+            sample = {**previous.get(host, {}), **sample}
+            previous[host] = sample
+        expanded.append(sample)
+    return expanded
+
+
+def clean_samples(samples):
+    """
+    Returns (rows, errors); a bad sample is reported, not fatal to the batch.
+    """
+    rows = []
+    errors = []
+    oldest, newest = accepted_window()
+    for index, sample in enumerate(samples):
+        try:
+            row = clean_sample(sample)
+            if not oldest <= row[1] <= newest:
+                raise SampleError(f"Timestamp outside the accepted window: {row[1].isoformat()}")
+            rows.append(row)
+        except SampleError as e:
+            errors.append({'index': index, 'error': str(e)})
+    return rows, errors
+
+
+def _quoted_table_and_columns():
+    meta = SystemInfo._meta
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(meta.get_field(name).column) for name in COLUMNS)
+    return quote(meta.db_table), columns
+
+
+def _copy_rows(rows):
+    """
+    Stream rows into PostgreSQL with COPY FROM STDIN (psycopg2 or psycopg 3).
+    """
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator='\n').writerows(rows)
+    buf.seek(0)
+
+    # In CSV mode an unquoted empty field is NULL; FORCE_NOT_NULL keeps the
+    # NOT NULL text columns as empty strings instead.
+    table, columns = _quoted_table_and_columns()
+    not_null = ', '.join(connection.ops.quote_name(name) for name in TEXT_COLUMNS)
+    sql = f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL ({not_null}))"
+
+    with connection.cursor() as cursor:
+        # Telemetry tolerates losing the last few hundred ms on a crash, so
+        # don't make every batch wait for its WAL flush.
+        cursor.execute("SET LOCAL synchronous_commit = off")
+        if hasattr(cursor, 'copy_expert'):
+            cursor.copy_expert(sql, buf)
+        else:
+            with cursor.copy(sql) as copy:
+                copy.write(buf.getvalue())
+
+
+def _insert_rows(rows):
+    """
+    One prepared INSERT run with executemany; skips the per-object field
+    preparation bulk_create() does, which dominates at this row count.
+    """
+    table, columns = _quoted_table_and_columns()
+    placeholders = ', '.join(['%s'] * len(COLUMNS))
+    sql = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
+    adapt = connection.ops.adapt_datetimefield_value
+    params = [(row[0], adapt(row[1])) + row[2:] for row in rows]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def write_rows(rows):
+    """
+    Persist already-cleaned rows in one transaction: COPY on PostgreSQL,
+    a single executemany INSERT everywhere else. Host snapshots are updated
+    in the same transaction and pushed to live subscribers after commit.
+    """
+    if not rows:
+        return 0
+    ensure_partitions_for(row[1] for row in rows)
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            _copy_rows(rows)
+        else:
+            _insert_rows(rows)
+        touched = update_snapshots(rows, COLUMNS)
+        # Push only what actually committed
+        transaction.on_commit(lambda: publish_metrics(touched, COLUMNS))
+    return len(rows)
+
+
+def ingest_samples(samples, hostname=None, delta=False):
+    """
+    Validate and store a batch of collector samples.
+    """
+    rows, errors = clean_samples(expand_samples(samples, hostname, delta))
+    accepted = write_rows(rows)
+    return {'accepted': accepted, 'rejected': len(errors), 'errors': errors}
@@ -0,0 +1,78 @@
+"""
+Live metric fan-out over the channel layer.
+
+Each ingest batch sends at most one message per lab group and one per system
+group, holding the newest metrics of every System it touched. Consumers
+(monitoring.consumers) coalesce those further, per client and per tick.
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+
+from .rollups import ROLLUP_METRICS
+
+logger = logging.getLogger(__name__)
+
+
+def lab_group(lab_id):
+    return f'metrics.lab.{lab_id}'
+
+
+def system_group(system_id):
+    return f'metrics.system.{system_id}'
+
+
+def row_payload(system_id, row, columns):
+    values = dict(zip(columns, row))
+    return {
+        'system_id': system_id,
+        'hostname': values['hostname'],
+        'timestamp': values['timestamp'].isoformat(),
+        'stale': False,
+        **{metric: values[metric] for metric in ROLLUP_METRICS},
+    }
+
+
+def snapshot_payload(snapshot):
+    return {
+        'system_id': snapshot.monitored_system_id,
+        'hostname': snapshot.hostname,
+        **snapshot.current_metrics(),
+    }
+
+
+def build_messages(touched, columns):
+    """
+    {group: message} for the (system_id, lab_id, row) tuples from
+    snapshots.update_snapshots.
+    """
+    by_lab = {}
+    messages = {}
+    for system_id, lab_id, row in touched:
+        payload = row_payload(system_id, row, columns)
+        messages[system_group(system_id)] = {'type': 'metrics.update', 'systems': [payload]}
+        by_lab.setdefault(lab_id, []).append(payload)
+    for lab_id, payloads in by_lab.items():
+        messages[lab_group(lab_id)] = {'type': 'metrics.update', 'systems': payloads}
+    return messages
+
+
+async def _send_all(layer, messages):
+    for group, message in messages.items():
+        await layer.group_send(group, message)
+
+
+def publish_metrics(touched, columns):
+    """
+    Best effort: a channel layer outage must never fail ingest.
+    """
+    if not touched:
+        return
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    try:
+        async_to_sync(_send_all)(layer, build_messages(touched, columns))
+    except Exception as e:
+        logger.warning(f"Live metric push failed: {str(e)}")
@@ -0,0 +1,91 @@
+import json
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.utils import timezone
+
+from monitoring.ingest import ingest_samples
+from monitoring.models import SystemInfo
+from monitoring.views import ingest
+
+HOST_PREFIX = 'bench-host-'
+
+
+def make_samples(count, hosts, start):
+    samples = []
+    for i in range(count):
+        samples.append({
+            'hostname': f'{HOST_PREFIX}{i % hosts:05d}',
+            'timestamp': (start + timedelta(seconds=i // hosts)).isoformat(),
+            'system': 'Linux',
+            'release': '6.8.0',
+            'machine': 'x86_64',
+            'architecture': '64bit',
+            'processor': 'x86_64',
+            'cpu_physical_cores': 8,
+            'cpu_total_cores': 16,
+            'cpu_max_freq': 4200.0,
+            'cpu_min_freq': 800.0,
+            'cpu_current_freq': random.uniform(800, 4200),
+            'cpu_usage': random.uniform(0, 100),
+            'memory_total': 17179869184,
+            'memory_available': random.randint(1 << 30, 16 << 30),
+            'memory_used': random.randint(1 << 30, 16 << 30),
+            'memory_usage_percent': random.uniform(0, 100),
+            'disk_total': 512110190592,
+            'disk_used': 201863462912,
+            'disk_free': 310246727680,
+            'disk_usage_percent': 39.4,
+            'ip_address': f'10.{(i % hosts) // 65536 % 256}.{(i % hosts) // 256 % 256}.{i % 256}',
+            'bytes_sent': i * 1500,
+            'bytes_received': i * 9000,
+            'users_count': 1,
+            'logged_in_users': 'student',
+        })
+    return samples
+
+
+class Command(BaseCommand):
+    help = "Measure telemetry ingest throughput (samples/second) against the configured database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=100000, help='Total samples to ingest')
+        parser.add_argument('--hosts', type=int, default=5000, help='Distinct hostnames to simulate')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Samples per ingest request')
+        parser.add_argument('--http', action='store_true',
+                            help='Go through the ingest view (JSON encode/decode included)')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated rows')
+
+    def handle(self, *args, **options):
+        total = options['samples']
+        batch_size = options['batch_size']
+        start = timezone.now() - timedelta(hours=1)
+
+        self.stdout.write(f"Generating {total} samples for {options['hosts']} hosts...")
+        samples = make_samples(total, options['hosts'], start)
+        batches = [samples[i:i + batch_size] for i in range(0, total, batch_size)]
+        factory = RequestFactory()
+
+        accepted = 0
+        began = time.perf_counter()
+        for batch in batches:
+            if options['http']:
+                request = factory.post('/api/ingest/', data=json.dumps({'samples': batch}),
+                                       content_type='application/json',
+                                       HTTP_AUTHORIZATION=f'Token {settings.MONITORING_INGEST_TOKEN}')
+                accepted += json.loads(ingest(request).content)['accepted']
+            else:
+                accepted += ingest_samples(batch)['accepted']
+        elapsed = time.perf_counter() - began
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Ingested {accepted} samples in {len(batches)} batches of {batch_size} "
+            f"in {elapsed:.2f}s -> {accepted / elapsed:,.0f} samples/s"
+        ))
+
+        if not options['keep']:
+            SystemInfo.objects.filter(hostname__startswith=HOST_PREFIX).delete()
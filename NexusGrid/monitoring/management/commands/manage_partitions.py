@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from monitoring import partitions
+
+
+class Command(BaseCommand):
+    help = "Create upcoming SystemInfo partitions and drop the ones past retention. Run daily (cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days-ahead', type=int, default=None,
+                            help='Days of future partitions to keep ready (default: MONITORING_PARTITION_DAYS_AHEAD)')
+        parser.add_argument('--retention-days', type=int, default=None,
+                            help='Days of telemetry to keep (default: MONITORING_RETENTION_DAYS)')
+
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned():
+            deleted = partitions.drop_expired_partitions(options['retention_days'])
+            self.stdout.write(f"Table is not partitioned on this backend; deleted {deleted} expired rows.")
+            return
+
+        created = partitions.create_future_partitions(options['days_ahead'])
+        dropped = partitions.drop_expired_partitions(options['retention_days'])
+        for name in dropped:
+            self.stdout.write(f"Dropped {name}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(created)} partitions created, {len(dropped)} dropped, "
+            f"{len(partitions.list_partitions())} attached."
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from monitoring import rollups
+
+
+class Command(BaseCommand):
+    help = "Fold new SystemInfo samples into the 1m/1h/1d metric rollups. Run every minute (cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50000,
+                            help='SystemInfo rows read per transaction')
+        parser.add_argument('--prune', action='store_true',
+                            help='Also delete rollups past their tier retention')
+
+    def handle(self, *args, **options):
+        processed = rollups.run_until_caught_up(options['batch_size'])
+        message = f"Rolled up {processed} samples."
+        if options['prune']:
+            message += f" Pruned {rollups.prune_rollups()} expired rollups."
+        self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,23 @@
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from monitoring.collector import DEFAULT_SPOOL, run_from_options
+
+
+class Command(BaseCommand):
+    help = "Sample this machine with psutil and upload batches to the monitoring ingest endpoint."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000/api/ingest/', help='Ingest endpoint')
+        parser.add_argument('--token', default=settings.MONITORING_INGEST_TOKEN, help='Ingest token')
+        parser.add_argument('--hostname', default=None, help='Override the reported hostname')
+        parser.add_argument('--interval', type=float, default=10, help='Seconds between samples')
+        parser.add_argument('--batch-size', type=int, default=6, help='Samples per upload')
+        parser.add_argument('--spool', default=DEFAULT_SPOOL, help='Spool file for undelivered batches')
+        parser.add_argument('--iterations', type=int, default=None, help='Stop after this many samples')
+
+    def handle(self, *args, **options):
+        logging.getLogger('monitoring.collector').setLevel(logging.INFO)
+        run_from_options(options)
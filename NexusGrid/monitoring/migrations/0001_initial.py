@@ -0,0 +1,51 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SystemInfo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hostname', models.CharField(max_length=255)),
+                ('timestamp', models.DateTimeField()),
+                ('system', models.CharField(blank=True, default='', max_length=100)),
+                ('version', models.CharField(blank=True, default='', max_length=255)),
+                ('release', models.CharField(blank=True, default='', max_length=100)),
+                ('machine', models.CharField(blank=True, default='', max_length=100)),
+                ('architecture', models.CharField(blank=True, default='', max_length=100)),
+                ('processor', models.CharField(blank=True, default='', max_length=255)),
+                ('cpu_physical_cores', models.PositiveIntegerField(blank=True, null=True)),
+                ('cpu_total_cores', models.PositiveIntegerField(blank=True, null=True)),
+                ('cpu_max_freq', models.FloatField(blank=True, null=True)),
+                ('cpu_min_freq', models.FloatField(blank=True, null=True)),
+                ('cpu_current_freq', models.FloatField(blank=True, null=True)),
+                ('cpu_usage', models.FloatField(blank=True, null=True)),
+                ('memory_total', models.BigIntegerField(blank=True, null=True)),
+                ('memory_available', models.BigIntegerField(blank=True, null=True)),
+                ('memory_used', models.BigIntegerField(blank=True, null=True)),
+                ('memory_usage_percent', models.FloatField(blank=True, null=True)),
+                ('disk_total', models.BigIntegerField(blank=True, null=True)),
+                ('disk_used', models.BigIntegerField(blank=True, null=True)),
+                ('disk_free', models.BigIntegerField(blank=True, null=True)),
+                ('disk_usage_percent', models.FloatField(blank=True, null=True)),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True)),
+                ('bytes_sent', models.BigIntegerField(blank=True, null=True)),
+                ('bytes_received', models.BigIntegerField(blank=True, null=True)),
+                ('users_count', models.PositiveIntegerField(blank=True, null=True)),
+                ('logged_in_users', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+                'indexes': [models.Index(fields=['hostname', '-timestamp'], name='monitoring__hostnam_2b20b1_idx'), models.Index(fields=['timestamp'], name='monitoring__timesta_7b4fc8_idx')],
+            },
+        ),
+    ]
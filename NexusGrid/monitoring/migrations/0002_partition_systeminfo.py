@@ -0,0 +1,77 @@
+"""
+Convert monitoring_systeminfo into a table partitioned by day on PostgreSQL.
+
+Other backends keep the plain table created by 0001. Existing rows are
+copied into partitions covering their dates; the primary key becomes
+(id, timestamp) because PostgreSQL requires the partition key in it.
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.db import migrations
+from django.utils import timezone
+
+TABLE = 'monitoring_systeminfo'
+LEGACY = 'monitoring_systeminfo_unpartitioned'
+DAYS_AHEAD = 7
+
+
+def partition_systeminfo(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    quote = schema_editor.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {quote(TABLE)} RENAME TO {quote(LEGACY)}")
+        cursor.execute(f"ALTER TABLE {quote(LEGACY)} RENAME CONSTRAINT {quote(TABLE + '_pkey')} TO {quote(LEGACY + '_pkey')}")
+        cursor.execute(
+            f"CREATE TABLE {quote(TABLE)} (LIKE {quote(LEGACY)} INCLUDING DEFAULTS) "
+            f'PARTITION BY RANGE ("timestamp")'
+        )
+        # Identity columns aren't allowed on partitioned tables before PG 17
+        cursor.execute(f"CREATE SEQUENCE {quote(TABLE + '_id_seq1')} OWNED BY {quote(TABLE)}.id")
+        cursor.execute(f"ALTER TABLE {quote(TABLE)} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_seq1')")
+        cursor.execute(f'ALTER TABLE {quote(TABLE)} ADD PRIMARY KEY (id, "timestamp")')
+
+        cursor.execute(f'SELECT MIN("timestamp"), MAX("timestamp"), MAX(id) FROM {quote(LEGACY)}')
+        oldest, newest, max_id = cursor.fetchone()
+        for day in _days_to_cover(oldest, newest):
+            start = datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+            cursor.execute(
+                f"CREATE TABLE {quote(f'{TABLE}_p{day:%Y%m%d}')} PARTITION OF {quote(TABLE)} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{(start + timedelta(days=1)).isoformat()}')"
+            )
+
+        cursor.execute(f"INSERT INTO {quote(TABLE)} SELECT * FROM {quote(LEGACY)}")
+        cursor.execute(f"DROP TABLE {quote(LEGACY)}")
+        cursor.execute(f"ALTER SEQUENCE {quote(TABLE + '_id_seq1')} RENAME TO {quote(TABLE + '_id_seq')}")
+        if max_id:
+            cursor.execute(f"SELECT setval('{TABLE}_id_seq', %s)", [max_id])
+
+        # Same names as the model's Meta.indexes so later migrations can find them
+        cursor.execute(f'CREATE INDEX "monitoring__hostnam_2b20b1_idx" ON {quote(TABLE)} (hostname, "timestamp" DESC)')
+        cursor.execute(f'CREATE INDEX "monitoring__timesta_7b4fc8_idx" ON {quote(TABLE)} ("timestamp")')
+
+
+def _days_to_cover(oldest, newest):
+    """
+    Every UTC day holding existing rows, through a week past today.
+    """
+    today = timezone.now().astimezone(dt_timezone.utc).date()
+    first = oldest.astimezone(dt_timezone.utc).date() if oldest else today
+    last = max(newest.astimezone(dt_timezone.utc).date() if newest else today, today)
+    day = first
+    while day <= last + timedelta(days=DAYS_AHEAD):
+        yield day
+        day += timedelta(days=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_systeminfo, migrations.RunPython.noop),
+    ]
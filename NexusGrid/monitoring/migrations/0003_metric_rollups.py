@@ -0,0 +1,42 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoring', '0002_partition_systeminfo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('horizon_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MetricRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hostname', models.CharField(max_length=255)),
+                ('metric', models.CharField(max_length=50)),
+                ('resolution', models.CharField(choices=[('1m', '1 minute'), ('1h', '1 hour'), ('1d', '1 day')], max_length=2)),
+                ('bucket', models.DateTimeField()),
+                ('min_value', models.FloatField()),
+                ('max_value', models.FloatField()),
+                ('sum_value', models.FloatField()),
+                ('count', models.PositiveIntegerField()),
+            ],
+            options={
+                'ordering': ['bucket'],
+                'indexes': [models.Index(fields=['resolution', 'bucket'], name='monitoring__resolut_f1a2ec_idx')],
+                'constraints': [models.UniqueConstraint(fields=('hostname', 'metric', 'resolution', 'bucket'), name='unique_metric_rollup_bucket')],
+            },
+        ),
+    ]
@@ -1 +1,184 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+# How far ahead of the server clock a collector's timestamps may run
+CLOCK_SKEW = timedelta(minutes=5)
+
+
+class SystemInfoQuerySet(models.QuerySet):
+    def for_host(self, hostname):
+        return self.filter(hostname=hostname)
+
+    def recent(self, hours):
+        """
+        Always bound history reads by time: on PostgreSQL the table is
+        partitioned by day and the planner only scans partitions in range.
+        """
+        now = timezone.now()
+        return self.filter(timestamp__range=(now - timedelta(hours=hours), now + CLOCK_SKEW))
+
+    def latest_sample(self, hostname, within_hours=24):
+        return self.for_host(hostname).recent(within_hours).order_by('-timestamp').first()
+
+
+class HostSample(models.Model):
+    """
+    The fields of one collector sample. Field names mirror what
+    system-details.html renders.
+    """
+    hostname = models.CharField(max_length=255)
+    timestamp = models.DateTimeField()
+
+    # Platform
+    system = models.CharField(max_length=100, blank=True, default='')
+    version = models.CharField(max_length=255, blank=True, default='')
+    release = models.CharField(max_length=100, blank=True, default='')
+    machine = models.CharField(max_length=100, blank=True, default='')
+    architecture = models.CharField(max_length=100, blank=True, default='')
+    processor = models.CharField(max_length=255, blank=True, default='')
+
+    # CPU
+    cpu_physical_cores = models.PositiveIntegerField(null=True, blank=True)
+    cpu_total_cores = models.PositiveIntegerField(null=True, blank=True)
+    cpu_max_freq = models.FloatField(null=True, blank=True)
+    cpu_min_freq = models.FloatField(null=True, blank=True)
+    cpu_current_freq = models.FloatField(null=True, blank=True)
+    cpu_usage = models.FloatField(null=True, blank=True)
+
+    # Memory (bytes)
+    memory_total = models.BigIntegerField(null=True, blank=True)
+    memory_available = models.BigIntegerField(null=True, blank=True)
+    memory_used = models.BigIntegerField(null=True, blank=True)
+    memory_usage_percent = models.FloatField(null=True, blank=True)
+
+    # Disk (bytes)
+    disk_total = models.BigIntegerField(null=True, blank=True)
+    disk_used = models.BigIntegerField(null=True, blank=True)
+    disk_free = models.BigIntegerField(null=True, blank=True)
+    disk_usage_percent = models.FloatField(null=True, blank=True)
+
+    # Network
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    bytes_sent = models.BigIntegerField(null=True, blank=True)
+    bytes_received = models.BigIntegerField(null=True, blank=True)
+
+    # Users
+    users_count = models.PositiveIntegerField(null=True, blank=True)
+    logged_in_users = models.TextField(blank=True, default='')
+
+    class Meta:
+        abstract = True
+
+
+class SystemInfo(HostSample):
+    """
+    A single telemetry sample reported by a lab machine's collector.
+    """
+    objects = SystemInfoQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['hostname', '-timestamp']),
+            models.Index(fields=['timestamp']),
+        ]
+
+    def __str__(self):
+        return f"{self.hostname} @ {self.timestamp}"
+
+
+class MetricRollup(models.Model):
+    """
+    min/max/sum/count of one metric for one host over a fixed time bucket.
+    sum and count (rather than avg) are stored so buckets can be merged.
+    """
+    RESOLUTION_CHOICES = [
+        ('1m', '1 minute'),
+        ('1h', '1 hour'),
+        ('1d', '1 day'),
+    ]
+
+    hostname = models.CharField(max_length=255)
+    metric = models.CharField(max_length=50)
+    resolution = models.CharField(max_length=2, choices=RESOLUTION_CHOICES)
+    bucket = models.DateTimeField()
+    min_value = models.FloatField()
+    max_value = models.FloatField()
+    sum_value = models.FloatField()
+    count = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ['bucket']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['hostname', 'metric', 'resolution', 'bucket'],
+                name='unique_metric_rollup_bucket'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['resolution', 'bucket']),
+        ]
+
+    def __str__(self):
+        return f"{self.hostname} {self.metric} {self.resolution} @ {self.bucket}"
+
+    @property
+    def avg_value(self):
+        return self.sum_value / self.count if self.count else None
+
+
+class RollupCheckpoint(models.Model):
+    """
+    How far the rollup pipeline has read SystemInfo, by id.
+
+    Rows up to last_id are rolled up. horizon_id is the highest id seen on
+    the previous run; a run only reads up to it, so ingest transactions that
+    were still open then (holding lower ids) have committed by now.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    horizon_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_id}"
+
+
+class HostSnapshot(HostSample):
+    """
+    The most recent sample for each System, upserted on ingest so current
+    state is a primary-key lookup instead of a sort over SystemInfo.
+    `timestamp` is when the collector took the sample; `updated_at` is when
+    it reached the server.
+    """
+    monitored_system = models.OneToOneField(
+        'system_layout.System',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='snapshot'
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.hostname} (latest @ {self.timestamp})"
+
+    @property
+    def age(self):
+        return timezone.now() - self.timestamp
+
+    @property
+    def is_stale(self):
+        stale_after = getattr(settings, 'MONITORING_SNAPSHOT_STALE_SECONDS', 300)
+        return self.age > timedelta(seconds=stale_after)
+
+    def current_metrics(self):
+        return {
+            'cpu_usage': self.cpu_usage,
+            'memory_usage_percent': self.memory_usage_percent,
+            'disk_usage_percent': self.disk_usage_percent,
+            'timestamp': self.timestamp.isoformat(),
+            'stale': self.is_stale,
+        }
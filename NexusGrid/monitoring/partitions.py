@@ -0,0 +1,142 @@
+"""
+Daily range partitions for SystemInfo.
+
+On PostgreSQL the table is natively partitioned by RANGE ("timestamp"), one
+partition per UTC day (see migration 0002). Partitions are created ahead of
+time and expired ones are dropped whole, so retention never deletes rows one
+by one. Other backends (SQLite for tests and development) keep a plain table
+and fall back to an indexed range DELETE.
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import CLOCK_SKEW, SystemInfo
+
+PARENT_TABLE = SystemInfo._meta.db_table
+PARTITION_PREFIX = f'{PARENT_TABLE}_p'
+
+# Days known to have a partition in this process; saves a catalog round trip per batch
+_known_days = set()
+
+
+def is_partitioned():
+    return connection.vendor == 'postgresql'
+
+
+def retention_days():
+    return getattr(settings, 'MONITORING_RETENTION_DAYS', 30)
+
+
+def days_ahead():
+    return getattr(settings, 'MONITORING_PARTITION_DAYS_AHEAD', 7)
+
+
+def accepted_window(now=None):
+    """
+    (oldest, newest) sample timestamps ingest will store. Older samples would
+    land in an already-dropped partition; future ones come from broken clocks
+    and would escape the time-bounded reads in SystemInfoQuerySet.recent().
+    """
+    now = now or timezone.now()
+    return now - timedelta(days=retention_days()), now + CLOCK_SKEW
+
+
+def partition_name(day):
+    return f'{PARTITION_PREFIX}{day:%Y%m%d}'
+
+
+def _day_start(day):
+    return datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+
+
+def create_partition_sql(day):
+    quote = connection.ops.quote_name
+    return (
+        f"CREATE TABLE IF NOT EXISTS {quote(partition_name(day))} PARTITION OF {quote(PARENT_TABLE)} "
+        f"FOR VALUES FROM ('{_day_start(day).isoformat()}') TO ('{_day_start(day + timedelta(days=1)).isoformat()}')"
+    )
+
+
+def ensure_partitions(days):
+    """
+    Create the daily partitions for `days` that don't exist yet.
+    """
+    if not is_partitioned():
+        return []
+    missing = sorted(set(days) - _known_days)
+    if not missing:
+        return []
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Serialise creators so concurrent ingest workers don't race on the catalog
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [PARENT_TABLE])
+        for day in missing:
+            cursor.execute(create_partition_sql(day))
+    _known_days.update(missing)
+    return missing
+
+
+def ensure_partitions_for(timestamps):
+    return ensure_partitions({ts.astimezone(dt_timezone.utc).date() for ts in timestamps})
+
+
+def create_future_partitions(ahead=None, today=None):
+    today = today or timezone.now().astimezone(dt_timezone.utc).date()
+    ahead = days_ahead() if ahead is None else ahead
+    return ensure_partitions(today + timedelta(days=offset) for offset in range(ahead + 1))
+
+
+def list_partitions():
+    """
+    [(table_name, day)] for every attached daily partition, oldest first.
+    """
+    if not is_partitioned():
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            """,
+            [PARENT_TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    partitions = []
+    for name in names:
+        try:
+            day = datetime.strptime(name[len(PARTITION_PREFIX):], '%Y%m%d').date()
+        except ValueError:
+            continue
+        partitions.append((name, day))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def drop_expired_partitions(retention=None, today=None):
+    """
+    Drop whole partitions older than the retention window. Returns what was
+    dropped: partition names on PostgreSQL, a deleted-row count elsewhere.
+    """
+    retention = retention_days() if retention is None else retention
+    today = today or timezone.now().astimezone(dt_timezone.utc).date()
+    cutoff = today - timedelta(days=retention)
+
+    if not is_partitioned():
+        deleted, _ = SystemInfo.objects.filter(timestamp__lt=_day_start(cutoff)).delete()
+        return deleted
+
+    dropped = []
+    quote = connection.ops.quote_name
+    for name, day in list_partitions():
+        if day >= cutoff:
+            break
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {quote(PARENT_TABLE)} DETACH PARTITION {quote(name)}")
+            cursor.execute(f"DROP TABLE {quote(name)}")
+        _known_days.discard(day)
+        dropped.append(name)
+    return dropped
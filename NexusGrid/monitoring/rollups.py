@@ -0,0 +1,272 @@
+"""
+Incremental 1m/1h/1d rollups of SystemInfo metrics.
+
+Each run reads only SystemInfo rows past the checkpoint, folds them into the
+1-minute buckets, then recomputes the hour and day buckets those minutes fall
+in from the tier below. A bucket reaching back past the retention of the
+tier below can't be recomputed from it, as part of it has been pruned: a
+late sample is added to such a bucket instead. The checkpoint advances in
+the same transaction as the writes, so re-running never double counts. Run
+it every minute:
+
+    python manage.py rollup_metrics
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import MetricRollup, RollupCheckpoint, SystemInfo
+
+ROLLUP_METRICS = ('cpu_usage', 'memory_usage_percent', 'disk_usage_percent')
+
+# (resolution, bucket width in seconds), finest first
+RESOLUTIONS = [('1m', 60), ('1h', 3600), ('1d', 86400)]
+RESOLUTION_SECONDS = dict(RESOLUTIONS)
+
+CHECKPOINT_NAME = 'systeminfo'
+
+UNIQUE_FIELDS = ['hostname', 'metric', 'resolution', 'bucket']
+VALUE_FIELDS = ['min_value', 'max_value', 'sum_value', 'count']
+
+
+def floor_time(value, seconds):
+    epoch = int(value.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % seconds, tz=dt_timezone.utc)
+
+
+def tier_retention():
+    """
+    How long each tier is kept; None means forever. 'raw' is SystemInfo.
+    """
+    return {
+        'raw': timedelta(days=getattr(settings, 'MONITORING_RETENTION_DAYS', 30)),
+        '1m': timedelta(days=getattr(settings, 'MONITORING_ROLLUP_1M_RETENTION_DAYS', 14)),
+        '1h': timedelta(days=getattr(settings, 'MONITORING_ROLLUP_1H_RETENTION_DAYS', 400)),
+        '1d': None,
+    }
+
+
+def _merge(stats, value_min, value_max, value_sum, count):
+    if stats is None:
+        return [value_min, value_max, value_sum, count]
+    stats[0] = min(stats[0], value_min)
+    stats[1] = max(stats[1], value_max)
+    stats[2] += value_sum
+    stats[3] += count
+    return stats
+
+
+def _upsert(resolution, buckets):
+    objects = [
+        MetricRollup(
+            hostname=hostname, metric=metric, resolution=resolution, bucket=bucket,
+            min_value=stats[0], max_value=stats[1], sum_value=stats[2], count=stats[3],
+        )
+        for (hostname, metric, bucket), stats in buckets.items()
+    ]
+    MetricRollup.objects.bulk_create(
+        objects,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=UNIQUE_FIELDS,
+        update_fields=VALUE_FIELDS,
+    )
+
+
+def _existing(resolution, keys):
+    """
+    Stored rollups for `keys` ((hostname, metric, bucket) tuples), in one query.
+    """
+    if not keys:
+        return {}
+    buckets = [key[2] for key in keys]
+    rows = MetricRollup.objects.filter(
+        resolution=resolution,
+        hostname__in={key[0] for key in keys},
+        bucket__gte=min(buckets),
+        bucket__lte=max(buckets),
+    ).values_list('hostname', 'metric', 'bucket', *VALUE_FIELDS)
+    return {
+        (hostname, metric, bucket): list(stats)
+        for hostname, metric, bucket, *stats in rows
+        if (hostname, metric, bucket) in keys
+    }
+
+
+def _fold_raw(rows):
+    """
+    Aggregate raw SystemInfo rows into fresh 1m buckets.
+    """
+    buckets = {}
+    for hostname, timestamp, *values in rows:
+        bucket = floor_time(timestamp, 60)
+        for metric, value in zip(ROLLUP_METRICS, values):
+            if value is None:
+                continue
+            key = (hostname, metric, bucket)
+            buckets[key] = _merge(buckets.get(key), value, value, value, 1)
+    return buckets
+
+
+def _add(resolution, buckets):
+    """
+    Add `buckets` ({(hostname, metric, bucket): stats}) to the stored
+    `resolution` rollups.
+    """
+    merged = {key: list(stats) for key, stats in buckets.items()}
+    for key, stats in _existing(resolution, set(merged)).items():
+        merged[key] = _merge(stats, *merged[key])
+    _upsert(resolution, merged)
+
+
+def _coarsen(buckets, seconds):
+    """
+    `buckets` summed into buckets `seconds` wide.
+    """
+    coarse = {}
+    for (hostname, metric, bucket), stats in buckets.items():
+        key = (hostname, metric, floor_time(bucket, seconds))
+        coarse[key] = _merge(coarse.get(key), *stats)
+    return coarse
+
+
+def _recompute(resolution, finer, keys):
+    """
+    Rebuild `resolution` buckets for `keys` from the `finer` tier. Rebuilding
+    whole buckets (rather than adding to them) keeps this idempotent.
+    """
+    if not keys:
+        return
+    seconds = RESOLUTION_SECONDS[resolution]
+    starts = [key[2] for key in keys]
+    rows = MetricRollup.objects.filter(
+        resolution=finer,
+        hostname__in={key[0] for key in keys},
+        bucket__gte=min(starts),
+        bucket__lt=max(starts) + timedelta(seconds=seconds),
+    ).values_list('hostname', 'metric', 'bucket', *VALUE_FIELDS)
+
+    buckets = {}
+    for hostname, metric, bucket, value_min, value_max, value_sum, count in rows:
+        key = (hostname, metric, floor_time(bucket, seconds))
+        if key in keys:
+            buckets[key] = _merge(buckets.get(key), value_min, value_max, value_sum, count)
+    _upsert(resolution, buckets)
+
+
+def run_rollups(batch_size=50000):
+    """
+    Process one batch of new SystemInfo rows. Returns the number of rows read.
+    """
+    with transaction.atomic():
+        checkpoint, _ = RollupCheckpoint.objects.select_for_update().get_or_create(name=CHECKPOINT_NAME)
+        rows = list(
+            SystemInfo.objects
+            .filter(id__gt=checkpoint.last_id, id__lte=checkpoint.horizon_id)
+            .order_by('id')
+            .values_list('id', 'hostname', 'timestamp', *ROLLUP_METRICS)[:batch_size]
+        )
+
+        if rows:
+            now = timezone.now()
+            retention = tier_retention()
+            # What this batch adds, per bucket of the tier being written
+            added = _fold_raw(row[1:] for row in rows)
+            _add('1m', added)
+            for (finer, _), (resolution, seconds) in zip(RESOLUTIONS, RESOLUTIONS[1:]):
+                added = _coarsen(added, seconds)
+                horizon = now - retention[finer]
+                late = {key: stats for key, stats in added.items() if key[2] < horizon}
+                _add(resolution, late)
+                _recompute(resolution, finer, set(added) - set(late))
+
+            checkpoint.last_id = rows[-1][0]
+        else:
+            # Caught up to the old horizon: move it to what exists now
+            checkpoint.horizon_id = SystemInfo.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        checkpoint.save()
+    return len(rows)
+
+
+def run_until_caught_up(batch_size=50000):
+    total = 0
+    while True:
+        processed = run_rollups(batch_size)
+        total += processed
+        if not processed:
+            return total
+
+
+def prune_rollups(now=None):
+    """
+    Delete rollups older than their tier's retention.
+    """
+    now = now or timezone.now()
+    deleted = 0
+    for resolution, keep in tier_retention().items():
+        if resolution == 'raw' or keep is None:
+            continue
+        deleted += MetricRollup.objects.filter(resolution=resolution, bucket__lt=now - keep).delete()[0]
+    return deleted
+
+
+def choose_tier(start, end, step, now=None):
+    """
+    Pick the coarsest tier whose buckets are no wider than `step` seconds
+    and whose retention still covers `start`. 'raw' is SystemInfo itself.
+    """
+    now = now or timezone.now()
+    retention = tier_retention()
+    tiers = [('raw', 0)] + RESOLUTIONS
+    available = [
+        (name, seconds) for name, seconds in tiers
+        if retention[name] is None or start >= now - retention[name]
+    ]
+    fitting = [tier for tier in available if tier[1] <= step]
+    return (fitting[-1] if fitting else available[0])[0]
+
+
+def query_metric(hostname, metric, start, end, step):
+    """
+    Series of {t, min, max, avg, count} points, one per `step` seconds,
+    read from the cheapest tier that can answer the request.
+    """
+    tier = choose_tier(start, end, step)
+    if tier == 'raw':
+        rows = (
+            SystemInfo.objects.for_host(hostname)
+            .filter(timestamp__gte=start, timestamp__lt=end)
+            .exclude(**{f'{metric}__isnull': True})
+            .order_by('timestamp')
+            .values_list('timestamp', metric)
+        )
+        rows = ((timestamp, value, value, value, 1) for timestamp, value in rows)
+    else:
+        rows = (
+            MetricRollup.objects
+            .filter(hostname=hostname, metric=metric, resolution=tier,
+                    bucket__gte=floor_time(start, RESOLUTION_SECONDS[tier]), bucket__lt=end)
+            .order_by('bucket')
+            .values_list('bucket', *VALUE_FIELDS)
+        )
+
+    points = defaultdict(lambda: None)
+    for timestamp, value_min, value_max, value_sum, count in rows:
+        key = floor_time(timestamp, step)
+        points[key] = _merge(points[key], value_min, value_max, value_sum, count)
+
+    series = [
+        {
+            't': bucket.isoformat(),
+            'min': stats[0],
+            'max': stats[1],
+            'avg': stats[2] / stats[3],
+            'count': stats[3],
+        }
+        for bucket, stats in sorted(points.items())
+    ]
+    return tier, series
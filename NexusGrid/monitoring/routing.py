@@ -0,0 +1,8 @@
+from django.urls import path
+
+from . import consumers
+
+websocket_urlpatterns = [
+    path('ws/metrics/lab/<int:lab_id>/', consumers.MetricsConsumer.as_asgi()),
+    path('ws/metrics/system/<int:system_id>/', consumers.MetricsConsumer.as_asgi()),
+]
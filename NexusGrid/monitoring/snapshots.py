@@ -0,0 +1,114 @@
+"""
+Latest-sample snapshot per System (HostSnapshot).
+
+Ingest upserts one row per System whose host_name reported in the batch, in
+the same transaction as the history rows. The upsert only wins if its sample
+is at least as new as the stored one, so replayed collector spools can't roll
+a snapshot back. Snapshots are keyed by System.id and carry the hostname they
+were taken for; renaming a System's host invalidates its snapshot.
+"""
+from django.db import connection
+from django.utils import timezone
+
+from system_layout.models import System
+
+from .models import HostSnapshot, SystemInfo
+
+
+def _latest_per_host(rows):
+    """
+    Newest row per hostname from rows ordered like ingest.COLUMNS.
+    """
+    latest = {}
+    for row in rows:
+        current = latest.get(row[0])
+        if current is None or row[1] >= current[1]:
+            latest[row[0]] = row
+    return latest
+
+
+def _upsert_sql(columns):
+    meta = HostSnapshot._meta
+    quote = connection.ops.quote_name
+    table = quote(meta.db_table)
+    names = [quote(meta.get_field(name).column) for name in columns]
+    pk = quote(meta.pk.column)
+    updated_at = quote(meta.get_field('updated_at').column)
+    timestamp = quote(meta.get_field('timestamp').column)
+    assignments = ', '.join(f"{name} = EXCLUDED.{name}" for name in names + [updated_at])
+    placeholders = ', '.join(['%s'] * (len(names) + 2))
+    return (
+        f"INSERT INTO {table} ({pk}, {updated_at}, {', '.join(names)}) VALUES ({placeholders}) "
+        f"ON CONFLICT ({pk}) DO UPDATE SET {assignments} "
+        f"WHERE {table}.{timestamp} <= EXCLUDED.{timestamp}"
+    )
+
+
+def update_snapshots(rows, columns):
+    """
+    Upsert snapshots for the Systems that `rows` (tuples ordered like
+    `columns`, hostname and timestamp first) belong to. Returns the
+    touched Systems as (system_id, lab_id, row) tuples.
+    """
+    latest = _latest_per_host(rows)
+    if not latest:
+        return []
+    systems = System.objects.filter(host_name__in=list(latest)).values_list('id', 'lab_id', 'host_name')
+
+    adapt = connection.ops.adapt_datetimefield_value
+    now = adapt(timezone.now())
+    touched = []
+    params = []
+    for system_id, lab_id, host_name in systems:
+        row = latest[host_name]
+        touched.append((system_id, lab_id, row))
+        params.append((system_id, now, row[0], adapt(row[1])) + tuple(row[2:]))
+    if params:
+        _upsert(columns, params)
+    return touched
+
+
+def _upsert(columns, params):
+    with connection.cursor() as cursor:
+        cursor.executemany(_upsert_sql(columns), params)
+
+
+def invalidate_snapshots(system_ids):
+    """
+    Drop snapshots that no longer describe their System, e.g. after its
+    host_name changed. The next ingest batch for the new host recreates them.
+    """
+    return HostSnapshot.objects.filter(monitored_system_id__in=system_ids).delete()[0]
+
+
+def store_sample(system, sample):
+    """
+    Upsert the SystemInfo `sample` as the snapshot of `system`, under the same
+    newer-wins rule as ingest. Returns the snapshot stored for the system's
+    host afterwards, which may be a newer one ingest wrote meanwhile.
+    """
+    columns = [field.name for field in SystemInfo._meta.concrete_fields if not field.primary_key]
+    adapt = connection.ops.adapt_datetimefield_value
+    values = tuple(
+        adapt(getattr(sample, name)) if name == 'timestamp' else getattr(sample, name)
+        for name in columns
+    )
+    _upsert(columns, [(system.pk, adapt(timezone.now())) + values])
+    return HostSnapshot.objects.filter(monitored_system=system, hostname=system.host_name).first()
+
+
+def get_snapshot(system):
+    """
+    Current state for `system`, or None. Falls back to the newest recent
+    sample (and stores it) when ingest hasn't produced a snapshot yet.
+    """
+    if not system.host_name:
+        return None
+    snapshot = HostSnapshot.objects.filter(monitored_system=system, hostname=system.host_name).first()
+    if snapshot:
+        return snapshot
+
+    sample = SystemInfo.objects.latest_sample(system.host_name)
+    if sample is None:
+        return None
+    return store_sample(system, sample)
@@ -0,0 +1,484 @@
+import gzip
+import json
+import os
+import tempfile
+from datetime import timedelta
+
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from login_manager.models import User
+from system_layout.models import Lab, LayoutItem, System
+
+from .collector import FAILED, SENT, UNREACHABLE, Collector, Spool
+from .ingest import ingest_samples
+from .live import lab_group
+from .models import CLOCK_SKEW, HostSnapshot, MetricRollup, SystemInfo
+from .partitions import (
+    _known_days, accepted_window, create_future_partitions, drop_expired_partitions, is_partitioned,
+    list_partitions, partition_name,
+)
+from .rollups import RESOLUTIONS, floor_time, prune_rollups, run_until_caught_up
+from .routing import websocket_urlpatterns
+from .snapshots import get_snapshot, store_sample
+
+TOKEN = 'collector-secret'
+
+
+def _system(host_name):
+    floor = LayoutItem.objects.create(name='Floor 1', item_type='floor')
+    room = LayoutItem.objects.create(name='Lab 1', item_type='room', parent=floor)
+    lab = Lab.objects.create(layout_item=room, lab_name='Lab 1')
+    item = LayoutItem.objects.create(name='PC 2', item_type='computer', parent=room)
+    return System.objects.create(layout_item=item, lab=lab, host_name=host_name)
+
+
+def _sample(**fields):
+    return {'hostname': 'lab1-pc01', 'timestamp': timezone.now().isoformat(), 'cpu_usage': 12.5, **fields}
+
+
+@override_settings(MONITORING_INGEST_TOKEN=TOKEN, MONITORING_MAX_BATCH_SIZE=3)
+class IngestTests(TestCase):
+    url = reverse('monitoring_ingest')
+
+    @classmethod
+    def setUpTestData(cls):
+        _system('lab1-pc02')
+
+    def post(self, samples, token=TOKEN):
+        headers = {'HTTP_AUTHORIZATION': f'Token {token}'} if token is not None else {}
+        return self.client.post(self.url, json.dumps({'samples': samples}), content_type='application/json', **headers)
+
+    def test_missing_token_is_rejected(self):
+        response = self.post([_sample()], token=None)
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(SystemInfo.objects.exists())
+
+    def test_wrong_token_is_rejected(self):
+        response = self.post([_sample()], token='guess')
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(SystemInfo.objects.exists())
+
+    @override_settings(MONITORING_INGEST_TOKEN='')
+    def test_ingest_is_disabled_without_a_configured_token(self):
+        response = self.post([_sample()], token='')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(SystemInfo.objects.exists())
+
+    def test_oversized_batch_is_rejected(self):
+        response = self.post([_sample() for _ in range(4)])
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(SystemInfo.objects.exists())
+
+    def test_malformed_sample_is_rejected(self):
+        response = self.post([_sample(cpu_usage='lots')])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['rejected'], 1)
+        self.assertFalse(SystemInfo.objects.exists())
+
+    def test_malformed_sample_does_not_sink_the_batch(self):
+        response = self.post([_sample(), {'cpu_usage': 3}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['accepted'], 1)
+        self.assertEqual(response.json()['errors'], [{'index': 1, 'error': 'hostname is required'}])
+
+    @override_settings(MONITORING_MAX_BATCH_SIZE=10)
+    def test_values_the_columns_cannot_hold_are_rejected_per_sample(self):
+        bad = [
+            _sample(cpu_total_cores=-5),
+            _sample(memory_total=10 ** 30),
+            _sample(cpu_usage=10 ** 400),
+            _sample(timestamp=1e20),
+            _sample(timestamp='2024-13-45T00:00:00'),
+        ]
+        response = self.post([_sample(), *bad])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['accepted'], response.json()['rejected']), (1, 5))
+        self.assertEqual([error['index'] for error in response.json()['errors']], [1, 2, 3, 4, 5])
+        self.assertEqual(SystemInfo.objects.count(), 1)
+
+    def post_gzip(self, payload):
+        return self.client.post(
+            self.url, gzip.compress(payload), content_type='application/json',
+            HTTP_AUTHORIZATION=f'Token {TOKEN}', HTTP_CONTENT_ENCODING='gzip',
+        )
+
+    def test_gzip_body_is_accepted(self):
+        response = self.post_gzip(json.dumps({'samples': [_sample()]}).encode())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['accepted'], 1)
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=10_000)
+    def test_gzip_body_is_not_expanded_past_the_upload_limit(self):
+        body = json.dumps({'samples': [_sample()]}).encode() + b' ' * 20_000
+        self.assertLess(len(gzip.compress(body)), 1000)
+
+        response = self.post_gzip(body)
+
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(SystemInfo.objects.exists())
+
+    def test_truncated_gzip_body_is_rejected(self):
+        response = self.client.post(
+            self.url, gzip.compress(b'{"samples": []}')[:-8], content_type='application/json',
+            HTTP_AUTHORIZATION=f'Token {TOKEN}', HTTP_CONTENT_ENCODING='gzip',
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_valid_batch_is_stored(self):
+        samples = [_sample(), _sample(hostname='lab1-pc02', cpu_usage=40, memory_used=2048)]
+        response = self.post(samples)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['accepted'], 2)
+        self.assertEqual(
+            sorted(SystemInfo.objects.values_list('hostname', 'cpu_usage', 'memory_used')),
+            [('lab1-pc01', 12.5, None), ('lab1-pc02', 40.0, 2048)],
+        )
+        self.assertEqual(HostSnapshot.objects.get(hostname='lab1-pc02').cpu_usage, 40.0)
+
+
+@override_settings(MONITORING_RETENTION_DAYS=30)
+class PartitionTests(TestCase):
+    # Rolled-back DDL leaves the partitions this process thinks exist behind
+    def setUp(self):
+        _known_days.clear()
+        self.addCleanup(_known_days.clear)
+
+    def test_samples_outside_the_accepted_window_are_rejected(self):
+        now = timezone.now()
+        oldest, newest = accepted_window(now)
+        self.assertEqual((oldest, newest), (now - timedelta(days=30), now + CLOCK_SKEW))
+
+        result = ingest_samples([
+            _sample(timestamp=(now - timedelta(days=31)).isoformat()),
+            _sample(timestamp=(now + timedelta(hours=1)).isoformat()),
+            _sample(timestamp=(now - timedelta(days=29)).isoformat()),
+        ])
+
+        self.assertEqual((result['accepted'], result['rejected']), (1, 2))
+        self.assertEqual([error['index'] for error in result['errors']], [0, 1])
+        self.assertEqual(SystemInfo.objects.count(), 1)
+
+    def test_future_partitions_are_created_once(self):
+        created = create_future_partitions(ahead=2)
+        if not is_partitioned():
+            self.assertEqual(created, [])
+            return
+        today = timezone.now().date()
+        self.assertEqual(created, [today + timedelta(days=offset) for offset in range(3)])
+        self.assertLessEqual({partition_name(day) for day in created}, {name for name, _ in list_partitions()})
+        self.assertEqual(create_future_partitions(ahead=2), [])
+
+    @override_settings(MONITORING_RETENTION_DAYS=60)
+    def test_expired_days_are_dropped(self):
+        now = timezone.now()
+        old, recent = now - timedelta(days=40), now - timedelta(days=2)
+        ingest_samples([_sample(timestamp=old.isoformat()), _sample(timestamp=recent.isoformat())])
+
+        dropped = drop_expired_partitions(retention=30)
+
+        if is_partitioned():
+            self.assertIn(partition_name(old.date()), dropped)
+            self.assertNotIn(partition_name(recent.date()), dropped)
+            self.assertNotIn(old.date(), [day for _, day in list_partitions()])
+        else:
+            self.assertEqual(dropped, 1)
+        self.assertEqual(list(SystemInfo.objects.values_list('timestamp', flat=True)), [recent])
+
+
+class SnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.system = _system('lab1-pc01')
+
+    def ingest_at(self, when, cpu_usage):
+        ingest_samples([_sample(timestamp=when.isoformat(), cpu_usage=cpu_usage)])
+
+    def test_ingest_never_rolls_a_snapshot_back(self):
+        now = timezone.now()
+        self.ingest_at(now, 50)
+        self.ingest_at(now - timedelta(minutes=5), 10)
+
+        snapshot = HostSnapshot.objects.get(monitored_system=self.system)
+        self.assertEqual((snapshot.timestamp, snapshot.cpu_usage), (now, 50))
+
+    def test_read_fallback_never_replaces_a_newer_snapshot(self):
+        now = timezone.now()
+        self.ingest_at(now - timedelta(minutes=5), 10)
+        older = SystemInfo.objects.get()
+        self.ingest_at(now, 50)
+
+        # As if ingest stored the newer sample while the read path was loading the older one
+        snapshot = store_sample(self.system, older)
+
+        self.assertEqual((snapshot.timestamp, snapshot.cpu_usage), (now, 50))
+        self.assertEqual(HostSnapshot.objects.get(monitored_system=self.system).cpu_usage, 50)
+
+    def test_read_fallback_stores_the_latest_sample(self):
+        now = timezone.now()
+        self.ingest_at(now, 50)
+        HostSnapshot.objects.all().delete()
+
+        snapshot = get_snapshot(self.system)
+
+        self.assertEqual((snapshot.timestamp, snapshot.cpu_usage), (now, 50))
+        self.assertTrue(HostSnapshot.objects.filter(monitored_system=self.system).exists())
+
+
+class RollupTests(TestCase):
+    """
+    Every rollup tier must hold the same min/max/sum/count as the raw
+    samples it covers, however the samples arrive.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='watcher', email='watcher@example.com', password='x')
+        cls.hour = floor_time(timezone.now() - timedelta(hours=3), 3600)
+
+    def ingest(self, *samples):
+        ingest_samples([_sample(timestamp=when.isoformat(), cpu_usage=value) for when, value in samples])
+
+    def roll_up(self):
+        # The first run only moves the checkpoint's horizon up to the new rows
+        run_until_caught_up()
+        run_until_caught_up()
+
+    def stored(self, resolution):
+        rows = MetricRollup.objects.filter(hostname='lab1-pc01', metric='cpu_usage', resolution=resolution)
+        return {bucket: (low, high, total, count) for bucket, low, high, total, count in rows.values_list(
+            'bucket', 'min_value', 'max_value', 'sum_value', 'count'
+        )}
+
+    def expected(self, seconds):
+        buckets = {}
+        for timestamp, value in SystemInfo.objects.values_list('timestamp', 'cpu_usage'):
+            low, high, total, count = buckets.get(floor_time(timestamp, seconds), (value, value, 0, 0))
+            buckets[floor_time(timestamp, seconds)] = (min(low, value), max(high, value), total + value, count + 1)
+        return buckets
+
+    def assertMatchesRaw(self, resolutions=RESOLUTIONS):
+        for resolution, seconds in resolutions:
+            self.assertEqual(self.stored(resolution), self.expected(seconds), resolution)
+
+    def test_tiers_match_the_raw_samples(self):
+        self.ingest(
+            (self.hour + timedelta(seconds=10), 10), (self.hour + timedelta(seconds=30), 30),
+            (self.hour + timedelta(seconds=70), 50), (self.hour + timedelta(hours=2, seconds=5), 90),
+        )
+        self.roll_up()
+
+        self.assertMatchesRaw()
+        self.assertEqual(self.stored('1h')[self.hour], (10, 50, 90, 3))
+
+    def test_samples_in_later_batches_are_merged(self):
+        self.ingest((self.hour + timedelta(seconds=10), 10), (self.hour + timedelta(minutes=30), 20))
+        self.roll_up()
+        self.ingest((self.hour + timedelta(seconds=20), 40), (self.hour + timedelta(minutes=59), 5))
+        self.roll_up()
+
+        self.assertMatchesRaw()
+        self.assertEqual(self.stored('1m')[self.hour], (10, 40, 50, 2))
+
+    @override_settings(MONITORING_ROLLUP_1M_RETENTION_DAYS=1)
+    def test_late_sample_past_the_minute_retention_is_added_to_its_hour(self):
+        hour = floor_time(timezone.now() - timedelta(days=3), 3600)
+        self.ingest((hour + timedelta(minutes=5), 20), (hour + timedelta(minutes=40), 60))
+        self.roll_up()
+        prune_rollups()
+        self.assertEqual(self.stored('1m'), {})
+
+        # Replayed from a collector's spool days later
+        self.ingest((hour + timedelta(minutes=20), 10))
+        self.roll_up()
+
+        self.assertEqual(self.stored('1h'), {hour: (10, 60, 90, 3)})
+        self.assertMatchesRaw(RESOLUTIONS[1:])
+
+    def get_metrics(self, **params):
+        self.client.force_login(self.user)
+        return self.client.get(reverse('monitoring_metrics'), {'hostname': 'lab1-pc01', **params})
+
+    def test_metrics_api_reads_the_coarsest_fitting_tier(self):
+        self.ingest(
+            (self.hour + timedelta(seconds=10), 10), (self.hour + timedelta(minutes=10), 30),
+            (self.hour + timedelta(hours=1, minutes=1), 50),
+        )
+        self.roll_up()
+        span = {'start': self.hour.isoformat(), 'end': (self.hour + timedelta(hours=2)).isoformat()}
+
+        response = self.get_metrics(step=3600, **span)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['resolution'], '1h')
+        self.assertEqual(
+            [(point['min'], point['max'], point['avg'], point['count']) for point in response.json()['points']],
+            [(10, 30, 20, 2), (50, 50, 50, 1)],
+        )
+
+        response = self.get_metrics(step=60, **span)
+        self.assertEqual(response.json()['resolution'], '1m')
+        self.assertEqual(len(response.json()['points']), 3)
+        self.assertEqual(self.get_metrics(step=10, **span).json()['resolution'], 'raw')
+
+    def test_metrics_api_rejects_bad_queries(self):
+        for params in [{'metric': 'fan_speed'}, {'step': 0}, {'start': 'yesterday'}, {'step': 1, 'start': '0'}]:
+            self.assertEqual(self.get_metrics(**params).status_code, 400, params)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('monitoring_metrics')).status_code, 400)
+
+
+def _update(system_id, cpu_usage):
+    return {'system_id': system_id, 'hostname': f'host-{system_id}', 'cpu_usage': cpu_usage}
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    MONITORING_PUSH_INTERVAL=0.2,
+)
+class MetricsConsumerTests(TransactionTestCase):
+    # The consumers' database_sync_to_async closes connections left inside
+    # a transaction, so these tests can't run in one
+
+    def setUp(self):
+        self.system = _system('lab1-pc01')
+        self.user = User.objects.create_user(username='watcher', email='watcher@example.com', password='x')
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/metrics/lab/{self.system.lab_id}/')
+        communicator.scope['user'] = user
+        connected, code = await communicator.connect()
+        return communicator, connected, code
+
+    async def broadcast(self, *updates):
+        await get_channel_layer().group_send(
+            lab_group(self.system.lab_id), {'type': 'metrics.update', 'systems': list(updates)}
+        )
+
+    async def test_anonymous_socket_is_closed(self):
+        communicator, connected, code = await self.connect(AnonymousUser())
+        self.assertFalse(connected)
+        self.assertEqual(code, 4401)
+
+    async def test_authenticated_socket_receives_the_lab_broadcast(self):
+        communicator, connected, _ = await self.connect(self.user)
+        self.assertTrue(connected)
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'snapshot', 'systems': []})
+
+        await self.broadcast(_update(self.system.pk, 30))
+
+        self.assertEqual(
+            await communicator.receive_json_from(),
+            {'type': 'metrics', 'systems': [_update(self.system.pk, 30)]},
+        )
+        await communicator.disconnect()
+
+    async def test_updates_within_one_interval_coalesce_into_one_frame(self):
+        communicator, _, _ = await self.connect(self.user)
+        await communicator.receive_json_from()
+
+        await self.broadcast(_update(1, 10), _update(2, 20))
+        await self.broadcast(_update(1, 11))
+        await self.broadcast(_update(1, 12))
+
+        frame = await communicator.receive_json_from()
+        self.assertEqual(frame, {'type': 'metrics', 'systems': [_update(1, 12), _update(2, 20)]})
+        self.assertTrue(await communicator.receive_nothing(timeout=0.4))
+        await communicator.disconnect()
+
+
+class SpoolTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.spool = Spool(os.path.join(directory.name, 'collector.spool'))
+
+    def test_replay_skips_a_truncated_final_line(self):
+        self.spool.append({'samples': [1]})
+        self.spool.append({'samples': [2]})
+        with open(self.spool.path, 'a') as f:
+            f.write('{"samples": [3')
+        sent = []
+
+        with self.assertLogs('monitoring.collector', 'ERROR'):
+            self.assertTrue(self.spool.replay(lambda payload: sent.append(payload) or SENT))
+
+        self.assertEqual(sent, [{'samples': [1]}, {'samples': [2]}])
+        self.assertEqual(self.spool.size(), 0)
+        self.assertEqual(self.spool._read_offset(), 0)
+
+    def test_replay_resumes_past_a_corrupt_line(self):
+        self.spool.append({'samples': [1]})
+        with open(self.spool.path, 'a') as f:
+            f.write('{"samp\n')
+        self.spool.append({'samples': [2]})
+        self.spool.append({'samples': [3]})
+        sent = []
+
+        def send(payload):
+            # The server goes away after the second delivery
+            sent.append(payload)
+            return SENT if len(sent) < 3 else UNREACHABLE
+
+        with self.assertLogs('monitoring.collector', 'ERROR'):
+            self.assertFalse(self.spool.replay(send))
+        self.assertTrue(self.spool.replay(lambda payload: sent.append(payload) or SENT))
+
+        self.assertEqual(sent, [{'samples': [1]}, {'samples': [2]}, {'samples': [3]}, {'samples': [3]}])
+
+    def rejected(self):
+        with open(self.spool.rejected_path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_batch_the_server_fails_on_is_set_aside(self):
+        for batch in [1, 2, 3]:
+            self.spool.append({'samples': [batch]})
+        sent = []
+
+        def send(payload):
+            sent.append(payload['samples'][0])
+            return FAILED if payload['samples'] == [1] else SENT
+
+        self.assertTrue(self.spool.replay(send))
+        self.assertEqual(sent, [1, 2, 3])
+        self.assertGreater(self.spool.size(), 0)
+
+        with self.assertLogs('monitoring.collector', 'ERROR'):
+            for _ in range(self.spool.max_attempts - 1):
+                self.assertTrue(self.spool.replay(send))
+        self.assertEqual(sent, [1, 2, 3] + [1] * (self.spool.max_attempts - 1))
+        self.assertEqual(self.spool.size(), 0)
+        self.assertEqual(self.rejected(), [{'samples': [1]}])
+
+    def test_unreachable_server_does_not_use_up_attempts(self):
+        self.spool.append({'samples': [1]})
+        for _ in range(self.spool.max_attempts * 2):
+            self.assertFalse(self.spool.replay(lambda payload: UNREACHABLE))
+        sent = []
+
+        self.assertTrue(self.spool.replay(lambda payload: sent.append(payload) or SENT))
+
+        self.assertEqual(sent, [{'samples': [1]}])
+        self.assertFalse(os.path.exists(self.spool.rejected_path))
+
+    def test_flush_sends_the_new_batch_past_a_failing_spooled_one(self):
+        collector = Collector('http://ingest.invalid/', spool_path=self.spool.path)
+        self.spool.append({'samples': ['poison']})
+        sent = []
+
+        def send(payload):
+            sent.append(payload['samples'])
+            return FAILED if payload['samples'] == ['poison'] else SENT
+
+        collector.send = send
+        collector.buffer = [{'hostname': 'lab1-pc01', 'timestamp': 1, 'cpu_usage': 5.0}]
+        collector.flush()
+
+        self.assertEqual(sent, [['poison'], [{'timestamp': 1, 'cpu_usage': 5.0}]])
+        self.assertEqual(collector.buffer, [])
@@ -1,6 +1,7 @@
 from django.urls import path
-from . import views  # or the correct import
+from . import views
 
 urlpatterns = [
-    
-]
\ No newline at end of file
+    path('ingest/', views.ingest, name='monitoring_ingest'),
+    path('metrics/', views.metrics, name='monitoring_metrics'),
+]
@@ -0,0 +1,163 @@
+import gzip
+import hmac
+import io
+import json
+import logging
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from .ingest import SampleError, ingest_samples, parse_timestamp
+from .rollups import ROLLUP_METRICS, query_metric
+
+logger = logging.getLogger(__name__)
+
+
+def _ingest_authorized(request, expected):
+    """
+    Collectors authenticate with the shared MONITORING_INGEST_TOKEN.
+    """
+    header = request.headers.get('Authorization', '')
+    token = header[len('Token '):] if header.startswith('Token ') else request.headers.get('X-Ingest-Token', '')
+    return hmac.compare_digest(token.encode(), expected.encode())
+
+
+class _BodyTooLarge(ValueError):
+    pass
+
+
+def _gunzip(body):
+    """
+    Decompress a gzip-encoded body, refusing to expand it past
+    DATA_UPLOAD_MAX_MEMORY_SIZE: a few kilobytes of gzip can unpack to
+    gigabytes.
+    """
+    limit = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+    with gzip.GzipFile(fileobj=io.BytesIO(body)) as f:
+        data = f.read(-1 if limit is None else limit + 1)
+    if limit is not None and len(data) > limit:
+        raise _BodyTooLarge
+    return data
+
+
+@csrf_exempt
+@require_POST
+def ingest(request):
+    """
+    Batched telemetry ingest.
+
+    Body: {"samples": [{"hostname": ..., "timestamp": ..., "cpu_usage": ...}, ...]}
+    (a bare list is accepted too), optionally gzip-encoded. A top-level
+    "hostname" applies to samples without one; with "delta": true each sample
+    only carries the fields that changed since the previous one for its host.
+    """
+    expected = getattr(settings, 'MONITORING_INGEST_TOKEN', '')
+    if not expected:
+        # The view is CSRF-exempt; without a token anyone could write samples
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Telemetry ingest is disabled until MONITORING_INGEST_TOKEN is set'
+        }, status=403)
+    if not _ingest_authorized(request, expected):
+        return JsonResponse({'status': 'error', 'message': 'Invalid ingest token'}, status=401)
+
+    try:
+        body = request.body
+        if request.headers.get('Content-Encoding') == 'gzip':
+            body = _gunzip(body)
+        data = json.loads(body)
+    except _BodyTooLarge:
+        return JsonResponse({'status': 'error', 'message': 'Decompressed body too large'}, status=413)
+    except (OSError, EOFError, ValueError):
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON body'}, status=400)
+
+    samples = data.get('samples') if isinstance(data, dict) else data
+    if not isinstance(samples, list):
+        return JsonResponse({'status': 'error', 'message': 'samples must be a list'}, status=400)
+
+    max_batch = getattr(settings, 'MONITORING_MAX_BATCH_SIZE', 5000)
+    if len(samples) > max_batch:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Batch too large ({len(samples)} > {max_batch} samples)'
+        }, status=413)
+
+    try:
+        options = data if isinstance(data, dict) else {}
+        result = ingest_samples(samples, options.get('hostname'), bool(options.get('delta')))
+    except Exception as e:
+        logger.error(f"Telemetry ingest failed: {str(e)}")
+        return JsonResponse({'status': 'error', 'message': 'Unable to store samples'}, status=500)
+
+    status = 400 if samples and not result['accepted'] else 200
+    return JsonResponse({'status': 'success' if status == 200 else 'error', **result}, status=status)
+
+
+# Keep responses to a plottable size whatever range is asked for
+MAX_POINTS = 2000
+
+
+@login_required(login_url="/login/")
+@require_GET
+def metrics(request):
+    """
+    Time series for one host metric.
+
+    GET ?hostname=&metric=cpu_usage&start=&end=&step=300 (start/end as
+    ISO-8601 or epoch seconds, step in seconds). Served from the coarsest
+    rollup tier that still gives `step` resolution, or raw samples for
+    sub-minute steps.
+    """
+    hostname = request.GET.get('hostname', '').strip()
+    metric = request.GET.get('metric', 'cpu_usage')
+    if not hostname:
+        return JsonResponse({'status': 'error', 'message': 'hostname is required'}, status=400)
+    if metric not in ROLLUP_METRICS:
+        return JsonResponse({
+            'status': 'error',
+            'message': f"metric must be one of: {', '.join(ROLLUP_METRICS)}"
+        }, status=400)
+
+    try:
+        end = parse_timestamp(_epoch_or_iso(request.GET.get('end')))
+        start = (parse_timestamp(_epoch_or_iso(request.GET.get('start')))
+                 if request.GET.get('start') else end - timedelta(hours=1))
+        step = int(request.GET.get('step', 60))
+    except (SampleError, ValueError):
+        return JsonResponse({'status': 'error', 'message': 'Invalid start, end or step'}, status=400)
+
+    if step <= 0 or start >= end:
+        return JsonResponse({'status': 'error', 'message': 'start must be before end and step positive'}, status=400)
+    if (end - start).total_seconds() / step > MAX_POINTS:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Too many points requested (max {MAX_POINTS}); use a larger step'
+        }, status=400)
+
+    try:
+        tier, series = query_metric(hostname, metric, start, end, step)
+    except Exception as e:
+        logger.error(f"Metric query failed: {str(e)}")
+        return JsonResponse({'status': 'error', 'message': 'Unable to load metrics'}, status=500)
+
+    return JsonResponse({
+        'status': 'success',
+        'hostname': hostname,
+        'metric': metric,
+        'step': step,
+        'resolution': tier,
+        'generated_at': timezone.now().isoformat(),
+        'points': series,
+    })
+
+
+def _epoch_or_iso(value):
+    if value and value.replace('.', '', 1).isdigit():
+        return float(value)
+    return value
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.3 on 2026-10-18 14:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='resourcerequest',
+            index=models.Index(fields=['requested_at', 'resource_id'], name='resources_r_request_113a96_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resourcerequest',
+            index=models.Index(fields=['status', 'requested_at', 'resource_id'], name='resources_r_status_7d6aaa_idx'),
+        ),
+    ]
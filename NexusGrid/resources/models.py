@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from login_manager.models import User  # Correct import for User model
 from system_layout.models import System  # Ensure correct reference to System model
 
@@ -8,6 +8,7 @@ class ResourceRequest(models.Model):
         ('Fulfilled', 'Fulfilled'),
         ('Denied', 'Denied'),
     ]
+    PENDING = 'Pending'
 
     resource_id = models.AutoField(primary_key=True)
     system_name = models.ForeignKey(System, on_delete=models.CASCADE)
@@ -17,9 +18,21 @@ class ResourceRequest(models.Model):
     status = models.CharField(max_length=30, choices=STATUS_CHOICES, default='Pending')
     requested_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination orders by (requested_at, resource_id), optionally per status
+            models.Index(fields=['requested_at', 'resource_id']),
+            models.Index(fields=['status', 'requested_at', 'resource_id']),
+        ]
+
     def __str__(self):
         return f"Resource {self.resource_id} - {self.system_name}"
 
+    def save(self, *args, **kwargs):
+        # post_save moves LayoutRollup.pending_requests; it must commit with the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 class Provided(models.Model):
     resource_request = models.OneToOneField(ResourceRequest, on_delete=models.CASCADE)
     provision_summary = models.TextField()
@@ -1,3 +1,16 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.urls import reverse
 
-# Create your tests here.
+from login_manager.models import User
+
+
+@override_settings(COMPRESS_ENABLED=False, COMPRESS_OFFLINE=False)
+class ResourceRequestListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='staff', email='staff@example.com', password='x')
+
+    def test_tampered_cursor_is_rejected(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('resource_requests'), {'cursor': 'eyJhZnRlciI6WyIxIl19:forged'})
+        self.assertEqual(response.status_code, 400)
@@ -1,5 +1,5 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+from django.http import HttpResponseBadRequest, JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from django.db.models import Q
@@ -7,7 +7,7 @@ from .models import ResourceRequest, Provided
 from .models import ResourceRequest
 from system_layout.models import LayoutItem, Lab, System
 from django.utils import timezone
-from django.core.paginator import Paginator
+from NexusGrid.pagination import InvalidCursor, paginate
 import json
 
 @login_required
@@ -46,15 +46,17 @@ def resource_requests(request):
         elif time == 'custom' and start and end:
             qs = qs.filter(requested_at__date__gte=start, requested_at__date__lte=end)
 
-    # Sorting
+    # Sorting: keyset pages by (requested_at, resource_id), see NexusGrid.pagination
     if sort == 'oldest':
-        qs = qs.order_by('requested_at')
+        keys = ['requested_at', 'resource_id']
     else:
-        qs = qs.order_by('-requested_at')
+        keys = ['-requested_at', '-resource_id']
 
-    paginator = Paginator(qs, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    try:
+        page_obj = paginate(qs, request.GET.get('cursor'), request.GET, keys,
+                            with_total=request.GET.get('total') == '1')
+    except InvalidCursor as e:
+        return HttpResponseBadRequest(str(e))
     return render(request, 'resources/resources.html', {
         "resource_requests": page_obj.object_list,
         "page_obj": page_obj,
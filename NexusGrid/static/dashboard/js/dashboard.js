@@ -315,13 +315,14 @@ function initRoleBasedVisibility() {
     });
 }
 
+// Live updates arrive over a WebSocket; polling only runs while it is down
+const POLL_INTERVAL = 5 * 60 * 1000; // 5 minutes
+const MAX_RECONNECT_DELAY = 5 * 60 * 1000;
+let pollTimer = null;
+let dashboardEtag = null;
+
 function setupRefreshHandlers() {
-    // Setup automatic refresh for dashboard data
-    const refreshInterval = 5 * 60 * 1000; // 5 minutes
-    
-    setInterval(() => {
-        refreshDashboardData();
-    }, refreshInterval);
+    connectDashboardSocket();
     
     // Manual refresh button
     const refreshBtn = document.getElementById('refresh-dashboard');
@@ -330,19 +331,68 @@ function setupRefreshHandlers() {
     }
 }
 
-function refreshDashboardData() {
+function startPolling() {
+    if (pollTimer) return;
+    pollTimer = setInterval(() => refreshDashboardData({ silent: true }), POLL_INTERVAL);
+}
+
+function stopPolling() {
+    if (pollTimer) {
+        clearInterval(pollTimer);
+        pollTimer = null;
+    }
+}
+
+function connectDashboardSocket(retryDelay = 1000) {
+    if (!('WebSocket' in window)) {
+        startPolling();
+        return;
+    }
+
+    const scheme = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    const socket = new WebSocket(`${scheme}://${window.location.host}/ws/dashboard/`);
+    let nextDelay = retryDelay;
+
+    socket.addEventListener('open', () => {
+        stopPolling();
+        nextDelay = 1000;
+    });
+
+    socket.addEventListener('message', event => {
+        const message = JSON.parse(event.data);
+        if (message.type === 'metrics') {
+            updateDashboardMetrics(message.changed);
+        }
+    });
+
+    socket.addEventListener('close', () => {
+        startPolling();
+        setTimeout(() => connectDashboardSocket(Math.min(nextDelay * 2, MAX_RECONNECT_DELAY)), nextDelay);
+    });
+}
+
+function refreshDashboardData(options) {
+    const silent = options && options.silent === true;
     const refreshBtn = document.getElementById('refresh-dashboard');
     if (refreshBtn) {
         refreshBtn.innerHTML = '<i class="fas fa-spinner fa-spin"></i>';
         refreshBtn.disabled = true;
     }
     
-    fetch('/dashboard/api/?action=metrics')
-        .then(response => response.json())
+    // Conditional GET: a 304 means what's on screen is current
+    const headers = dashboardEtag ? { 'If-None-Match': dashboardEtag } : {};
+    fetch('/dashboard/api/?action=metrics', { headers })
+        .then(response => {
+            if (response.status === 304) return null;
+            dashboardEtag = response.headers.get('ETag');
+            return response.json();
+        })
         .then(data => {
-            if (data.success) {
+            if (data === null) {
+                if (!silent) showRefreshSuccess();
+            } else if (data.success) {
                 updateDashboardMetrics(data.data);
-                showRefreshSuccess();
+                if (!silent) showRefreshSuccess();
             } else {
                 showRefreshError(data.error);
             }
@@ -360,21 +410,38 @@ function refreshDashboardData() {
 }
 
 function updateDashboardMetrics(data) {
-    // Update metric values with animation
+    // Update metric values with animation; pushed updates only carry what changed
     const updates = [
         { id: 'functional-count', value: data.functional_count },
         { id: 'critical-count', value: data.critical_count },
         { id: 'active-count', value: data.active_count },
         { id: 'total-systems', value: data.total_systems },
-        { id: 'system-utilization', value: data.system_utilization }
+        { id: 'system-utilization', value: data.system_utilization },
+        { id: 'fault-reports-count', value: data.fault_reports_count },
+        { id: 'resource-requests-count', value: data.resource_requests_count }
     ];
     
     updates.forEach(update => {
         const element = document.getElementById(update.id);
-        if (element) {
+        if (element && update.value !== undefined) {
             animateNumber(element, parseInt(element.textContent) || 0, update.value);
         }
     });
+
+    const bars = [
+        { selector: '.functional-bar', value: data.functional_percent },
+        { selector: '.critical-bar', value: data.critical_percent },
+        { selector: '.active-bar', value: data.active_percent },
+        { selector: '.utilization-bar', value: data.system_utilization }
+    ];
+
+    bars.forEach(bar => {
+        const element = document.querySelector(bar.selector);
+        if (element && bar.value !== undefined) {
+            element.dataset.percentage = bar.value;
+            element.style.width = `${bar.value}%`;
+        }
+    });
 }
 
 function animateNumber(element, from, to) {
@@ -106,7 +106,9 @@ document.addEventListener('DOMContentLoaded', function() {
         if (elements.searchInput.value.trim()) params.set('search', elements.searchInput.value.trim());
         if (elements.statusFilter.value !== 'all') params.set('status', elements.statusFilter.value);
         if (elements.timeFilter.value !== 'all') params.set('time', elements.timeFilter.value);
-        if (elements.sortBySelect.value !== 'newest') params.set('sort', elements.sortBySelect.value);
+        // Searches come back most relevant first, anything else newest first
+        const sort = elements.sortBySelect.value;
+        if (sort === 'oldest' || (sort === 'newest' && params.has('search'))) params.set('sort', sort);
         if (elements.timeFilter.value === 'custom') {
             if (elements.startDateInput.value) params.set('start', elements.startDateInput.value);
             if (elements.endDateInput.value) params.set('end', elements.endDateInput.value);
@@ -190,6 +192,83 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
 
+    // Bulk triage: select cards, then apply a status and/or assignee to all of them
+    const bulk = {
+        selectAll: document.getElementById('selectAllFaults'),
+        count: document.getElementById('selectedCount'),
+        status: document.getElementById('bulkStatus'),
+        assignee: document.getElementById('bulkAssignee'),
+        apply: document.getElementById('bulkApply'),
+        boxes: document.querySelectorAll('.fault-select')
+    };
+
+    function selectedFaultIds() {
+        return Array.from(bulk.boxes).filter(box => box.checked).map(box => box.value);
+    }
+
+    function updateBulkToolbar() {
+        const selected = selectedFaultIds().length;
+        bulk.count.textContent = `${selected} selected`;
+        bulk.selectAll.checked = selected > 0 && selected === bulk.boxes.length;
+        bulk.selectAll.indeterminate = selected > 0 && selected < bulk.boxes.length;
+        [bulk.status, bulk.assignee, bulk.apply].forEach(el => el.disabled = selected === 0);
+    }
+
+    bulk.boxes.forEach(box => box.addEventListener('change', updateBulkToolbar));
+    bulk.selectAll.addEventListener('change', function() {
+        bulk.boxes.forEach(box => box.checked = this.checked);
+        updateBulkToolbar();
+    });
+
+    function submitBulk(extra) {
+        const payload = Object.assign({fault_ids: selectedFaultIds()}, extra);
+        if (bulk.status.value) payload.status = bulk.status.value;
+        if (bulk.assignee.value !== 'keep') payload.assigned_to = bulk.assignee.value;
+
+        return fetch('/faults/bulk_update/', {
+            method: 'POST',
+            headers: {
+                'X-CSRFToken': document.querySelector('[name=csrfmiddlewaretoken]').value,
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify(payload)
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) throw new Error(data.message || 'Failed to update fault reports.');
+            showAlert('success', data.message);
+            setTimeout(() => location.reload(), 1000);
+            return data;
+        });
+    }
+
+    bulk.apply.addEventListener('click', function() {
+        if (!bulk.status.value && bulk.assignee.value === 'keep') {
+            showAlert('danger', 'Choose a status or an assignee to apply');
+            return;
+        }
+        if (bulk.status.value === 'resolved') {
+            // Resolving needs a summary; the modal sends the whole batch
+            const selected = selectedFaultIds().length;
+            window._bulkResolve = true;
+            document.getElementById('resolvedFaultId').value = '';
+            document.getElementById('resolutionSummary').value = '';
+            const note = document.getElementById('bulkResolutionNote');
+            note.textContent = `This summary will be attached to ${selected} fault report${selected === 1 ? '' : 's'}.`;
+            note.style.display = 'block';
+            new bootstrap.Modal(document.getElementById('resolutionModal')).show();
+            return;
+        }
+        submitBulk({}).catch(error => showAlert('danger', error.message));
+    });
+
+    document.getElementById('resolutionModal').addEventListener('hidden.bs.modal', function() {
+        window._bulkResolve = false;
+        document.getElementById('bulkResolutionNote').style.display = 'none';
+    });
+
+    updateBulkToolbar();
+
     // Handle resolution summary submission
     document.getElementById('resolutionForm').addEventListener('submit', function(e) {
         e.preventDefault();
@@ -197,6 +276,13 @@ document.addEventListener('DOMContentLoaded', function() {
         const summary = document.getElementById('resolutionSummary').value;
         const csrfToken = document.querySelector('[name=csrfmiddlewaretoken]').value;
 
+        if (window._bulkResolve) {
+            submitBulk({resolution_summary: summary})
+                .then(() => bootstrap.Modal.getInstance(document.getElementById('resolutionModal')).hide())
+                .catch(error => showAlert('danger', error.message));
+            return;
+        }
+
         // 1. First, update the status to resolved
         fetch(`/faults/update_status/${faultId}/`, {
             method: 'POST',
@@ -15,7 +15,9 @@ document.addEventListener('DOMContentLoaded', function() {
         confirmMessage: document.getElementById('confirmMessage'),
         confirmButton: document.getElementById('confirmButton'),
         saveNameButton: document.getElementById('saveNameButton'),
-        submitFaultButton: document.getElementById('submitFault')
+        submitFaultButton: document.getElementById('submitFault'),
+        importLayoutButton: document.getElementById('importLayoutButton'),
+        importLayoutFile: document.getElementById('importLayoutFile')
     };
     
     // Bootstrap Modals
@@ -33,8 +35,21 @@ document.addEventListener('DOMContentLoaded', function() {
         hasChanges: false,
         isDragging: false,
         draggedItem: null,
-        dragState: { startX: 0, startY: 0, startPosX: 0, startPosY: 0 }
+        dragState: { startX: 0, startY: 0, startPosX: 0, startPosY: 0 },
+        // Layout version the local items are at, for delta sync
+        version: null,
+        // Newest edit version seen per "<id>:<field>", for live editing
+        fieldVersions: {},
+        socket: null
     };
+
+    // How often to pick up other users' changes while not editing (ms)
+    const SYNC_INTERVAL = 10000;
+    // Live drag positions go out at most this often per item (ms)
+    const DRAG_SEND_INTERVAL = 100;
+    const MAX_RECONNECT_DELAY = 60 * 1000;
+    // How often to check on a background subtree deletion (ms)
+    const DELETION_POLL_INTERVAL = 2000;
     
     // Item type definitions
     const itemTypes = {
@@ -147,18 +162,51 @@ document.addEventListener('DOMContentLoaded', function() {
                 const data = await response.json();
                 
                 state.layoutItems = data.items;
-                state.originalLayout = JSON.parse(JSON.stringify(data.items));
-                renderer.renderLayout();
-
-                const roomItem = data.items.find(i => i.item_type === 'room' && i.quick_info);
-                if (roomItem && roomItem.quick_info) {
-                    renderQuickInfo(roomItem.quick_info);
-                }
+                state.version = data.version;
+                this.itemsLoaded();
             } catch (error) {
                 utils.showError('Failed to load layout items');
             }
         },
 
+        // Apply only what changed since state.version; falls back to a full
+        // reload when the server says the gap is too large
+        async syncChanges() {
+            if (state.version === null) return this.fetchLayoutItems();
+
+            const response = await fetch(`/layout/changes/?parent_id=${PARENT_ID}&since=${state.version}`);
+            if (!response.ok) throw new Error('Network response was not ok');
+            const data = await response.json();
+            if (data.reset) return this.fetchLayoutItems();
+
+            data.changes.forEach(change => {
+                if (change.item) live.seenVersions(change.item);
+                const index = state.layoutItems.findIndex(item => item.id === change.item_id);
+                const here = change.item && String(change.item.parent_id) === String(PARENT_ID === 'null' ? null : PARENT_ID);
+                if (!here) {
+                    // Deleted, or moved to another parent
+                    if (index !== -1) state.layoutItems.splice(index, 1);
+                } else if (index !== -1) {
+                    state.layoutItems[index] = { ...state.layoutItems[index], ...change.item };
+                } else {
+                    state.layoutItems.push(change.item);
+                }
+            });
+            state.version = data.version;
+            if (data.changes.length) this.itemsLoaded();
+        },
+
+        itemsLoaded() {
+            state.layoutItems.forEach(item => live.seenVersions(item));
+            state.originalLayout = JSON.parse(JSON.stringify(state.layoutItems));
+            renderer.renderLayout();
+
+            const roomItem = state.layoutItems.find(i => i.item_type === 'room' && i.quick_info);
+            if (roomItem && roomItem.quick_info) {
+                renderQuickInfo(roomItem.quick_info);
+            }
+        },
+
         async getParent() {
             try {
                 const response = await fetch(`/layout/get_parent/?item_id=${PARENT_ID}`);
@@ -181,9 +229,9 @@ document.addEventListener('DOMContentLoaded', function() {
         },
 
         async saveLayout() {
-            const itemsToSave = [];
             const itemsToCreate = [];
             const itemsToUpdate = [];
+            const itemsToMove = [];
             const itemsToDelete = [];
 
             // Separate items by operation needed
@@ -194,9 +242,12 @@ document.addEventListener('DOMContentLoaded', function() {
                 } else if (item.id) {
                     // Existing item to update position
                     const original = state.originalLayout.find(orig => orig.id === item.id);
-                    if (!original || original.position_x !== item.position_x || 
-                        original.position_y !== item.position_y || original.name !== item.name) {
+                    if (!original || original.name !== item.name) {
                         itemsToUpdate.push(item);
+                    } else if (original.position_x !== item.position_x ||
+                               original.position_y !== item.position_y) {
+                        // Position-only changes go out in one bulk request
+                        itemsToMove.push(item);
                     }
                 }
             });
@@ -209,19 +260,27 @@ document.addEventListener('DOMContentLoaded', function() {
             });
 
             try {
-                // Process all operations
-                await Promise.all([
-                    ...itemsToCreate.map(item => this.createItem(item)),
-                    ...itemsToUpdate.map(item => this.updateItem(item)),
-                    ...itemsToDelete.map(item => this.deleteItem(item.id, false))
+                // Free space first, then move, then add: the server refuses
+                // anything that would land on an item still in the way
+                await Promise.all(itemsToDelete.map(item => this.deleteItem(item.id, false)));
+                const [positions] = await Promise.all([
+                    this.savePositions(itemsToMove),
+                    ...itemsToUpdate.map(item => this.updateItem(item))
                 ]);
+                await Promise.all(itemsToCreate.map(item => this.createItem(item)));
 
-                // Refresh from server to get real IDs
-                await this.fetchLayoutItems();
+                if (positions && positions.errors.length) {
+                    // Refused moves are still at their local positions
+                    await this.fetchLayoutItems();
+                } else {
+                    // Temporary items come back with their real ids in the delta
+                    state.layoutItems = state.layoutItems.filter(item => !String(item.id).startsWith('temp_'));
+                    await this.syncChanges();
+                }
                 state.hasChanges = false;
                 editMode.exit();
             } catch (error) {
-                utils.showError('Failed to save layout');
+                utils.showError(`Failed to save layout: ${error.message}`);
             }
         },
 
@@ -245,9 +304,37 @@ document.addEventListener('DOMContentLoaded', function() {
                 body: JSON.stringify(data)
             });
 
-            if (!response.ok) throw new Error('Failed to create item');
+            const result = await response.json().catch(() => ({}));
+            if (!response.ok || result.status !== 'success') {
+                throw new Error(result.message || 'Failed to create item');
+            }
+            return result;
+        },
+
+        async savePositions(items) {
+            if (!items.length) return null;
+
+            const response = await fetch('/layout/save/', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': utils.getCSRFToken()
+                },
+                body: JSON.stringify({
+                    items: items.map(item => ({
+                        id: item.id,
+                        position_x: item.position_x,
+                        position_y: item.position_y
+                    }))
+                })
+            });
+
+            if (!response.ok) throw new Error('Failed to save positions');
             const result = await response.json();
-            if (result.status !== 'success') throw new Error(result.message || 'Error creating item');
+            if (result.status === 'error') throw new Error(result.message || 'Error saving positions');
+            if (result.errors && result.errors.length) {
+                utils.showError(`${result.errors.length} item(s) could not be moved`);
+            }
             return result;
         },
 
@@ -267,9 +354,10 @@ document.addEventListener('DOMContentLoaded', function() {
                 body: JSON.stringify(updateData)
             });
 
-            if (!response.ok) throw new Error('Failed to update item');
-            const result = await response.json();
-            if (result.status !== 'success') throw new Error(result.message || 'Error updating item');
+            const result = await response.json().catch(() => ({}));
+            if (!response.ok || result.status !== 'success') {
+                throw new Error(result.message || 'Failed to update item');
+            }
             return result;
         },
 
@@ -291,7 +379,10 @@ document.addEventListener('DOMContentLoaded', function() {
                 throw new Error('Invalid JSON response');
             }
 
-            if (data.status !== 'success') {
+            if (data.status === 'queued') {
+                // Large subtrees are deleted in the background
+                this.watchDeletion(data.job).catch(() => {});
+            } else if (data.status !== 'success') {
                 throw new Error(data.message || 'Error deleting item');
             }
 
@@ -305,6 +396,39 @@ document.addEventListener('DOMContentLoaded', function() {
             return data;
         },
 
+        async watchDeletion(job) {
+            while (job.status === 'queued' || job.status === 'running') {
+                await new Promise(resolve => setTimeout(resolve, DELETION_POLL_INTERVAL));
+                const response = await fetch(`/layout/deletions/${job.id}/`);
+                if (!response.ok) return;
+                job = (await response.json()).job;
+                console.info(`Deleting ${job.root_name}: ${job.progress}%`);
+            }
+            if (job.status === 'failed') {
+                utils.showError(`Failed to delete ${job.root_name}: ${job.error}`);
+            }
+        },
+
+        // Create the tree in a .json/.csv export under the current item
+        async importLayout(file) {
+            const formData = new FormData();
+            formData.append('file', file);
+            formData.append('parent_id', PARENT_ID);
+
+            const response = await fetch('/layout/import/', {
+                method: 'POST',
+                headers: { 'X-CSRFToken': utils.getCSRFToken() },
+                body: formData
+            });
+
+            const result = await response.json().catch(() => ({}));
+            if (!response.ok || result.status !== 'success') {
+                const details = (result.errors || []).slice(0, 5).map(error => JSON.stringify(error)).join('\n');
+                throw new Error([result.message || 'Failed to import layout', details].filter(Boolean).join('\n'));
+            }
+            return result;
+        },
+
         async submitFaultReport(data) {
             const response = await fetch('/report_fault/', {
                 method: 'POST',
@@ -356,6 +480,15 @@ document.addEventListener('DOMContentLoaded', function() {
             `;
             
             return itemElement;
+        },
+
+        // Redraw one item in place, keeping selection and an ongoing drag
+        updateItem(item) {
+            const itemElement = elements.layoutGrid.querySelector(`.layout-item[data-id="${item.id}"]`);
+            if (!itemElement) return;
+            itemElement.style.gridColumn = `${item.position_x + 1} / span ${item.width}`;
+            itemElement.style.gridRow = `${item.position_y + 1} / span ${item.height}`;
+            itemElement.querySelector('.item-name').textContent = item.name;
         }
     };
 
@@ -442,7 +575,11 @@ document.addEventListener('DOMContentLoaded', function() {
             if (itemIndex !== -1) {
                 state.layoutItems[itemIndex].name = newName;
                 renderer.renderLayout();
-                state.hasChanges = true;
+                if (live.send({ action: 'rename', id: state.layoutItems[itemIndex].id, name: newName })) {
+                    live.persisted(state.layoutItems[itemIndex], ['name']);
+                } else {
+                    state.hasChanges = true;
+                }
             }
         },
 
@@ -455,6 +592,104 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     };
 
+    // Live editing over ws/layout/: moves and renames of saved items are sent
+    // as they happen and other editors' arrive as versioned diffs. Anything
+    // else (adds, deletes, edits while offline) still goes through Save.
+    const live = {
+        moveQueue: {},
+        moveTimer: null,
+
+        connect(retryDelay = 1000) {
+            if (!('WebSocket' in window)) return;
+
+            const scheme = window.location.protocol === 'https:' ? 'wss' : 'ws';
+            const parent = PARENT_ID === 'null' ? '' : `${PARENT_ID}/`;
+            const socket = new WebSocket(`${scheme}://${window.location.host}/ws/layout/${parent}`);
+            let nextDelay = retryDelay;
+
+            socket.addEventListener('open', () => {
+                state.socket = socket;
+                nextDelay = 1000;
+                // Catch up on what happened while disconnected; an edit
+                // session is left alone, as by the periodic sync
+                if (!state.editMode) api.syncChanges().catch(() => {});
+            });
+
+            socket.addEventListener('message', event => {
+                const message = JSON.parse(event.data);
+                if (message.type === 'edit') {
+                    message.diffs.forEach(diff => this.apply(diff, message.own));
+                } else if (message.type === 'error') {
+                    console.warn(message.message);
+                }
+            });
+
+            socket.addEventListener('close', () => {
+                state.socket = null;
+                setTimeout(() => this.connect(Math.min(nextDelay * 2, MAX_RECONNECT_DELAY)), nextDelay);
+            });
+        },
+
+        send(message) {
+            if (!state.socket || String(message.id).startsWith('temp_')) return false;
+            state.socket.send(JSON.stringify(message));
+            return true;
+        },
+
+        seenVersions(item) {
+            ['position', 'name'].forEach(field => {
+                const key = `${item.id}:${field}`;
+                state.fieldVersions[key] = Math.max(state.fieldVersions[key] || 0, item[`${field}_version`] || 0);
+            });
+        },
+
+        // Last writer wins per field: only a newer version than the one
+        // already applied counts. Our own edits are already on screen.
+        apply(diff, own) {
+            const key = `${diff.id}:${diff.field}`;
+            if (diff.version <= (state.fieldVersions[key] || 0)) return;
+            state.fieldVersions[key] = diff.version;
+            if (own) return;
+
+            const values = diff.field === 'name' ? { name: diff.value } : diff.value;
+            [state.layoutItems, state.originalLayout].forEach(items => {
+                const item = items.find(i => i.id === diff.id);
+                if (item) Object.assign(item, values);
+            });
+            const item = state.layoutItems.find(i => i.id === diff.id);
+            if (item) renderer.updateItem(item);
+        },
+
+        // The server has the item's new fields: Reset and Cancel keep them
+        persisted(item, fields) {
+            const original = state.originalLayout.find(i => i.id === item.id);
+            if (original) fields.forEach(field => { original[field] = item[field]; });
+        },
+
+        queueMove(item) {
+            if (!state.socket || String(item.id).startsWith('temp_')) return false;
+            this.moveQueue[item.id] = item;
+            if (!this.moveTimer) {
+                this.moveTimer = setTimeout(() => this.flushMoves(), DRAG_SEND_INTERVAL);
+            }
+            return true;
+        },
+
+        flushMoves() {
+            clearTimeout(this.moveTimer);
+            this.moveTimer = null;
+            const queued = Object.values(this.moveQueue);
+            this.moveQueue = {};
+            queued.forEach(item => {
+                if (this.send({ action: 'move', id: item.id, position_x: item.position_x, position_y: item.position_y })) {
+                    this.persisted(item, ['position_x', 'position_y']);
+                } else {
+                    state.hasChanges = true;
+                }
+            });
+        }
+    };
+
     // Drag and Drop
     const dragDrop = {
         setup() {
@@ -506,12 +741,15 @@ document.addEventListener('DOMContentLoaded', function() {
                 state.draggedItem.style.gridColumn = `${newPosX + 1} / span ${state.layoutItems[itemIndex].width}`;
                 state.draggedItem.style.gridRow = `${newPosY + 1} / span ${state.layoutItems[itemIndex].height}`;
                 
-                state.hasChanges = true;
+                if (!live.queueMove(state.layoutItems[itemIndex])) {
+                    state.hasChanges = true;
+                }
             }
         },
 
         handleMouseUp() {
             if (state.isDragging && state.draggedItem) {
+                live.flushMoves();
                 state.draggedItem.classList.remove('dragging');
                 state.draggedItem = null;
                 state.isDragging = false;
@@ -618,6 +856,23 @@ document.addEventListener('DOMContentLoaded', function() {
                 }
             });
 
+            // Layout import (administrators only)
+            if (elements.importLayoutButton) {
+                elements.importLayoutButton.addEventListener('click', () => elements.importLayoutFile.click());
+                elements.importLayoutFile.addEventListener('change', async () => {
+                    const file = elements.importLayoutFile.files[0];
+                    elements.importLayoutFile.value = '';
+                    if (!file) return;
+                    try {
+                        const result = await api.importLayout(file);
+                        alert(`Imported ${result.items} items (${result.labs} labs, ${result.systems} systems)`);
+                        await api.fetchLayoutItems();
+                    } catch (error) {
+                        utils.showError(error.message);
+                    }
+                });
+            }
+
             // Fault report
             if (elements.submitFaultButton) {
                 elements.submitFaultButton.addEventListener('click', this.handleFaultSubmission);
@@ -676,8 +931,15 @@ document.addEventListener('DOMContentLoaded', function() {
     // Initialize Application
     function init() {
         api.fetchLayoutItems();
+        setInterval(() => {
+            // Never merge remote changes into an unsaved edit session
+            if (!state.editMode && !document.hidden) {
+                api.syncChanges().catch(() => {});
+            }
+        }, SYNC_INTERVAL);
         eventHandlers.setupAll();
         dragDrop.setup();
+        live.connect();
         elements.removeBlockButton.disabled = true;
     }
 
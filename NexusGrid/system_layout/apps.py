@@ -2,4 +2,12 @@ from django.apps import AppConfig
 
 class SystemLayoutConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'system_layout'
\ No newline at end of file
+    name = 'system_layout'
+
+    def ready(self):
+        from . import changes, children, placement, rollups, spatial
+        rollups.connect_signals()
+        children.connect_signals()
+        spatial.connect_signals()
+        changes.connect_signals()
+        placement.connect_signals()
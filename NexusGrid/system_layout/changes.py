@@ -0,0 +1,185 @@
+"""
+Versioned change log of the layout, for delta sync.
+
+Each LayoutItem add, update, move or delete is stored as a LayoutChange
+under the list it affects (the item's parent), with a version taken from
+the LayoutVersion counter. Clients remember the version their copy of a
+list is at and ask for changes_since() it instead of reloading the list.
+A System status change or a Lab edit logs an update of its item, since both
+show up in the serialized item. A delete stands for the item's whole subtree.
+
+Signal handlers log single saves and deletes. Bulk writers (save_positions,
+subtree deletion) call record() themselves. Changes are pruned after
+LAYOUT_CHANGE_RETENTION_DAYS; a client further behind than that is told to
+reload.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max
+from django.db.models.signals import post_save, pre_delete
+from django.utils import timezone
+
+from .children import serialize_items
+from .models import Lab, LayoutChange, LayoutItem, LayoutVersion, System
+
+ROOT_PATH = '/'
+
+# More changes than this since a client's version: it should just reload
+MAX_CHANGES = 500
+
+
+def parent_path_of(item):
+    """
+    The parent's path, from the item's own (stored) path.
+    """
+    return item.path.rsplit('/', 2)[0] + '/' if item.path else None
+
+
+def _path_of(item_id):
+    if item_id is None:
+        return ROOT_PATH
+    return LayoutItem.objects.filter(pk=item_id).values_list('path', flat=True).first() or ROOT_PATH
+
+
+def current_version():
+    return LayoutVersion.objects.values_list('version', flat=True).first() or 0
+
+
+def record(changes):
+    """
+    Log `changes` (dicts with op, item_id, parent_id, parent_path and item)
+    under one new version. Holds the counter's row lock until commit.
+    """
+    if not changes:
+        return None
+    with transaction.atomic():
+        counter, _ = LayoutVersion.objects.select_for_update().get_or_create(pk=1)
+        counter.version = F('version') + 1
+        counter.save(update_fields=['version'])
+        counter.refresh_from_db(fields=['version'])
+        LayoutChange.objects.bulk_create(
+            [LayoutChange(version=counter.version, **change) for change in changes],
+            batch_size=1000,
+        )
+    return counter.version
+
+
+def item_changes(items, op='update'):
+    """
+    Change dicts for LayoutItems that are staying where they are.
+    """
+    items = list(items)
+    serialized = {data['id']: data for data in serialize_items(LayoutItem.objects.filter(pk__in=[i.pk for i in items]))}
+    # Items saved without a path yet need their parent's, looked up in one go
+    unknown = {item.parent_id for item in items if not item.path and item.parent_id is not None}
+    parent_paths = dict(LayoutItem.objects.filter(pk__in=unknown).values_list('id', 'path')) if unknown else {}
+    return [
+        {
+            'op': op,
+            'item_id': item.pk,
+            'parent_id': item.parent_id,
+            'parent_path': parent_path_of(item) or parent_paths.get(item.parent_id) or ROOT_PATH,
+            'item': dict(serialized[item.pk], parent_id=item.parent_id),
+        }
+        for item in items
+        if item.pk in serialized
+    ]
+
+
+def changes_since(since, parent_id=None, subtree=False):
+    """
+    (version, changes) for the list under `parent_id`, or its whole subtree,
+    after version `since`. Only the newest change per item is returned.
+    changes is None when the client must reload instead: `since` has been
+    pruned or too much has happened since.
+    """
+    counter = LayoutVersion.objects.filter(pk=1).values_list('version', 'pruned_through').first()
+    version, pruned_through = counter or (0, 0)
+    if since < pruned_through or since > version:
+        return version, None
+
+    rows = LayoutChange.objects.filter(version__gt=since, version__lte=version)
+    if subtree:
+        rows = rows.filter(parent_path__startswith=_path_of(parent_id))
+    else:
+        rows = rows.filter(parent_id=parent_id)
+    rows = list(
+        rows.order_by('version', 'id')
+        .values('version', 'op', 'item_id', 'parent_id', 'item')[:MAX_CHANGES + 1]
+    )
+    if len(rows) > MAX_CHANGES:
+        return version, None
+
+    latest = {}
+    for row in rows:
+        latest.pop((row['item_id'], row['parent_id']), None)
+        latest[(row['item_id'], row['parent_id'])] = row
+    return version, list(latest.values())
+
+
+def prune_changes(now=None):
+    """
+    Drop changes older than the retention; returns how many were deleted.
+    """
+    now = now or timezone.now()
+    keep = timedelta(days=getattr(settings, 'LAYOUT_CHANGE_RETENTION_DAYS', 7))
+    with transaction.atomic():
+        horizon = LayoutChange.objects.filter(created_at__lt=now - keep).aggregate(v=Max('version'))['v']
+        if horizon is None:
+            return 0
+        deleted = LayoutChange.objects.filter(version__lte=horizon).delete()[0]
+        LayoutVersion.objects.filter(pk=1, pruned_through__lt=horizon).update(pruned_through=horizon)
+    return deleted
+
+
+def _item_saved(sender, instance, created, **kwargs):
+    # post_save runs before LayoutItem.save() refreshes the path, so
+    # instance.path is still the stored one ('' for a new item)
+    old_parent = getattr(instance, '_rollup_parent', instance.parent_id)
+    if created or old_parent == instance.parent_id:
+        changes = item_changes([instance], 'add' if created else 'update')
+        if created:
+            changes[0]['parent_path'] = _path_of(instance.parent_id)
+        record(changes)
+        return
+
+    moved_in = item_changes([instance], 'move')[0]
+    moved_in['parent_path'] = _path_of(instance.parent_id)
+    moved_out = dict(moved_in, parent_id=old_parent, parent_path=parent_path_of(instance) or _path_of(old_parent))
+    record([moved_out, moved_in])
+
+
+def delete_change(item):
+    """
+    The change dict for deleting `item`, which stands for its whole subtree.
+    """
+    return {
+        'op': 'delete',
+        'item_id': item.pk,
+        'parent_id': item.parent_id,
+        'parent_path': parent_path_of(item) or _path_of(item.parent_id),
+        'item': None,
+    }
+
+
+def _item_deleted(sender, instance, origin=None, **kwargs):
+    # Descendants removed by the cascade (the only way another item's delete
+    # reaches this one) aren't logged one by one
+    if isinstance(origin, LayoutItem) and origin.pk != instance.pk:
+        return
+    record([delete_change(instance)])
+
+
+def _attachment_saved(sender, instance, **kwargs):
+    item = LayoutItem.objects.filter(pk=instance.layout_item_id).first()
+    if item:
+        record(item_changes([item]))
+
+
+def connect_signals():
+    post_save.connect(_item_saved, sender=LayoutItem, dispatch_uid='layout_changes_LayoutItem')
+    pre_delete.connect(_item_deleted, sender=LayoutItem, dispatch_uid='layout_changes_LayoutItem')
+    post_save.connect(_attachment_saved, sender=System, dispatch_uid='layout_changes_System')
+    post_save.connect(_attachment_saved, sender=Lab, dispatch_uid='layout_changes_Lab')
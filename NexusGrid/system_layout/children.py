@@ -0,0 +1,149 @@
+"""
+Serialized children of a LayoutItem for the layout editor, cached per parent.
+
+Each parent has a version number in the cache, and the serialized list is
+stored under a key that includes it. Changing a child, its System or its Lab
+bumps the parent's version once the transaction commits. Stale lists are
+never read again and simply expire. Live metrics change on every ingest
+batch, so they are not cached: one snapshot query per request adds them.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+
+from monitoring.models import HostSnapshot
+
+from .models import Lab, LayoutDeletion, LayoutItem, LayoutVersion, System
+
+CHILDREN_TTL = 60 * 60
+
+ROOT = 'root'
+
+
+def _version_key(parent_id):
+    return f'layout_children_version:{parent_id or ROOT}'
+
+
+def _version(parent_id):
+    key = _version_key(parent_id)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted counter can't come back to a
+        # number whose (stale) list is still cached
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_children(*parent_ids):
+    """
+    Bump the version of each parent's cached children after commit.
+    """
+    def bump():
+        for parent_id in set(parent_ids):
+            key = _version_key(parent_id)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, time.time_ns(), None)
+    transaction.on_commit(bump)
+
+
+def serialize_items(items):
+    """
+    LayoutItem dicts with their system status and lab quick info, read in
+    the same query as the items.
+    """
+    children = []
+    for item in items.select_related('system', 'lab'):
+        item_dict = item.to_dict()
+        system = getattr(item, 'system', None) if item.item_type == 'computer' else None
+        item_dict['status'] = system.status if system else None
+        if item.item_type == 'room':
+            lab = getattr(item, 'lab', None)
+            item_dict['quick_info'] = lab.get_quick_info() if lab else {}
+        children.append(item_dict)
+    return children
+
+
+def serialize_children(parent_id):
+    """
+    The children of `parent_id` (None for the top level), less any whose
+    subtree is being deleted.
+    """
+    deleting = LayoutDeletion.objects.filter(parent_id=parent_id).exclude(status=LayoutDeletion.DONE)
+    return serialize_items(
+        LayoutItem.objects.filter(parent_id=parent_id).exclude(pk__in=deleting.values('root_id'))
+    )
+
+
+def current_metrics(parent_id, item_ids=None):
+    """
+    {layout_item_id: metrics} for the computers under `parent_id` (or just
+    `item_ids` among them) whose snapshot still matches their host name.
+    """
+    snapshots = HostSnapshot.objects.filter(
+        monitored_system__layout_item__parent_id=parent_id,
+        monitored_system__layout_item__item_type='computer',
+        hostname=F('monitored_system__host_name'),
+    ).annotate(layout_item_id=F('monitored_system__layout_item_id'))
+    if item_ids is not None:
+        snapshots = snapshots.filter(monitored_system__layout_item_id__in=item_ids)
+    return {snapshot.layout_item_id: snapshot.current_metrics() for snapshot in snapshots}
+
+
+def with_metrics(items, metrics):
+    return [
+        dict(item, metrics=metrics.get(item['id'])) if item['item_type'] == 'computer' else item
+        for item in items
+    ]
+
+
+def get_children(parent_id):
+    """
+    (children, layout version they are at least as new as). The version is
+    read before the children, so delta sync from it can't skip a change.
+    """
+    key = f'layout_children:{parent_id or ROOT}:{_version(parent_id)}'
+    entry = cache.get(key)
+    if entry is None:
+        version = LayoutVersion.objects.values_list('version', flat=True).first() or 0
+        entry = {'items': serialize_children(parent_id), 'version': version}
+        cache.set(key, entry, CHILDREN_TTL)
+
+    return with_metrics(entry['items'], current_metrics(parent_id)), entry['version']
+
+
+def _item_saved(sender, instance, created, **kwargs):
+    parent_ids = [instance.parent_id]
+    if not created:
+        # The stored parent, read by rollups' pre_save; differs after a move
+        parent_ids.append(getattr(instance, '_rollup_parent', instance.parent_id))
+    invalidate_children(*parent_ids)
+
+
+def _item_deleted(sender, instance, **kwargs):
+    invalidate_children(instance.parent_id)
+
+
+def _system_changed(sender, instance, **kwargs):
+    parent_id = LayoutItem.objects.filter(pk=instance.layout_item_id).values_list('parent_id', flat=True).first()
+    invalidate_children(parent_id)
+
+
+def _lab_changed(sender, instance, **kwargs):
+    # Lab.parent is the room's parent, i.e. the list the room appears in
+    invalidate_children(instance.parent_id)
+
+
+def connect_signals():
+    post_save.connect(_item_saved, sender=LayoutItem, dispatch_uid='layout_children_LayoutItem')
+    post_delete.connect(_item_deleted, sender=LayoutItem, dispatch_uid='layout_children_LayoutItem')
+    post_save.connect(_system_changed, sender=System, dispatch_uid='layout_children_System')
+    # Before the delete, while the System's LayoutItem can still be looked up
+    pre_delete.connect(_system_changed, sender=System, dispatch_uid='layout_children_System')
+    post_save.connect(_lab_changed, sender=Lab, dispatch_uid='layout_children_Lab')
+    post_delete.connect(_lab_changed, sender=Lab, dispatch_uid='layout_children_Lab')
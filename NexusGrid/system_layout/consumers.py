@@ -0,0 +1,106 @@
+import asyncio
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
+
+from .bulk import edit_version
+from .editing import apply_edits, diff, layout_group
+
+NAME_MAX_LENGTH = 100
+
+
+def _edit(content):
+    """
+    (item_id, field, value) for a client message, or raise ValueError.
+    """
+    action = content.get('action')
+    item_id = int(content['id'])
+    if action == 'move':
+        position = {key: int(content[key]) for key in ('position_x', 'position_y')}
+        if min(position.values()) < 0:
+            raise ValueError('Position must not be negative')
+        return item_id, 'position', position
+    if action == 'rename':
+        name = str(content['name']).strip()
+        if not name or len(name) > NAME_MAX_LENGTH:
+            raise ValueError(f'Name must be 1-{NAME_MAX_LENGTH} characters')
+        return item_id, 'name', name
+    raise ValueError(f'Unknown action {action!r}')
+
+
+class LayoutConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Live editing of the children of one LayoutItem (ws/layout/<parent_id>/,
+    or ws/layout/ for the top level).
+
+    Clients send {'action': 'move', 'id', 'position_x', 'position_y'} or
+    {'action': 'rename', 'id', 'name'}. Each edit is versioned and broadcast
+    to everyone on the parent straight away, then kept in `pending` (newest
+    edit per item and field wins) and written at most once per
+    LAYOUT_EDIT_FLUSH_INTERVAL, so a drag costs a few database writes rather
+    than one per mouse move. Edits that don't land are answered with the
+    stored value; see system_layout.editing.
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if not user or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+
+        self.parent_id = self.scope['url_route']['kwargs'].get('parent_id')
+        self.group_name = layout_group(self.parent_id)
+        self.interval = getattr(settings, 'LAYOUT_EDIT_FLUSH_INTERVAL', 1.0)
+        self.pending = {}
+        self.flush_task = None
+
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if getattr(self, 'flush_task', None):
+            self.flush_task.cancel()
+            self.flush_task = None
+        if getattr(self, 'pending', None):
+            await self.flush()
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        try:
+            item_id, field, value = _edit(content)
+        except (KeyError, TypeError, ValueError) as e:
+            await self.send_json({'type': 'error', 'message': str(e)})
+            return
+
+        version = edit_version()
+        self.pending[(item_id, field)] = (value, version)
+        await self.broadcast([diff(item_id, field, value, version)], origin=self.channel_name)
+        if self.flush_task is None:
+            self.flush_task = asyncio.ensure_future(self.flush_later())
+
+    async def flush_later(self):
+        await asyncio.sleep(self.interval)
+        self.flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        # Swapped out first so edits arriving mid-write go into the next one
+        pending, self.pending = self.pending, {}
+        corrections = await self.write(pending)
+        if corrections:
+            await self.broadcast(corrections)
+
+    @database_sync_to_async
+    def write(self, edits):
+        return apply_edits(self.parent_id, edits, self.scope['user'].id)
+
+    async def broadcast(self, diffs, origin=None):
+        # Corrections have no origin: the editor whose edit missed needs them too
+        await self.channel_layer.group_send(
+            self.group_name, {'type': 'layout.edit', 'diffs': diffs, 'origin': origin}
+        )
+
+    async def layout_edit(self, event):
+        await self.send_json({'type': 'edit', 'diffs': event['diffs'], 'own': event['origin'] == self.channel_name})
@@ -0,0 +1,223 @@
+"""
+Batched deletion of LayoutItem subtrees.
+
+Django's cascade collector loads a whole subtree, with its Labs, Systems
+and their reports, into memory and deletes it in one transaction. A
+LayoutDeletion job instead removes the subtree deepest items first,
+LAYOUT_DELETE_BATCH_SIZE items at a time. Each batch, and each chunk of
+reports under it, is its own short transaction of plain DELETE statements,
+so no lock is held for longer than one batch.
+
+Nothing here sends delete signals, so their work is done explicitly.
+start_deletion() takes the root out of view at once: it logs the delete,
+takes the subtree's totals off the ancestors' LayoutRollups, frees its grid
+cells and refreshes the parent's cached children. Each chunk of reports is
+subtracted from ReportDailyCount and the repair stats, and the dashboard is
+told. Rollups inside the subtree are simply deleted with it.
+
+Subtrees of up to LAYOUT_DELETE_INLINE_LIMIT items are deleted within the
+request; larger ones by `manage.py run_layout_deletions`.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from dashboard.facts import subtract_reports
+from dashboard.live import notify_dashboard_changed
+from dashboard.models import LabRepairStats, ReportDailyCount, SystemRepairStats
+from dashboard.repairs import forget_reports
+from faults.models import FaultBand, FaultReport, FaultStatusChange, Resolved
+from faults.search import drop_reports
+from monitoring.models import HostSnapshot
+from resources.models import Provided, ResourceRequest
+
+from .changes import delete_change, record
+from .children import invalidate_children
+from .models import Lab, LayoutCell, LayoutDeletion, LayoutItem, LayoutRollup, System
+from .rollups import apply_deltas, invalidate_stats
+
+logger = logging.getLogger(__name__)
+
+# Report model -> (model answering it, its link to the report)
+REPORTS = [
+    (FaultReport, Resolved, 'fault_report'),
+    (ResourceRequest, Provided, 'resource_request'),
+]
+
+# A running job that hasn't finished a batch for this long is picked up again
+STALE_AFTER = timedelta(minutes=5)
+
+
+def batch_size():
+    return getattr(settings, 'LAYOUT_DELETE_BATCH_SIZE', 500)
+
+
+def _delete(model, field, ids):
+    """
+    DELETE the rows of `model` whose `field` ('pk' or a field name) is in
+    `ids`, with no collector and no signals.
+    """
+    if not ids:
+        return 0
+    meta = model._meta
+    column = meta.pk.column if field == 'pk' else meta.get_field(field).column
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(ids))
+    sql = f"DELETE FROM {quote(meta.db_table)} WHERE {quote(column)} IN ({placeholders})"
+    with connection.cursor() as cursor:
+        cursor.execute(sql, list(ids))
+        return cursor.rowcount
+
+
+def start_deletion(item, user=None):
+    """
+    Create the LayoutDeletion job for `item`'s subtree and hide the subtree.
+    Returns (job, created); asking again for an item already being deleted
+    returns the existing job. Subtrees small enough to delete inline start
+    out running, so no worker claims them.
+    """
+    with transaction.atomic():
+        item = LayoutItem.objects.select_for_update().get(pk=item.pk)
+        for job in LayoutDeletion.objects.exclude(status=LayoutDeletion.DONE):
+            if item.path.startswith(job.root_path):
+                return job, False
+
+        total = LayoutItem.objects.filter(path__startswith=item.path).count()
+        inline = total <= getattr(settings, 'LAYOUT_DELETE_INLINE_LIMIT', 200)
+        job = LayoutDeletion.objects.create(
+            root_id=item.pk,
+            parent_id=item.parent_id,
+            root_name=item.name,
+            root_path=item.path,
+            total=total,
+            status=LayoutDeletion.RUNNING if inline else LayoutDeletion.QUEUED,
+            requested_by=user,
+        )
+        totals = LayoutRollup.objects.filter(layout_item=item).values(*LayoutRollup.COUNTERS).first()
+        if totals:
+            apply_deltas(item.parent_id, {name: -value for name, value in totals.items()})
+        # From here on, deltas inside the subtree stop at its root; a root
+        # item also leaves the top-level totals
+        invalidate_stats([item.pk])
+        LayoutCell.objects.filter(layout_item=item).delete()
+        record([delete_change(item)])
+        invalidate_children(item.parent_id)
+    return job, True
+
+
+def _delete_reports(model, answer_model, link, system_ids, size):
+    while True:
+        with transaction.atomic():
+            ids = list(model.objects.filter(system_name_id__in=system_ids).values_list('pk', flat=True)[:size])
+            if not ids:
+                return
+            subtract_reports(model, model.objects.filter(pk__in=ids))
+            _delete(answer_model, link, ids)
+            if model is FaultReport:
+                forget_reports(ids)
+                _delete(FaultStatusChange, 'fault_report', ids)
+                _delete(FaultBand, 'report', ids)
+                drop_reports(ids)
+            _delete(model, 'pk', ids)
+            notify_dashboard_changed()
+
+
+def delete_batch(item_ids, size=None):
+    """
+    Delete these LayoutItems, none of which may have children left outside
+    the batch, along with everything that hangs off them.
+    """
+    size = size or batch_size()
+    lab_ids = list(
+        Lab.objects.filter(Q(layout_item_id__in=item_ids) | Q(parent_id__in=item_ids)).values_list('id', flat=True)
+    )
+    system_ids = list(
+        System.objects.filter(Q(layout_item_id__in=item_ids) | Q(lab_id__in=lab_ids)).values_list('id', flat=True)
+    )
+    # A system's reports can far outnumber the items, so they get batches of their own
+    for model, answer_model, link in REPORTS:
+        _delete_reports(model, answer_model, link, system_ids, size)
+
+    with transaction.atomic():
+        _delete(HostSnapshot, 'monitored_system', system_ids)
+        _delete(SystemRepairStats, 'system', system_ids)
+        _delete(System, 'pk', system_ids)
+        for field in Lab._meta.many_to_many:
+            _delete(field.remote_field.through, field.m2m_field_name(), lab_ids)
+        # Already zeroed by subtract_reports(); the rows go with their lab
+        _delete(ReportDailyCount, 'lab', lab_ids)
+        _delete(LabRepairStats, 'lab', lab_ids)
+        _delete(Lab, 'pk', lab_ids)
+        _delete(LayoutCell, 'layout_item', item_ids)
+        _delete(LayoutCell, 'parent', item_ids)
+        _delete(LayoutRollup, 'layout_item', item_ids)
+        _delete(LayoutItem, 'pk', item_ids)
+        invalidate_stats(item_ids)
+        if system_ids:
+            notify_dashboard_changed()
+
+
+def run_deletion(job, size=None):
+    """
+    Work through `job` until its subtree is gone, recording progress after
+    every batch. Items added under the subtree meanwhile go with it.
+    """
+    size = size or batch_size()
+    job.status = LayoutDeletion.RUNNING
+    job.save(update_fields=['status', 'updated_at'])
+    try:
+        while True:
+            ids = list(
+                LayoutItem.objects.filter(path__startswith=job.root_path)
+                .order_by('-depth', 'id')
+                .values_list('id', flat=True)[:size]
+            )
+            if not ids:
+                break
+            delete_batch(ids, size)
+            job.deleted += len(ids)
+            job.save(update_fields=['deleted', 'updated_at'])
+    except Exception as e:
+        logger.exception(f"Deleting layout subtree {job.root_path} failed")
+        job.status = LayoutDeletion.FAILED
+        job.error = str(e)
+    else:
+        job.status = LayoutDeletion.DONE
+        job.error = ''
+        invalidate_children(job.parent_id)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'deleted', 'error', 'finished_at', 'updated_at'])
+    return job
+
+
+def claim_job():
+    """
+    The oldest queued (or abandoned) job, marked running, or None.
+    """
+    stale = timezone.now() - STALE_AFTER
+    with transaction.atomic():
+        job = (
+            LayoutDeletion.objects.select_for_update(skip_locked=True)
+            .filter(Q(status=LayoutDeletion.QUEUED) | Q(status=LayoutDeletion.RUNNING, updated_at__lt=stale))
+            .order_by('created_at')
+            .first()
+        )
+        if job:
+            job.status = LayoutDeletion.RUNNING
+            job.save(update_fields=['status', 'updated_at'])
+    return job
+
+
+def delete_subtree(item, user=None):
+    """
+    Delete `item` and everything under it: right away when the subtree is
+    small, otherwise leave the job queued for run_layout_deletions.
+    """
+    job, created = start_deletion(item, user)
+    if created and job.status == LayoutDeletion.RUNNING:
+        run_deletion(job)
+    return job
@@ -0,0 +1,106 @@
+"""
+Live layout editing: writes for the edits LayoutConsumer collects.
+
+An edit sets one field of one item, its position (x and y together) or its
+name, and is given an edit_version() when the server receives it. Fields
+are last-writer-wins: a write only lands if its version is newer than the
+one stored for that field, so two people dragging the same item end up
+with the drag that arrived last, while one renaming an item and another
+moving it both keep their change. Clients apply broadcast diffs by the same
+rule, comparing versions per field.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from monitoring.snapshots import invalidate_snapshots
+
+from .bulk import POSITION_FIELDS, edit_version, save_positions
+from .children import invalidate_children
+from .models import LayoutItem
+
+SYSTEM_TYPES = ['computer', 'server', 'network_switch', 'router', 'printer', 'ups', 'rack']
+
+
+def layout_group(parent_id):
+    return f'layout_{parent_id or "root"}'
+
+
+def diff(item_id, field, value, version):
+    return {'id': item_id, 'field': field, 'value': value, 'version': version}
+
+
+def rename_item(item, name, user_id=None, version=None):
+    """
+    Save `item` under a new name and carry it over to its Lab or System.
+    With a `version`, nothing is written if the name was last set by a newer
+    edit; returns whether the rename landed.
+    """
+    if version is None:
+        version = max(edit_version(), item.name_version + 1)
+    elif version <= item.name_version:
+        return False
+
+    item.name = name
+    item.name_version = version
+    item.save()
+
+    if item.item_type == 'room' and hasattr(item, 'lab'):
+        item.lab.lab_name = item.name
+        item.lab.save()
+
+    if item.item_type in SYSTEM_TYPES and hasattr(item, 'system'):
+        if item.system.host_name != item.name:
+            invalidate_snapshots([item.system.id])
+        item.system.host_name = item.name
+        item.system.updated_at = timezone.now()
+        if user_id:
+            item.system.updated_by_id = user_id
+        item.system.save()
+    return True
+
+
+def apply_edits(parent_id, edits, user_id=None):
+    """
+    Write coalesced edits, {(item_id, field): (value, version)}, to children
+    of `parent_id`; edits to anything else are dropped. Positions go through
+    save_positions() in one batch.
+
+    Returns the diffs clients need on top of the ones already broadcast:
+    the stored value of every field whose edit didn't land. A move refused
+    for overlapping keeps its old position under a new version, so previews
+    of it that are still in flight lose to the correction.
+    """
+    ids = {item_id for item_id, _ in edits}
+    corrections = []
+    with transaction.atomic():
+        members = set(LayoutItem.objects.filter(parent_id=parent_id, pk__in=ids).values_list('id', flat=True))
+        moves = {
+            item_id: (value, version)
+            for (item_id, field), (value, version) in edits.items()
+            if field == 'position' and item_id in members
+        }
+        if moves:
+            result = save_positions(
+                [dict(value, id=item_id) for item_id, (value, _) in moves.items()],
+                versions={item_id: version for item_id, (_, version) in moves.items()},
+            )
+            refused = set(result['refused'])
+            if refused:
+                LayoutItem.objects.filter(pk__in=refused).update(position_version=edit_version())
+                invalidate_children(parent_id)
+            missed = refused | set(result['stale'])
+            for item in LayoutItem.objects.filter(pk__in=missed).only('id', *POSITION_FIELDS, 'position_version'):
+                position = {field: getattr(item, field) for field in POSITION_FIELDS}
+                corrections.append(diff(item.pk, 'position', position, item.position_version))
+
+        renames = {
+            item_id: (value, version)
+            for (item_id, field), (value, version) in edits.items()
+            if field == 'name' and item_id in members
+        }
+        items = LayoutItem.objects.select_for_update(of=('self',)).select_related('system', 'lab').in_bulk(list(renames))
+        for item_id, (name, version) in renames.items():
+            item = items[item_id]
+            if not rename_item(item, name, user_id, version):
+                corrections.append(diff(item_id, 'name', item.name, item.name_version))
+    return corrections
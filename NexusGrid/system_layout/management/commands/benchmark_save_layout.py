@@ -0,0 +1,100 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from system_layout.models import LayoutItem
+from system_layout.spatial import index_items
+from system_layout.views import save_layout
+
+NAME_PREFIX = 'bench-seat-'
+COLUMNS = 12
+
+
+def make_room(count):
+    """
+    A throwaway building > floor > room holding `count` computers, one per
+    cell of a 12-column grid.
+    """
+    building = LayoutItem.objects.create(name=f'{NAME_PREFIX}building', item_type='building')
+    floor = LayoutItem.objects.create(name=f'{NAME_PREFIX}floor', item_type='floor', parent=building)
+    room = LayoutItem.objects.create(name=f'{NAME_PREFIX}room', item_type='room', parent=floor)
+    LayoutItem.objects.bulk_create(
+        [
+            LayoutItem(name=f'{NAME_PREFIX}{i:05d}', item_type='computer', parent=room,
+                       position_x=i % COLUMNS, position_y=i // COLUMNS)
+            for i in range(count)
+        ],
+        batch_size=1000,
+    )
+    index_items(room.children.all())
+    return building, room
+
+
+def shuffled_positions(ids):
+    """
+    A new, collision-free spot for every item on a grid twice the size.
+    """
+    cells = random.sample(range(2 * len(ids)), len(ids))
+    return [
+        {'id': item_id, 'position_x': cell % COLUMNS, 'position_y': cell // COLUMNS}
+        for item_id, cell in zip(ids, cells)
+    ]
+
+
+def per_item_save(entries):
+    """
+    What save_layout used to do: a lookup and a full save() per item.
+    """
+    with transaction.atomic():
+        for entry in entries:
+            item = LayoutItem.objects.get(id=entry['id'])
+            item.position_x = entry['position_x']
+            item.position_y = entry['position_y']
+            item.save()
+
+
+class Command(BaseCommand):
+    help = "Measure save_layout (bulk position writes) for rooms of a given size."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, nargs='+', default=[1000, 10000],
+                            help='Room sizes to benchmark')
+        parser.add_argument('--compare', action='store_true',
+                            help='Also time the old per-item get()/save() loop')
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        for count in options['items']:
+            building, room = make_room(count)
+            try:
+                ids = list(room.children.values_list('id', flat=True))
+                entries = shuffled_positions(ids)
+                request = factory.post('/layout/save/', data=json.dumps({'items': entries}),
+                                       content_type='application/json')
+
+                with CaptureQueriesContext(connection) as queries:
+                    began = time.perf_counter()
+                    result = json.loads(save_layout(request).content)
+                    elapsed = time.perf_counter() - began
+                self.stdout.write(self.style.SUCCESS(
+                    f"{count} items: updated {result['updated']} ({len(result['errors'])} refused) in {elapsed:.3f}s "
+                    f"with {len(queries.captured_queries)} queries"
+                ))
+
+                if options['compare']:
+                    entries = shuffled_positions(ids)
+                    with CaptureQueriesContext(connection) as queries:
+                        began = time.perf_counter()
+                        per_item_save(entries)
+                        elapsed = time.perf_counter() - began
+                    self.stdout.write(
+                        f"{count} items, per-item save(): {elapsed:.3f}s "
+                        f"with {len(queries.captured_queries)} queries"
+                    )
+            finally:
+                building.delete()
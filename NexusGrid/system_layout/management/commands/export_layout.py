@@ -0,0 +1,24 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from system_layout.models import LayoutItem
+from system_layout.transfer import export_rows, rows_to_csv
+
+
+class Command(BaseCommand):
+    help = "Write a layout subtree (or the whole layout) as JSON or CSV for import_layout."
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='File to write; .csv for CSV, anything else for JSON')
+        parser.add_argument('--root', type=int, default=None, help='LayoutItem id to export from')
+
+    def handle(self, *args, **options):
+        root = LayoutItem.objects.get(pk=options['root']) if options['root'] else None
+        rows = export_rows(root)
+        with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+            if options['output'].lower().endswith('.csv'):
+                f.write(rows_to_csv(rows))
+            else:
+                json.dump({'items': rows}, f)
+        self.stdout.write(self.style.SUCCESS(f"Exported {len(rows)} items to {options['output']}"))
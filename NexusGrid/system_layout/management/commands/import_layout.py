@@ -0,0 +1,33 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from system_layout.models import LayoutItem
+from system_layout.transfer import LayoutImportError, import_rows, rows_from_csv
+
+
+class Command(BaseCommand):
+    help = "Create a layout tree from a JSON or CSV file written by export_layout."
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='.csv or .json file')
+        parser.add_argument('--parent', type=int, default=None, help='LayoutItem id to import under')
+
+    def handle(self, *args, **options):
+        with open(options['input'], encoding='utf-8-sig') as f:
+            text = f.read()
+        rows = rows_from_csv(text) if options['input'].lower().endswith('.csv') else json.loads(text)['items']
+        parent = LayoutItem.objects.get(pk=options['parent']) if options['parent'] else None
+
+        began = time.perf_counter()
+        try:
+            result = import_rows(rows, parent)
+        except LayoutImportError as e:
+            for error in e.errors[:20]:
+                self.stderr.write(f"row {error['row']} ({error['ref']}): {error['message']}")
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['items']} items ({result['labs']} labs, {result['systems']} systems) "
+            f"in {time.perf_counter() - began:.1f}s"
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from system_layout.changes import prune_changes
+
+
+class Command(BaseCommand):
+    help = "Delete layout change log entries older than LAYOUT_CHANGE_RETENTION_DAYS."
+
+    def handle(self, *args, **options):
+        count = prune_changes()
+        self.stdout.write(self.style.SUCCESS(f"Pruned {count} layout changes."))
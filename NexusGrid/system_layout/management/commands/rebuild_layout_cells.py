@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from system_layout.spatial import rebuild_cells
+
+
+class Command(BaseCommand):
+    help = "Reindex every LayoutItem into the spatial grid buckets (LayoutCell)."
+
+    def handle(self, *args, **options):
+        count = rebuild_cells()
+        self.stdout.write(self.style.SUCCESS(f"Reindexed {count} layout items."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from system_layout.models import rebuild_paths
+
+
+class Command(BaseCommand):
+    help = "Recompute the materialized path and depth of every LayoutItem."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = rebuild_paths()
+        self.stdout.write(self.style.SUCCESS(f"Updated paths of {count} layout items."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from system_layout.models import rebuild_placements
+
+
+class Command(BaseCommand):
+    help = "Recompute the location and enclosing lab of every LayoutItem, and every Lab's location."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = rebuild_placements()
+        self.stdout.write(self.style.SUCCESS(f"Updated placements of {count} layout items."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from system_layout.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recount every LayoutRollup from System, FaultReport and ResourceRequest rows."
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rollups for {count} layout items."))
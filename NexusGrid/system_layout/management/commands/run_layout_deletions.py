@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from system_layout.deletion import batch_size, claim_job, run_deletion
+from system_layout.models import LayoutDeletion
+
+
+class Command(BaseCommand):
+    help = "Work through queued layout subtree deletions, one batch of items per transaction."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when no job is waiting')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between checks for new jobs')
+        parser.add_argument('--batch-size', type=int, default=None, help='LayoutItems per batch')
+        parser.add_argument('--retry-failed', action='store_true', help='Queue failed jobs again first')
+
+    def handle(self, *args, **options):
+        size = options['batch_size'] or batch_size()
+        if options['retry_failed']:
+            retried = LayoutDeletion.objects.filter(status=LayoutDeletion.FAILED).update(
+                status=LayoutDeletion.QUEUED, error=''
+            )
+            self.stdout.write(f"Queued {retried} failed deletion(s) again")
+
+        while True:
+            job = claim_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
+                continue
+
+            began = time.perf_counter()
+            job = run_deletion(job, size)
+            elapsed = time.perf_counter() - began
+            if job.status == LayoutDeletion.DONE:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Deleted {job.root_name} ({job.deleted} items) in {elapsed:.1f}s"
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(f"Deleting {job.root_name} failed: {job.error}"))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system_layout', '0007_lab_quick_info'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='system',
+            name='host_name',
+            field=models.TextField(blank=True, db_index=True, default='', null=True),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+COUNTERS = [
+    'total_systems', 'active_systems', 'inactive_systems',
+    'nonfunctional_systems', 'open_faults', 'pending_requests',
+]
+STATUS_COUNTERS = {
+    'active': 'active_systems',
+    'inactive': 'inactive_systems',
+    'non-functional': 'nonfunctional_systems',
+}
+OPEN_FAULT_STATUSES = ['unaddressed', 'in-progress', 'scheduled']
+
+
+def backfill_rollups(apps, schema_editor):
+    """
+    Initial recount; kept self-contained so later model changes can't break it.
+    """
+    LayoutItem = apps.get_model('system_layout', 'LayoutItem')
+    LayoutRollup = apps.get_model('system_layout', 'LayoutRollup')
+    System = apps.get_model('system_layout', 'System')
+    FaultReport = apps.get_model('faults', 'FaultReport')
+    ResourceRequest = apps.get_model('resources', 'ResourceRequest')
+
+    parents = dict(LayoutItem.objects.values_list('id', 'parent_id'))
+    totals = {item_id: dict.fromkeys(COUNTERS, 0) for item_id in parents}
+
+    def add(item_id, counter):
+        seen = set()
+        while item_id in totals and item_id not in seen:
+            seen.add(item_id)
+            totals[item_id][counter] += 1
+            item_id = parents[item_id]
+
+    system_items = {}
+    for system_id, item_id, status in System.objects.values_list('id', 'layout_item_id', 'status'):
+        system_items[system_id] = item_id
+        add(item_id, 'total_systems')
+        if status in STATUS_COUNTERS:
+            add(item_id, STATUS_COUNTERS[status])
+    faults = FaultReport.objects.filter(status__in=OPEN_FAULT_STATUSES).values_list('system_name_id', flat=True)
+    for system_id in faults:
+        add(system_items.get(system_id), 'open_faults')
+    requests = ResourceRequest.objects.filter(status='Pending').values_list('system_name_id', flat=True)
+    for system_id in requests:
+        add(system_items.get(system_id), 'pending_requests')
+
+    LayoutRollup.objects.bulk_create(
+        [LayoutRollup(layout_item_id=item_id, **counters) for item_id, counters in totals.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system_layout', '0008_index_system_host_name'),
+        ('faults', '0002_initial'),
+        ('resources', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LayoutRollup',
+            fields=[
+                ('layout_item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rollup', serialize=False, to='system_layout.layoutitem')),
+                ('total_systems', models.IntegerField(default=0)),
+                ('active_systems', models.IntegerField(default=0)),
+                ('inactive_systems', models.IntegerField(default=0)),
+                ('nonfunctional_systems', models.IntegerField(default=0)),
+                ('open_faults', models.IntegerField(default=0)),
+                ('pending_requests', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:45
+
+from django.db import migrations, models
+
+
+def backfill_paths(apps, schema_editor):
+    LayoutItem = apps.get_model('system_layout', 'LayoutItem')
+    parents = dict(LayoutItem.objects.values_list('id', 'parent_id'))
+    paths = {}
+    for item_id in parents:
+        chain = []
+        current = item_id
+        while current is not None and current not in paths and current not in chain:
+            chain.append(current)
+            current = parents.get(current)
+        prefix = paths.get(current, '/')
+        for current in reversed(chain):
+            prefix = f'{prefix}{current}/'
+            paths[current] = prefix
+    LayoutItem.objects.bulk_update(
+        [LayoutItem(pk=item_id, path=path, depth=path.count('/') - 2) for item_id, path in paths.items()],
+        ['path', 'depth'],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system_layout', '0009_layout_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='layoutitem',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='layoutitem',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(backfill_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_cells(apps, schema_editor):
+    LayoutItem = apps.get_model('system_layout', 'LayoutItem')
+    LayoutCell = apps.get_model('system_layout', 'LayoutCell')
+    size = getattr(settings, 'LAYOUT_GRID_BUCKET', 8)
+
+    def span(start, length):
+        return range(start // size, (start + max(length, 1) - 1) // size + 1)
+
+    cells = []
+    items = LayoutItem.objects.values_list('id', 'parent_id', 'position_x', 'position_y', 'width', 'height')
+    for item_id, parent_id, x, y, width, height in items.iterator():
+        cells.extend(
+            LayoutCell(layout_item_id=item_id, parent_id=parent_id, bucket_x=bx, bucket_y=by)
+            for bx in span(x, width)
+            for by in span(y, height)
+        )
+    LayoutCell.objects.bulk_create(cells, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system_layout', '0010_layout_item_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LayoutCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_x', models.IntegerField()),
+                ('bucket_y', models.IntegerField()),
+                ('layout_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cells', to='system_layout.layoutitem')),
+                ('parent', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='system_layout.layoutitem')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['parent', 'bucket_y', 'bucket_x'], name='system_layo_parent__2feb91_idx')],
+                'constraints': [models.UniqueConstraint(fields=('layout_item', 'bucket_x', 'bucket_y'), name='unique_layout_cell')],
+            },
+        ),
+        migrations.RunPython(backfill_cells, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system_layout', '0011_layout_cells'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LayoutVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+                ('pruned_through', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LayoutChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(db_index=True)),
+                ('op', models.CharField(choices=[('add', 'Add'), ('update', 'Update'), ('move', 'Move'), ('delete', 'Delete')], max_length=10)),
+                ('item_id', models.BigIntegerField()),
+                ('parent_id', models.BigIntegerField(null=True)),
+                ('parent_path', models.CharField(max_length=255)),
+                ('item', models.JSONField(null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['parent_id', 'version'], name='system_layo_parent__5a5dce_idx'), models.Index(fields=['parent_path', 'version'], name='layout_change_path_idx', opclasses=['varchar_pattern_ops', 'int8_ops'])],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 14:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system_layout', '0012_layout_change_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='layoutitem',
+            name='name_version',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='layoutitem',
+            name='position_version',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+    ]
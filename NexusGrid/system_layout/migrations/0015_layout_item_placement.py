@@ -0,0 +1,65 @@
+# Generated by Django 5.2.3 on 2026-10-18 14:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_placements(apps, schema_editor):
+    LayoutItem = apps.get_model('system_layout', 'LayoutItem')
+    Lab = apps.get_model('system_layout', 'Lab')
+    items = {item_id: (parent_id, name) for item_id, parent_id, name in LayoutItem.objects.values_list('id', 'parent_id', 'name')}
+    labs = dict(Lab.objects.values_list('layout_item_id', 'id'))
+    placements = {}
+    for item_id in items:
+        chain = []
+        current = item_id
+        while current is not None and current in items and current not in placements and current not in chain:
+            chain.append(current)
+            current = items[current][0]
+        if current in placements:
+            location, name = placements[current][0], items[current][1]
+            location, lab_id = (f'{location} > {name}' if location else name), placements[current][1]
+        else:
+            location, lab_id = '', None
+        for current in reversed(chain):
+            lab_id = labs.get(current, lab_id)
+            placements[current] = (location, lab_id)
+            name = items[current][1]
+            location = f'{location} > {name}' if location else name
+    LayoutItem.objects.bulk_update(
+        [LayoutItem(pk=item_id, location=location, enclosing_lab_id=lab_id)
+         for item_id, (location, lab_id) in placements.items()],
+        ['location', 'enclosing_lab'],
+        batch_size=1000,
+    )
+    Lab.objects.bulk_update(
+        [Lab(pk=lab_id, location=placements[item_id][0] or 'Unknown') for item_id, lab_id in labs.items()],
+        ['location'],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('system_layout', '0014_layout_deletion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='layoutitem',
+            name='enclosing_lab',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='items', to='system_layout.lab'),
+        ),
+        migrations.AddField(
+            model_name='layoutitem',
+            name='location',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AlterField(
+            model_name='lab',
+            name='location',
+            field=models.TextField(null=True),
+        ),
+        migrations.RunPython(backfill_placements, migrations.RunPython.noop),
+    ]
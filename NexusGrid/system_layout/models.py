@@ -1,5 +1,7 @@
 # models.py - Fixed version
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Sum, Value
+from django.db.models.functions import Coalesce, Concat, Substr
 from login_manager.models import User
 import json
 
@@ -36,12 +38,61 @@ class LayoutItem(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Materialized path of ids from the root down to this item, e.g. "/3/17/42/",
+    # and the number of ancestors. Maintained by save(); a subtree is a prefix match.
+    path = models.CharField(max_length=255, blank=True, default='', editable=False, db_index=True)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    # Per-field edit versions for live editing (system_layout.editing): a
+    # write only lands if it is newer than the one already stored
+    position_version = models.BigIntegerField(default=0, editable=False)
+    name_version = models.BigIntegerField(default=0, editable=False)
+
+    # Denormalized placement, kept by system_layout.placement: the Lab of the
+    # nearest room at or above this item, and the names above it
+    # ("Building > Floor"), so neither needs a walk up the tree
+    enclosing_lab = models.ForeignKey(
+        'Lab',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='items'
+    )
+    location = models.TextField(blank=True, default='', editable=False)
+
     class Meta:
         ordering = ['item_type', 'name']
 
     def __str__(self):
         return f"{self.name} ({self.get_item_type_display()})"
 
+    def save(self, *args, **kwargs):
+        # A move re-homes the subtree's LayoutRollup counters and paths in the same transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._sync_path()
+
+    def _sync_path(self):
+        parent_path = '/'
+        if self.parent_id is not None:
+            parent_path = LayoutItem.objects.filter(pk=self.parent_id).values_list('path', flat=True).get()
+            if f'/{self.pk}/' in parent_path:
+                raise ValueError("An item can't be moved under itself or one of its descendants")
+        path = f'{parent_path}{self.pk}/'
+        if path == self.path:
+            return
+
+        old_path, old_depth = self.path, self.depth
+        self.path, self.depth = path, path.count('/') - 2
+        LayoutItem.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+        if old_path:
+            # Re-prefix every descendant in one statement
+            self.get_descendants(old_path).update(
+                path=Concat(Value(self.path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + (self.depth - old_depth),
+            )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -51,21 +102,150 @@ class LayoutItem(models.Model):
             'position_y': self.position_y,
             'width': self.width,
             'height': self.height,
+            'position_version': self.position_version,
+            'name_version': self.name_version,
         }
 
+    def ancestor_ids(self):
+        """
+        Ids from the root down to the parent, read from the path.
+        """
+        return [int(part) for part in self.path.strip('/').split('/')[:-1]] if self.path else []
+
     def get_ancestors(self):
-        ancestors = []
-        current = self.parent
-        while current:
-            ancestors.insert(0, current)
-            current = current.parent
-        return ancestors
+        return list(LayoutItem.objects.filter(pk__in=self.ancestor_ids()).order_by('depth'))
+
+    def breadcrumb(self):
+        """
+        [{'id', 'name'}] from the root down to the parent, read from the path
+        and location; only a name containing the separator costs a query.
+        """
+        ids = self.ancestor_ids()
+        names = self.location.split(LOCATION_SEPARATOR) if self.location else []
+        if len(names) != len(ids):
+            return [{'id': ancestor.id, 'name': ancestor.name} for ancestor in self.get_ancestors()]
+        return [{'id': item_id, 'name': name} for item_id, name in zip(ids, names)]
+
+    def get_descendants(self, path=None):
+        """
+        Every item below this one (not itself), in one indexed prefix query.
+        """
+        return LayoutItem.objects.filter(path__startswith=path or self.path).exclude(pk=self.pk)
+
+    def child_location(self):
+        """
+        The location of this item's children: its own with its name added.
+        """
+        return join_location(self.location, self.name)
+
+    def subtree_systems(self):
+        """
+        Systems attached anywhere in this item's subtree, itself included.
+        """
+        return System.objects.filter(layout_item__path__startswith=self.path)
+
+
+def compute_paths(items):
+    """
+    {id: (path, depth)} for `items` ((id, parent_id) pairs).
+    """
+    parents = dict(items)
+    paths = {}
+
+    def path_of(item_id):
+        chain = []
+        while item_id is not None and item_id not in paths and item_id not in chain:
+            chain.append(item_id)
+            item_id = parents.get(item_id)
+        prefix = paths[item_id][0] if item_id in paths else '/'
+        for item_id in reversed(chain):
+            prefix = f'{prefix}{item_id}/'
+            paths[item_id] = (prefix, prefix.count('/') - 2)
+
+    for item_id in parents:
+        path_of(item_id)
+    return paths
+
+
+def rebuild_paths():
+    """
+    Recompute every LayoutItem's path and depth; returns the number changed.
+    """
+    paths = compute_paths(LayoutItem.objects.values_list('id', 'parent_id'))
+    stale = [
+        LayoutItem(pk=item_id, path=paths[item_id][0], depth=paths[item_id][1])
+        for item_id, path, depth in LayoutItem.objects.values_list('id', 'path', 'depth')
+        if paths[item_id] != (path, depth)
+    ]
+    LayoutItem.objects.bulk_update(stale, ['path', 'depth'], batch_size=1000)
+    return len(stale)
+
+
+LOCATION_SEPARATOR = ' > '
+
+
+def join_location(location, name):
+    return f'{location}{LOCATION_SEPARATOR}{name}' if location else name
+
+
+def compute_placements(items, labs):
+    """
+    {id: (location, enclosing lab id)} for `items` ((id, parent_id, name)
+    triples), where `labs` maps room item ids to their Lab ids.
+    """
+    items = {item_id: (parent_id, name) for item_id, parent_id, name in items}
+    placements = {}
+
+    def place(item_id):
+        chain = []
+        while item_id is not None and item_id in items and item_id not in placements and item_id not in chain:
+            chain.append(item_id)
+            item_id = items[item_id][0]
+        if item_id in placements:
+            location, lab_id = join_location(placements[item_id][0], items[item_id][1]), placements[item_id][1]
+        else:
+            location, lab_id = '', None
+        for item_id in reversed(chain):
+            lab_id = labs.get(item_id, lab_id)
+            placements[item_id] = (location, lab_id)
+            location = join_location(location, items[item_id][1])
+
+    for item_id in items:
+        place(item_id)
+    return placements
+
+
+def rebuild_placements():
+    """
+    Recompute every LayoutItem's location and enclosing lab, and every Lab's
+    location; returns the number of items changed.
+    """
+    labs = dict(Lab.objects.values_list('layout_item_id', 'id'))
+    placements = compute_placements(LayoutItem.objects.values_list('id', 'parent_id', 'name'), labs)
+    stale = [
+        LayoutItem(pk=item_id, location=placements[item_id][0], enclosing_lab_id=placements[item_id][1])
+        for item_id, location, lab_id in LayoutItem.objects.values_list('id', 'location', 'enclosing_lab_id')
+        if placements[item_id] != (location, lab_id)
+    ]
+    LayoutItem.objects.bulk_update(stale, ['location', 'enclosing_lab'], batch_size=1000)
+    Lab.objects.bulk_update(
+        [
+            Lab(pk=lab_id, location=placements[item_id][0] or 'Unknown')
+            for lab_id, item_id, location in Lab.objects.values_list('id', 'layout_item_id', 'location')
+            if location != (placements[item_id][0] or 'Unknown')
+        ],
+        ['location'],
+        batch_size=1000,
+    )
+    return len(stale)
 
 
 class Lab(models.Model):
     layout_item = models.OneToOneField(LayoutItem, on_delete=models.CASCADE, limit_choices_to={'item_type': 'room'}, related_name='lab' )
     lab_name = models.CharField(max_length=100)
-    location = models.CharField(max_length=100, null=True)
+    # The names above the room, copied from its LayoutItem by save() and
+    # kept current by system_layout.placement
+    location = models.TextField(null=True)
     instructors = models.ManyToManyField(User, blank=True, related_name='instructor_labs')
     assistants = models.ManyToManyField(User, blank=True, related_name='assistant_labs')
     capacity = models.IntegerField(null=True)
@@ -90,7 +270,10 @@ class Lab(models.Model):
             self.parent = self.layout_item.parent
         else:
             self.parent = None
-        super().save(*args, **kwargs)
+        self.location = self.layout_item.location or 'Unknown'
+        # The room's subtree is pointed at a new lab in the same transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def to_dict(self):
         return {
@@ -130,7 +313,7 @@ class System(models.Model):
         db_index=True
     )
 
-    host_name = models.TextField(null=True, blank=True, default="")
+    host_name = models.TextField(null=True, blank=True, default="", db_index=True)
 
     status = models.CharField(
         max_length=20,
@@ -148,4 +331,211 @@ class System(models.Model):
     )
 
     def __str__(self):
-        return f"{self.host_name or self.layout_item.name} - {self.get_status_display()}"
\ No newline at end of file
+        return f"{self.host_name or self.layout_item.name} - {self.get_status_display()}"
+
+    def save(self, *args, **kwargs):
+        # Keep the row and its LayoutRollup counters in one transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class LayoutCell(models.Model):
+    """
+    One grid bucket a LayoutItem's rectangle covers, kept by
+    system_layout.spatial. Viewport and collision queries range-scan the
+    (parent, bucket) index instead of every sibling.
+    """
+    layout_item = models.ForeignKey(LayoutItem, on_delete=models.CASCADE, related_name='cells')
+    # The item's parent, copied here so a scan stays within one set of siblings
+    parent = models.ForeignKey(LayoutItem, on_delete=models.CASCADE, null=True, related_name='+')
+    bucket_x = models.IntegerField()
+    bucket_y = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['layout_item', 'bucket_x', 'bucket_y'],
+                name='unique_layout_cell'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['parent', 'bucket_y', 'bucket_x']),
+        ]
+
+
+class LayoutVersion(models.Model):
+    """
+    Single-row counter behind the layout change log. Every logged change
+    takes the row lock to get its version, so versions become visible in
+    order and a client that has seen version N has seen everything before.
+    """
+    version = models.BigIntegerField(default=0)
+    # Versions up to this one have been pruned from LayoutChange
+    pruned_through = models.BigIntegerField(default=0)
+
+
+class LayoutChange(models.Model):
+    """
+    One add/update/move/delete of a LayoutItem, as seen by the child list of
+    `parent_id`. A move is logged once under the old parent and once under
+    the new one. Written by system_layout.changes.
+    """
+    OP_CHOICES = [
+        ('add', 'Add'),
+        ('update', 'Update'),
+        ('move', 'Move'),
+        ('delete', 'Delete'),
+    ]
+
+    version = models.BigIntegerField(db_index=True)
+    op = models.CharField(max_length=10, choices=OP_CHOICES)
+    # Plain ids, not foreign keys: the log outlives deleted items
+    item_id = models.BigIntegerField()
+    parent_id = models.BigIntegerField(null=True)
+    # Path of the parent ('/' for the top level), for subtree queries
+    parent_path = models.CharField(max_length=255)
+    # The item as get_layout_items serializes it; None for deletes
+    item = models.JSONField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['parent_id', 'version']),
+            # Subtree queries are prefix LIKEs on the path
+            models.Index(fields=['parent_path', 'version'], name='layout_change_path_idx',
+                         opclasses=['varchar_pattern_ops', 'int8_ops']),
+        ]
+
+
+class LayoutDeletion(models.Model):
+    """
+    A subtree being deleted in batches by system_layout.deletion. The root
+    drops out of its parent's list as soon as the job is created; `deleted`
+    counts the LayoutItems removed so far out of `total`.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    ACTIVE_STATUSES = [QUEUED, RUNNING]
+
+    # Plain ids: the job outlives the items it deletes
+    root_id = models.BigIntegerField()
+    parent_id = models.BigIntegerField(null=True, db_index=True)
+    root_name = models.CharField(max_length=100)
+    root_path = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    total = models.PositiveIntegerField(default=0)
+    deleted = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped after every batch; a running job that stops updating was abandoned
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Delete {self.root_name} ({self.deleted}/{self.total}, {self.status})"
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'root_id': self.root_id,
+            'root_name': self.root_name,
+            'status': self.status,
+            'total': self.total,
+            'deleted': self.deleted,
+            'progress': min(round(self.deleted / self.total * 100, 1), 100.0) if self.total else 100.0,
+            'error': self.error,
+        }
+
+
+class LayoutRollupQuerySet(models.QuerySet):
+    def stats_for(self, item=None):
+        """
+        Subtree stats for `item`, or for the whole hierarchy (the sum over
+        root items, plus the systems placed nowhere) when item is None.
+        """
+        if item is not None:
+            rollup = self.filter(layout_item=item).first()
+            if rollup:
+                return rollup.as_stats()
+            return rollup_stats(dict.fromkeys(LayoutRollup.COUNTERS, 0))
+        # A root item being deleted is already out of the hierarchy
+        deleting = LayoutDeletion.objects.exclude(status=LayoutDeletion.DONE).values('root_id')
+        totals = self.filter(layout_item__parent__isnull=True).exclude(layout_item_id__in=deleting).aggregate(
+            **{name: Coalesce(Sum(name), 0) for name in LayoutRollup.COUNTERS}
+        )
+        # Imported here, as system_layout.rollups imports this module
+        from .rollups import unplaced_counters
+        for name, value in unplaced_counters().items():
+            totals[name] += value
+        return rollup_stats(totals)
+
+
+class LayoutRollup(models.Model):
+    """
+    Counters for the whole subtree under a LayoutItem (itself included),
+    kept current by system_layout.rollups so any level of the hierarchy
+    is a single primary-key read.
+    """
+    layout_item = models.OneToOneField(
+        LayoutItem,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='rollup'
+    )
+    total_systems = models.IntegerField(default=0)
+    active_systems = models.IntegerField(default=0)
+    inactive_systems = models.IntegerField(default=0)
+    nonfunctional_systems = models.IntegerField(default=0)
+    open_faults = models.IntegerField(default=0)
+    pending_requests = models.IntegerField(default=0)
+
+    objects = LayoutRollupQuerySet.as_manager()
+
+    COUNTERS = [
+        'total_systems', 'active_systems', 'inactive_systems',
+        'nonfunctional_systems', 'open_faults', 'pending_requests',
+    ]
+
+    def __str__(self):
+        return f"Rollup for {self.layout_item_id}"
+
+    def as_stats(self):
+        """
+        The counters in the shape layout_view and the dashboard render.
+        """
+        return rollup_stats({name: getattr(self, name) for name in self.COUNTERS})
+
+
+def rollup_stats(counters):
+    total = counters['total_systems']
+    active = counters['active_systems']
+    functional = active + counters['inactive_systems']
+    critical = counters['nonfunctional_systems']
+    if total > 0:
+        functional_percent = round((functional / total) * 100, 1)
+        critical_percent = round((critical / total) * 100, 1)
+        active_percent = round((active / total) * 100, 1)
+        system_utilization = round((active / (functional if functional > 0 else 1)) * 100, 1)
+    else:
+        functional_percent = critical_percent = active_percent = system_utilization = 0
+    return {
+        'total_systems': total,
+        'functional_count': functional,
+        'critical_count': critical,
+        'active_count': active,
+        'functional_percent': functional_percent,
+        'critical_percent': critical_percent,
+        'active_percent': active_percent,
+        'system_utilization': system_utilization,
+        'fault_reports_count': counters['open_faults'],
+        'resource_requests_count': counters['pending_requests'],
+    }
\ No newline at end of file
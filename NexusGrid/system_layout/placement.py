@@ -0,0 +1,127 @@
+"""
+Maintenance of the denormalized LayoutItem.location and enclosing_lab.
+
+An item's location is the names of its ancestors ("Building > Floor") and
+its enclosing lab the Lab of the nearest room at or above it, so finding a
+device's lab or where a room is never walks the tree. Both are set from the
+parent in pre_save. When a save renames or moves an item, its descendants
+are brought along with set-based UPDATEs over the path prefix, as
+LayoutItem.save() does for paths: one re-prefixing the locations, one
+pointing items that inherited the old lab at the new one, and one copying
+the new locations to the Labs in the subtree. Systems that end up in another
+lab are moved there too, with their reports' ReportDailyCount rows, search
+documents and repair stats.
+
+A new Lab claims its room's subtree the same way. bulk_create() and
+queryset.update() skip all of this; run `manage.py rebuild_layout_placements`
+after writing names or parents that way.
+"""
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Concat, NullIf, Substr
+from django.db.models.signals import post_save, pre_save
+
+from dashboard.facts import REPORT_MODELS, relabel_reports
+from dashboard.repairs import move_systems
+from faults.search import index_systems
+
+from .models import Lab, LayoutItem, System, join_location
+
+
+def placement_under(parent_id):
+    """
+    (location, enclosing lab id) for a child of `parent_id`.
+    """
+    if parent_id is None:
+        return '', None
+    name, location, lab_id = LayoutItem.objects.filter(pk=parent_id).values_list(
+        'name', 'location', 'enclosing_lab_id'
+    ).get()
+    return join_location(location, name), lab_id
+
+
+def relabel(path, old_lab_id, new_lab_id):
+    """
+    Point the items under `path` that inherited `old_lab_id` at `new_lab_id`,
+    and move their Systems (and reports' counts) to it.
+    """
+    items = LayoutItem.objects.filter(path__startswith=path)
+    if old_lab_id is None:
+        items = items.filter(enclosing_lab__isnull=True)
+    else:
+        items = items.filter(enclosing_lab_id=old_lab_id)
+    items.update(enclosing_lab_id=new_lab_id)
+    if new_lab_id is None:
+        # System.lab can't be empty; such systems keep the lab they had
+        return
+
+    systems = System.objects.filter(
+        layout_item__path__startswith=path, layout_item__enclosing_lab_id=new_lab_id
+    ).exclude(lab_id=new_lab_id)
+    moved = list(systems.values_list('id', 'lab_id'))
+    system_ids = [system_id for system_id, _ in moved]
+    for model in REPORT_MODELS:
+        relabel_reports(model, model.objects.filter(system_name_id__in=system_ids), new_lab_id)
+    move_systems(moved, new_lab_id)
+    System.objects.filter(pk__in=system_ids).update(lab_id=new_lab_id)
+    # Fault reports are searchable by lab name
+    index_systems(system_ids)
+
+
+def relocate(path, old_prefix, new_prefix):
+    """
+    Rewrite the locations below `path` from `old_prefix` to `new_prefix`,
+    then refresh the locations of the Labs at or below it.
+    """
+    descendants = LayoutItem.objects.filter(path__startswith=path).exclude(path=path)
+    descendants.filter(location__startswith=old_prefix).update(
+        location=Concat(Value(new_prefix), Substr('location', len(old_prefix) + 1))
+    )
+    room_location = LayoutItem.objects.filter(pk=OuterRef('layout_item_id')).values('location')[:1]
+    Lab.objects.filter(layout_item__path__startswith=path).update(
+        location=Coalesce(NullIf(Subquery(room_location), Value('')), Value('Unknown'))
+    )
+
+
+def _place_item(sender, instance, raw=False, **kwargs):
+    stored = None
+    if not raw and not instance._state.adding and instance.pk is not None:
+        stored = LayoutItem.objects.filter(pk=instance.pk).values_list('name', 'location', 'enclosing_lab_id').first()
+    instance._placement_stored = stored
+    if raw:
+        return
+
+    instance.location, lab_id = placement_under(instance.parent_id)
+    if stored and instance.item_type == 'room':
+        # A room is its own lab's; a new room gets one when its Lab is saved
+        lab_id = Lab.objects.filter(layout_item_id=instance.pk).values_list('id', flat=True).first() or lab_id
+    instance.enclosing_lab_id = lab_id
+
+
+def _item_saved(sender, instance, created, **kwargs):
+    stored = instance._placement_stored
+    if created or stored is None:
+        return
+    # instance.path is still the stored one here, so it covers the subtree
+    # before a move re-prefixes it
+    old_name, old_location, old_lab_id = stored
+    old_prefix = join_location(old_location, old_name)
+    if old_prefix != instance.child_location():
+        relocate(instance.path, old_prefix, instance.child_location())
+    if old_lab_id != instance.enclosing_lab_id:
+        relabel(instance.path, old_lab_id, instance.enclosing_lab_id)
+
+
+def _lab_saved(sender, instance, created, **kwargs):
+    if not created:
+        return
+    path, lab_id = LayoutItem.objects.filter(pk=instance.layout_item_id).values_list(
+        'path', 'enclosing_lab_id'
+    ).get()
+    if lab_id != instance.pk:
+        relabel(path, lab_id, instance.pk)
+
+
+def connect_signals():
+    pre_save.connect(_place_item, sender=LayoutItem, dispatch_uid='layout_placement_LayoutItem')
+    post_save.connect(_item_saved, sender=LayoutItem, dispatch_uid='layout_placement_LayoutItem')
+    post_save.connect(_lab_saved, sender=Lab, dispatch_uid='layout_placement_Lab')
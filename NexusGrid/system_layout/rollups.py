@@ -0,0 +1,374 @@
+"""
+Maintenance of LayoutRollup subtree counters.
+
+Every System, FaultReport and ResourceRequest contributes to the rollup of
+its LayoutItem and of each ancestor. Signal handlers compare a save with the
+stored row (read in pre_save) or take a delete, turn the difference into
+per-counter deltas and apply them with one UPDATE ... SET x = x + d over the
+ancestor chain. The models' save() runs this in the same transaction as the
+row change. Deletes are handled in pre_delete, which Django sends inside the
+deletion's transaction before any row is removed; by post_delete a cascade
+may already have removed the ancestors (LayoutItem's self-reference stops
+the collector from ordering deletes parent-last).
+Moving a LayoutItem subtracts its subtree totals from the old ancestors and
+adds them to the new ones; a System given another LayoutItem takes its
+open faults and pending requests along. A System with no LayoutItem is in
+no rollup: unplaced_counters() counts those systems when the top-level
+totals are read.
+
+A subtree under a pending LayoutDeletion has already had its totals taken
+off its ancestors (see system_layout.deletion), so deltas inside it stop at
+its root, and rebuild_rollups() leaves it out of the ancestors' totals too.
+
+queryset.update(), bulk_update() and bulk_create() skip signals: callers
+that change statuses or create items that way must call apply_deltas(), or
+apply_item_deltas() for many items at once (or create the LayoutRollup
+rows), themselves, or run `manage.py rebuild_layout_rollups`.
+
+layout_stats() caches each item's stats for layout_view. apply_deltas()
+drops the cached stats of every item it changes, and of the top level,
+once the transaction commits.
+"""
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.signals import post_save, pre_delete, pre_save
+
+from faults.models import FaultReport
+from resources.models import ResourceRequest
+
+from .models import LayoutDeletion, LayoutItem, LayoutRollup, System
+
+SYSTEM_STATUS_COUNTERS = {
+    'active': 'active_systems',
+    'inactive': 'inactive_systems',
+    'non-functional': 'nonfunctional_systems',
+}
+
+STATS_TTL = 60 * 5
+
+ROOT = 'root'
+
+
+def _stats_key(item_id):
+    return f'layout_stats:{item_id or ROOT}'
+
+
+def invalidate_stats(item_ids=()):
+    """
+    Drop the cached stats of `item_ids` and of the top level after commit.
+    """
+    keys = [_stats_key(item_id) for item_id in item_ids] + [_stats_key(None)]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def layout_stats(item=None):
+    """
+    LayoutRollup.objects.stats_for(item), cached per item.
+    """
+    key = _stats_key(item.pk if item else None)
+    stats = cache.get(key)
+    if stats is None:
+        stats = LayoutRollup.objects.stats_for(item)
+        cache.set(key, stats, STATS_TTL)
+    return stats
+
+
+def ancestor_ids(item_id):
+    """
+    [item_id, parent_id, grandparent_id, ...] up to the root.
+    """
+    if item_id is None:
+        return []
+    path = LayoutItem.objects.filter(pk=item_id).values_list('path', flat=True).first()
+    if path:
+        return [int(part) for part in reversed(path.strip('/').split('/'))]
+    # Not yet given a path (saved outside LayoutItem.save()): walk the parents
+    ids = []
+    seen = set()
+    while item_id is not None and item_id not in seen:
+        ids.append(item_id)
+        seen.add(item_id)
+        item_id = LayoutItem.objects.filter(pk=item_id).values_list('parent_id', flat=True).first()
+    return ids
+
+
+def deleting_roots(ids=None):
+    """
+    The roots, among `ids` if given, of subtrees whose deletion has started
+    but not finished.
+    """
+    jobs = LayoutDeletion.objects.exclude(status=LayoutDeletion.DONE)
+    if ids is not None:
+        jobs = jobs.filter(root_id__in=list(ids))
+    return set(jobs.values_list('root_id', flat=True))
+
+
+def _up_to(ids, roots):
+    """
+    `ids` ([item_id, parent_id, ...]) cut after the first of `roots`.
+    """
+    for i, item_id in enumerate(ids):
+        if item_id in roots:
+            return ids[:i + 1]
+    return ids
+
+
+def apply_deltas(item_id, deltas):
+    """
+    Add `deltas` ({counter: n}) to the rollups of item_id and its ancestors,
+    up to the root of a subtree being deleted.
+    """
+    deltas = {name: value for name, value in deltas.items() if value}
+    if item_id is None or not deltas:
+        return
+    ids = ancestor_ids(item_id)
+    ids = _up_to(ids, deleting_roots(ids))
+    # Rows are never created here; items without one are picked up by rebuild_rollups()
+    LayoutRollup.objects.filter(layout_item_id__in=ids).update(
+        **{name: F(name) + value for name, value in deltas.items()}
+    )
+    invalidate_stats(ids)
+
+
+def apply_item_deltas(item_deltas):
+    """
+    apply_deltas() for many items: {item_id: {counter: n}}. The deltas are
+    summed over each item's ancestors and written with one UPDATE per
+    distinct set of deltas, so an ancestor shared by many items is updated
+    once; the cached stats are dropped once.
+    """
+    item_deltas = {item_id: deltas for item_id, deltas in item_deltas.items() if item_id is not None}
+    paths = dict(LayoutItem.objects.filter(pk__in=item_deltas).values_list('id', 'path'))
+    chains = {
+        item_id: [int(part) for part in reversed(path.strip('/').split('/'))] if path else ancestor_ids(item_id)
+        for item_id, path in ((item_id, paths.get(item_id)) for item_id in item_deltas)
+    }
+    roots = deleting_roots({ancestor_id for ids in chains.values() for ancestor_id in ids})
+    totals = defaultdict(lambda: defaultdict(int))
+    for item_id, deltas in item_deltas.items():
+        for ancestor_id in _up_to(chains[item_id], roots):
+            for name, value in deltas.items():
+                totals[ancestor_id][name] += value
+
+    groups = defaultdict(list)
+    for ancestor_id, deltas in totals.items():
+        changes = tuple(sorted((name, value) for name, value in deltas.items() if value))
+        if changes:
+            groups[changes].append(ancestor_id)
+    for changes, ids in groups.items():
+        LayoutRollup.objects.filter(layout_item_id__in=ids).update(
+            **{name: F(name) + value for name, value in changes}
+        )
+    if groups:
+        invalidate_stats(totals)
+
+
+def _system_counters(status, sign):
+    counters = {'total_systems': sign}
+    if status in SYSTEM_STATUS_COUNTERS:
+        counters[SYSTEM_STATUS_COUNTERS[status]] = sign
+    return counters
+
+
+def _merge(*deltas):
+    merged = defaultdict(int)
+    for delta in deltas:
+        for name, value in delta.items():
+            merged[name] += value
+    return merged
+
+
+def _negate(deltas):
+    return {name: -value for name, value in deltas.items()}
+
+
+def _report_counters(system_id):
+    """
+    The open_faults and pending_requests a system's reports add up to.
+    """
+    return {
+        'open_faults': FaultReport.objects.filter(
+            system_name_id=system_id, status__in=FaultReport.OPEN_STATUSES
+        ).count(),
+        'pending_requests': ResourceRequest.objects.filter(
+            system_name_id=system_id, status=ResourceRequest.PENDING
+        ).count(),
+    }
+
+
+def unplaced_counters():
+    """
+    Rollup counters for the systems that have no LayoutItem, in one query.
+    """
+    system_counts = {
+        counter: Count('pk', distinct=True, filter=Q(status=status))
+        for status, counter in SYSTEM_STATUS_COUNTERS.items()
+    }
+    return System.objects.filter(layout_item__isnull=True).aggregate(
+        total_systems=Count('pk', distinct=True),
+        **system_counts,
+        open_faults=Count(
+            'faultreport', distinct=True, filter=Q(faultreport__status__in=FaultReport.OPEN_STATUSES)
+        ),
+        pending_requests=Count(
+            'resourcerequest', distinct=True, filter=Q(resourcerequest__status=ResourceRequest.PENDING)
+        ),
+    )
+
+
+def _system_item(system_id):
+    return System.objects.filter(pk=system_id).values_list('layout_item_id', flat=True).first()
+
+
+def _previous(model, instance, fields):
+    """
+    The stored values of `fields` before this save, read under a row lock so
+    concurrent saves of the same row apply their deltas in turn.
+    """
+    if instance._state.adding or instance.pk is None:
+        return None
+    return model.objects.select_for_update().filter(pk=instance.pk).values_list(*fields).first()
+
+
+def _remember_system(sender, instance, **kwargs):
+    instance._rollup_state = _previous(System, instance, ['layout_item_id', 'status'])
+
+
+def _remember_report(sender, instance, **kwargs):
+    instance._rollup_state = _previous(sender, instance, ['system_name_id', 'status'])
+
+
+def _remember_item(sender, instance, **kwargs):
+    previous = _previous(LayoutItem, instance, ['parent_id'])
+    instance._rollup_parent = previous[0] if previous else None
+
+
+def _system_saved(sender, instance, created, **kwargs):
+    previous = instance._rollup_state
+    new_item, new_status = instance.layout_item_id, instance.status
+    if previous is None:
+        apply_deltas(new_item, _system_counters(new_status, 1))
+        return
+    old_item, old_status = previous
+    if old_item == new_item:
+        apply_deltas(new_item, _merge(_system_counters(old_status, -1), _system_counters(new_status, 1)))
+    else:
+        reports = _report_counters(instance.pk)
+        apply_deltas(old_item, _merge(_system_counters(old_status, -1), _negate(reports)))
+        apply_deltas(new_item, _merge(_system_counters(new_status, 1), reports))
+
+
+def _system_deleted(sender, instance, **kwargs):
+    apply_deltas(instance.layout_item_id, _system_counters(instance.status, -1))
+
+
+def _report_handlers(counter, is_counted):
+    """
+    save/delete handlers for a report model whose rows count towards
+    `counter` on their system's LayoutItem while is_counted(status).
+    """
+    def saved(sender, instance, created, **kwargs):
+        old_system, old_status = instance._rollup_state or (instance.system_name_id, None)
+        new_system = instance.system_name_id
+        was, now = is_counted(old_status), is_counted(instance.status)
+        if old_system == new_system:
+            if was != now:
+                apply_deltas(_system_item(new_system), {counter: 1 if now else -1})
+            return
+        if was:
+            apply_deltas(_system_item(old_system), {counter: -1})
+        if now:
+            apply_deltas(_system_item(new_system), {counter: 1})
+
+    def deleted(sender, instance, **kwargs):
+        if is_counted(instance.status):
+            apply_deltas(_system_item(instance.system_name_id), {counter: -1})
+
+    return saved, deleted
+
+
+_fault_saved, _fault_deleted = _report_handlers(
+    'open_faults', lambda status: status in FaultReport.OPEN_STATUSES
+)
+_request_saved, _request_deleted = _report_handlers(
+    'pending_requests', lambda status: status == ResourceRequest.PENDING
+)
+
+
+def _item_saved(sender, instance, created, **kwargs):
+    if created:
+        LayoutRollup.objects.get_or_create(layout_item=instance)
+    elif instance._rollup_parent != instance.parent_id:
+        rollup = LayoutRollup.objects.filter(layout_item=instance).first()
+        if rollup:
+            totals = {name: getattr(rollup, name) for name in LayoutRollup.COUNTERS}
+            apply_deltas(instance._rollup_parent, {name: -value for name, value in totals.items()})
+            apply_deltas(instance.parent_id, totals)
+
+
+def connect_signals():
+    handlers = [
+        (System, _remember_system, _system_saved, _system_deleted),
+        (FaultReport, _remember_report, _fault_saved, _fault_deleted),
+        (ResourceRequest, _remember_report, _request_saved, _request_deleted),
+    ]
+    for model, remember, saved, deleted in handlers:
+        uid = f'layout_rollup_{model.__name__}'
+        pre_save.connect(remember, sender=model, dispatch_uid=uid)
+        post_save.connect(saved, sender=model, dispatch_uid=uid)
+        pre_delete.connect(deleted, sender=model, dispatch_uid=uid)
+    pre_save.connect(_remember_item, sender=LayoutItem, dispatch_uid='layout_rollup_LayoutItem')
+    post_save.connect(_item_saved, sender=LayoutItem, dispatch_uid='layout_rollup_LayoutItem')
+
+
+def compute_rollups(items, systems, open_faults, pending_requests, detached=()):
+    """
+    Full recount. `items` is [(id, parent_id)], `systems` [(id, layout_item_id,
+    status)], the others [system_id] per counted row. The totals of items in
+    `detached` don't reach their ancestors. Returns {item_id: counters}.
+    """
+    parents = dict(items)
+    totals = {item_id: dict.fromkeys(LayoutRollup.COUNTERS, 0) for item_id in parents}
+    system_items = {}
+
+    def add(item_id, counters):
+        seen = set()
+        while item_id is not None and item_id in totals and item_id not in seen:
+            seen.add(item_id)
+            for name, value in counters.items():
+                totals[item_id][name] += value
+            item_id = parents.get(item_id) if item_id not in detached else None
+
+    for system_id, item_id, status in systems:
+        system_items[system_id] = item_id
+        add(item_id, _system_counters(status, 1))
+    for system_id in open_faults:
+        add(system_items.get(system_id), {'open_faults': 1})
+    for system_id in pending_requests:
+        add(system_items.get(system_id), {'pending_requests': 1})
+    return totals
+
+
+def rebuild_rollups():
+    """
+    Recompute every LayoutRollup from scratch; returns the number of items.
+    """
+    totals = compute_rollups(
+        LayoutItem.objects.values_list('id', 'parent_id'),
+        System.objects.values_list('id', 'layout_item_id', 'status'),
+        FaultReport.objects.filter(status__in=FaultReport.OPEN_STATUSES).values_list('system_name_id', flat=True),
+        ResourceRequest.objects.filter(status=ResourceRequest.PENDING).values_list('system_name_id', flat=True),
+        deleting_roots(),
+    )
+    LayoutRollup.objects.bulk_create(
+        [LayoutRollup(layout_item_id=item_id, **counters) for item_id, counters in totals.items()],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['layout_item'],
+        update_fields=LayoutRollup.COUNTERS,
+    )
+    invalidate_stats(totals)
+    return len(totals)
@@ -0,0 +1,8 @@
+from django.urls import path
+
+from . import consumers
+
+websocket_urlpatterns = [
+    path('ws/layout/', consumers.LayoutConsumer.as_asgi()),
+    path('ws/layout/<int:parent_id>/', consumers.LayoutConsumer.as_asgi()),
+]
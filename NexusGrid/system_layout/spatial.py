@@ -0,0 +1,207 @@
+"""
+Grid-bucket spatial index over LayoutItem rectangles.
+
+The layout grid is cut into LAYOUT_GRID_BUCKET x LAYOUT_GRID_BUCKET squares;
+every item has a LayoutCell row per square its rectangle touches, keyed by
+its parent. A viewport or collision query range-scans those rows and only
+then checks exact rectangles, so its cost follows the area asked about
+rather than the number of siblings. Rectangles are half-open: an item at x
+with width w covers columns x .. x + w - 1.
+
+LayoutItem.save() reindexes through post_save; bulk writers call
+index_items() themselves.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save
+
+from .models import LayoutCell, LayoutItem
+
+
+def bucket_size():
+    return getattr(settings, 'LAYOUT_GRID_BUCKET', 8)
+
+
+def _span(start, length, size):
+    return range(start // size, (start + max(length, 1) - 1) // size + 1)
+
+
+def buckets_for(x, y, width, height, size=None):
+    size = size or bucket_size()
+    return {(bx, by) for bx in _span(x, width, size) for by in _span(y, height, size)}
+
+
+def _rect(item):
+    return item.position_x, item.position_y, item.width, item.height
+
+
+def _intersects(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    return ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah
+
+
+def index_items(items):
+    """
+    Bring the LayoutCell rows of `items` in line with their current parent
+    and rectangle. One query when nothing moved, three otherwise.
+    """
+    wanted = {
+        item.pk: {(item.parent_id, bx, by) for bx, by in buckets_for(*_rect(item))}
+        for item in items
+    }
+    existing = defaultdict(set)
+    rows = LayoutCell.objects.filter(layout_item_id__in=list(wanted)).values_list(
+        'layout_item_id', 'parent_id', 'bucket_x', 'bucket_y'
+    )
+    for item_id, *cell in rows:
+        existing[item_id].add(tuple(cell))
+
+    stale = [item_id for item_id, cells in wanted.items() if existing[item_id] != cells]
+    if not stale:
+        return 0
+    with transaction.atomic():
+        LayoutCell.objects.filter(layout_item_id__in=stale).delete()
+        LayoutCell.objects.bulk_create(
+            [
+                LayoutCell(layout_item_id=item_id, parent_id=parent_id, bucket_x=bx, bucket_y=by)
+                for item_id in stale
+                for parent_id, bx, by in wanted[item_id]
+            ],
+            batch_size=1000,
+        )
+    return len(stale)
+
+
+def rebuild_cells(batch_size=2000):
+    """
+    Reindex every LayoutItem, e.g. after LAYOUT_GRID_BUCKET changed.
+    """
+    items = LayoutItem.objects.order_by('pk').only('id', 'parent_id', 'position_x', 'position_y', 'width', 'height')
+    changed = 0
+    batch = []
+    for item in items.iterator(chunk_size=batch_size):
+        batch.append(item)
+        if len(batch) == batch_size:
+            changed += index_items(batch)
+            batch = []
+    return changed + index_items(batch)
+
+
+def _cell_range(parent_id, x, y, width, height):
+    size = bucket_size()
+    xs, ys = _span(x, width, size), _span(y, height, size)
+    return LayoutCell.objects.filter(
+        parent_id=parent_id,
+        bucket_x__gte=xs.start, bucket_x__lt=xs.stop,
+        bucket_y__gte=ys.start, bucket_y__lt=ys.stop,
+    )
+
+
+def intersecting(parent_id, x, y, width, height):
+    """
+    Children of `parent_id` whose rectangle intersects the given one.
+    """
+    return LayoutItem.objects.filter(
+        pk__in=_cell_range(parent_id, x, y, width, height).values('layout_item_id'),
+        position_x__lt=x + width,
+        position_y__lt=y + height,
+        position_x__gt=x - F('width'),
+        position_y__gt=y - F('height'),
+    )
+
+
+def overlaps(parent_id, x, y, width, height, exclude=None):
+    """
+    Ids of the siblings a rectangle would collide with.
+    """
+    items = intersecting(parent_id, x, y, width, height)
+    if exclude is not None:
+        items = items.exclude(pk=exclude)
+    return list(items.values_list('id', flat=True))
+
+
+def colliding(rects):
+    """
+    Check rectangles that aren't stored yet against each other. `rects` maps
+    keys to (x, y, width, height), in order.
+    Returns {key: [earlier keys it collides with]}.
+    """
+    grid = defaultdict(list)
+    hits = {}
+    for key, rect in rects.items():
+        buckets = buckets_for(*rect)
+        found = {other for bucket in buckets for other in grid[bucket] if _intersects(rect, rects[other])}
+        if found:
+            hits[key] = [other for other in rects if other in found]
+        for bucket in buckets:
+            grid[bucket].append(key)
+    return hits
+
+
+def find_collisions(moved, previous):
+    """
+    Check a batch of moves. `moved` are LayoutItems already carrying their
+    new position, `previous` maps their ids to the old (x, y). A move that
+    lands on another item is refused and that item goes back to where it
+    was, which may in turn refuse a move into its old place; this repeats
+    until the layout is consistent. Pre-existing overlaps between items that
+    didn't move are left alone.
+    Returns {refused id: [ids it collided with]}.
+    """
+    by_parent = defaultdict(list)
+    for item in moved:
+        by_parent[item.parent_id].append(item)
+
+    refused = {}
+    for parent_id, items in by_parent.items():
+        # Everything near any old or new position, in one range scan
+        rects = [_rect(item) for item in items]
+        rects += [(*previous[item.pk], item.width, item.height) for item in items]
+        x1 = min(r[0] for r in rects)
+        y1 = min(r[1] for r in rects)
+        x2 = max(r[0] + r[2] for r in rects)
+        y2 = max(r[1] + r[3] for r in rects)
+        neighbours = {
+            item_id: (x, y, w, h)
+            for item_id, x, y, w, h in intersecting(parent_id, x1, y1, x2 - x1, y2 - y1)
+            .values_list('id', 'position_x', 'position_y', 'width', 'height')
+        }
+        placed = dict(neighbours)
+        placed.update({item.pk: _rect(item) for item in items})
+        moving = {item.pk for item in items}
+
+        while True:
+            grid = defaultdict(set)
+            for item_id, rect in placed.items():
+                for bucket in buckets_for(*rect):
+                    grid[bucket].add(item_id)
+            newly = {}
+            for item_id in moving - set(refused):
+                rect = placed[item_id]
+                hits = {
+                    other
+                    for bucket in buckets_for(*rect)
+                    for other in grid[bucket]
+                    if other != item_id and _intersects(rect, placed[other])
+                }
+                if hits:
+                    newly[item_id] = sorted(hits)
+            if not newly:
+                break
+            for item_id, hits in newly.items():
+                refused[item_id] = hits
+                x, y = previous[item_id]
+                placed[item_id] = (x, y) + placed[item_id][2:]
+    return refused
+
+
+def _item_saved(sender, instance, **kwargs):
+    index_items([instance])
+
+
+def connect_signals():
+    post_save.connect(_item_saved, sender=LayoutItem, dispatch_uid='layout_cells_LayoutItem')
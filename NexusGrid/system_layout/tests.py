@@ -0,0 +1,838 @@
+import json
+from datetime import timedelta
+
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from faults.models import FaultReport
+from faults.triage import triage
+from login_manager.models import User
+from resources.models import ResourceRequest
+
+from .bulk import save_positions
+from .changes import changes_since, current_version, prune_changes, record
+from .children import get_children
+from .deletion import claim_job, delete_subtree, run_deletion
+from .editing import rename_item
+from .models import Lab, LayoutCell, LayoutChange, LayoutDeletion, LayoutItem, LayoutRollup, System
+from .rollups import layout_stats, rebuild_rollups
+from .routing import websocket_urlpatterns
+from .spatial import rebuild_cells
+from .transfer import LayoutImportError, import_rows
+
+
+class LayoutTestCase(TestCase):
+    """
+    Building > Floor 1 > Lab A (pc-a1, pc-a2) and Lab B (pc-b1),
+    Building > Floor 2 > Lab C (empty).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='x', role='Administrator'
+        )
+        cls.building = LayoutItem.objects.create(name='Building', item_type='building')
+        cls.floor1 = LayoutItem.objects.create(name='Floor 1', item_type='floor', parent=cls.building)
+        cls.floor2 = LayoutItem.objects.create(name='Floor 2', item_type='floor', parent=cls.building, position_x=1)
+        cls.lab_a = cls.make_lab(cls.floor1, 'Lab A')
+        cls.lab_b = cls.make_lab(cls.floor1, 'Lab B', x=1)
+        cls.lab_c = cls.make_lab(cls.floor2, 'Lab C')
+        cls.pc_a1 = cls.make_system(cls.lab_a, 'pc-a1')
+        cls.pc_a2 = cls.make_system(cls.lab_a, 'pc-a2', 'inactive', x=1)
+        cls.pc_b1 = cls.make_system(cls.lab_b, 'pc-b1', 'non-functional')
+
+    @staticmethod
+    def make_lab(floor, name, x=0):
+        room = LayoutItem.objects.create(name=name, item_type='room', parent=floor, position_x=x)
+        return Lab.objects.create(layout_item=room, lab_name=name)
+
+    @staticmethod
+    def make_system(lab, name, status='active', x=0):
+        item = LayoutItem.objects.create(name=name, item_type='computer', parent=lab.layout_item, position_x=x)
+        return System.objects.create(layout_item=item, lab=lab, host_name=name, status=status)
+
+    def report(self, system, status='unaddressed', description='Screen flickers'):
+        return FaultReport.objects.create(
+            system_name=system, reported_by=self.admin, fault_type='Hardware',
+            description=description, status=status,
+        )
+
+    def request(self, system, status=ResourceRequest.PENDING):
+        return ResourceRequest.objects.create(
+            system_name=system, requested_by=self.admin, resource_name='Mouse',
+            description='Needs a mouse', status=status,
+        )
+
+
+class RollupTests(LayoutTestCase):
+    """
+    The counters kept incrementally by system_layout.rollups must equal a
+    full recount after every kind of change.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.fault_a1 = self.report(self.pc_a1)
+        self.report(self.pc_b1, 'in-progress')
+        self.report(self.pc_b1, 'resolved')
+        self.request_a2 = self.request(self.pc_a2)
+        self.request(self.pc_b1, 'Fulfilled')
+
+    @staticmethod
+    def rollups():
+        rows = LayoutRollup.objects.values('layout_item_id', *LayoutRollup.COUNTERS)
+        return {row['layout_item_id']: row for row in rows}
+
+    def assertMatchesRebuild(self):
+        kept = self.rollups()
+        rebuild_rollups()
+        self.assertEqual(kept, self.rollups())
+        self.assertEqual(set(kept), set(LayoutItem.objects.values_list('pk', flat=True)))
+
+    def test_create(self):
+        self.assertMatchesRebuild()
+        self.assertEqual(LayoutRollup.objects.get(layout_item=self.building).open_faults, 2)
+        self.assertEqual(LayoutRollup.objects.get(layout_item=self.floor1).total_systems, 3)
+
+        lab_d = self.make_lab(self.floor2, 'Lab D')
+        pc_d1 = self.make_system(lab_d, 'pc-d1', 'non-functional')
+        self.report(pc_d1)
+        self.request(pc_d1)
+        self.assertMatchesRebuild()
+
+    def test_move_system(self):
+        item = self.pc_a1.layout_item
+        item.parent = self.lab_c.layout_item
+        item.save()
+        self.assertMatchesRebuild()
+        self.assertEqual(LayoutRollup.objects.get(layout_item=self.floor2).open_faults, 1)
+
+    def test_system_given_another_item_takes_its_reports(self):
+        item = LayoutItem.objects.create(name='pc-c1', item_type='computer', parent=self.lab_c.layout_item)
+        self.pc_a2.layout_item = item
+        self.pc_a2.save()
+        self.pc_a1.layout_item = None
+        self.pc_a1.save()
+
+        self.assertMatchesRebuild()
+        floor2 = LayoutRollup.objects.get(layout_item=self.floor2)
+        self.assertEqual((floor2.total_systems, floor2.pending_requests), (1, 1))
+        self.assertEqual(LayoutRollup.objects.get(layout_item=self.floor1).open_faults, 1)
+
+    def test_unplaced_systems_count_in_the_totals(self):
+        spare = System.objects.create(lab=self.lab_a, host_name='spare', status='non-functional')
+        self.report(spare)
+        self.report(spare, 'resolved')
+        self.request(spare)
+        self.assertMatchesRebuild()
+
+        stats = LayoutRollup.objects.stats_for(None)
+        self.assertEqual(
+            (stats['total_systems'], stats['critical_count'], stats['fault_reports_count'],
+             stats['resource_requests_count']),
+            (System.objects.count(), 2, 3, 2),
+        )
+
+        self.pc_b1.layout_item = None
+        self.pc_b1.save()
+        self.assertEqual(LayoutRollup.objects.stats_for(None), stats)
+        self.assertEqual(LayoutRollup.objects.get(layout_item=self.building).open_faults, 1)
+
+    def test_move_room(self):
+        room = self.lab_b.layout_item
+        room.parent = self.floor2
+        room.save()
+        self.assertMatchesRebuild()
+        self.assertEqual(LayoutRollup.objects.get(layout_item=self.floor2).total_systems, 1)
+
+    def test_system_status_change(self):
+        self.pc_a1.status = 'non-functional'
+        self.pc_a1.save()
+        self.pc_b1.status = 'active'
+        self.pc_b1.save()
+        self.assertMatchesRebuild()
+
+    def test_report_status_change(self):
+        self.fault_a1.status = 'resolved'
+        self.fault_a1.save()
+        self.request_a2.status = 'Denied'
+        self.request_a2.save()
+        self.assertMatchesRebuild()
+
+        self.fault_a1.status = 'scheduled'
+        self.fault_a1.save()
+        self.assertMatchesRebuild()
+
+    def test_bulk_status_change(self):
+        triage(FaultReport.objects.values_list('pk', flat=True), self.admin, status='ignored')
+        self.assertMatchesRebuild()
+        self.assertEqual(LayoutRollup.objects.get(layout_item=self.building).open_faults, 0)
+
+    def test_report_moved_to_another_system(self):
+        self.fault_a1.system_name = self.pc_b1
+        self.fault_a1.save()
+        self.assertMatchesRebuild()
+
+    def test_delete(self):
+        self.fault_a1.delete()
+        self.assertMatchesRebuild()
+        self.pc_a2.delete()
+        self.assertMatchesRebuild()
+        self.pc_b1.layout_item.delete()
+        self.assertMatchesRebuild()
+
+    def test_delete_subtree(self):
+        delete_subtree(self.floor1, self.admin)
+        self.assertMatchesRebuild()
+        self.assertEqual(LayoutRollup.objects.get(layout_item=self.building).total_systems, 0)
+
+    def assertEmpty(self, item):
+        rollup = LayoutRollup.objects.get(layout_item=item)
+        self.assertEqual({name: getattr(rollup, name) for name in LayoutRollup.COUNTERS},
+                         dict.fromkeys(LayoutRollup.COUNTERS, 0))
+
+    @override_settings(LAYOUT_DELETE_INLINE_LIMIT=0)
+    def test_changes_inside_a_queued_delete_stay_inside(self):
+        job = delete_subtree(self.floor1, self.admin)
+        self.assertEqual(job.status, LayoutDeletion.QUEUED)
+        self.assertEmpty(self.building)
+
+        self.fault_a1.status = 'resolved'
+        self.fault_a1.save()
+        self.pc_a2.status = 'non-functional'
+        self.pc_a2.save()
+        self.report(self.pc_b1)
+        triage(FaultReport.objects.values_list('pk', flat=True), self.admin, status='scheduled')
+        self.make_system(self.lab_b, 'pc-b2')
+
+        self.assertMatchesRebuild()
+        self.assertEmpty(self.building)
+        self.assertEqual(LayoutRollup.objects.get(layout_item=self.floor1).total_systems, 4)
+
+    @override_settings(LAYOUT_DELETE_INLINE_LIMIT=0, LAYOUT_DELETE_BATCH_SIZE=2)
+    def test_batched_delete(self):
+        self.make_system(self.lab_c, 'pc-c1')
+        floor1_ids = list(LayoutItem.objects.filter(path__startswith=self.floor1.path).values_list('pk', flat=True))
+        delete_subtree(self.floor1, self.admin)
+        self.pc_a1.status = 'inactive'
+        self.pc_a1.save()
+
+        job = claim_job()
+        run_deletion(job)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.deleted, job.total), (LayoutDeletion.DONE, 6, 6))
+        self.assertFalse(LayoutItem.objects.filter(pk__in=floor1_ids).exists())
+        self.assertEqual(list(System.objects.values_list('host_name', flat=True)), ['pc-c1'])
+        self.assertFalse(FaultReport.objects.exists())
+        self.assertFalse(ResourceRequest.objects.exists())
+        self.assertMatchesRebuild()
+        building = LayoutRollup.objects.get(layout_item=self.building)
+        self.assertEqual((building.total_systems, building.active_systems, building.open_faults), (1, 1, 0))
+
+    @override_settings(LAYOUT_DELETE_INLINE_LIMIT=0)
+    def test_queued_delete_of_a_root_item_leaves_the_totals(self):
+        self.assertEqual(layout_stats()['total_systems'], 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            delete_subtree(self.building, self.admin)
+            self.pc_a2.status = 'active'
+            self.pc_a2.save()
+
+        self.assertMatchesRebuild()
+        self.assertEqual(layout_stats()['total_systems'], 0)
+        self.assertEqual(LayoutRollup.objects.stats_for(None)['fault_reports_count'], 0)
+
+
+@override_settings(COMPRESS_ENABLED=False, COMPRESS_OFFLINE=False)
+class LayoutViewQueryTests(LayoutTestCase):
+    """
+    layout_view costs the session, the user, the item and its LayoutRollup
+    with a cold cache, and only the user and the item once the session and
+    the stats are cached, whatever level of the hierarchy it shows.
+    """
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        # Cold: neither the session nor any stats cached
+        cache.clear()
+
+    def assertQueryCounts(self, item, total_systems):
+        url = reverse('layout:layout_view', args=[item.pk])
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(response.context['total_systems'], total_systems)
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.context['total_systems'], total_systems)
+
+    def test_room(self):
+        self.assertQueryCounts(self.lab_a.layout_item, 2)
+
+    def test_floor(self):
+        self.assertQueryCounts(self.floor1, 3)
+
+    def test_building(self):
+        self.assertQueryCounts(self.building, 3)
+
+    def test_status_change_refreshes_the_cached_stats(self):
+        url = reverse('layout:layout_view', args=[self.floor1.pk])
+        self.assertEqual(self.client.get(url).context['active_count'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pc_a2.status = 'active'
+            self.pc_a2.save()
+
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        self.assertEqual(response.context['active_count'], 2)
+
+
+class BulkSaveTests(LayoutTestCase):
+    def positions(self, *systems):
+        return [LayoutItem.objects.values_list('position_x', 'position_y').get(system=system) for system in systems]
+
+    def test_bad_entries_are_reported_and_the_rest_saved(self):
+        result = save_positions([
+            {'id': self.pc_a1.layout_item_id, 'position_x': 4, 'position_y': 2},
+            {'id': 'pc-a2', 'position_x': 3},
+            {'position_x': 3},
+            {'id': 0, 'position_x': 3},
+            {'id': self.pc_a2.layout_item_id, 'position_x': -1},
+            {'id': self.pc_b1.layout_item_id, 'position_x': 'left'},
+        ])
+
+        self.assertEqual(result['updated'], 1)
+        self.assertEqual(
+            [(error['id'], error['message']) for error in result['errors']],
+            [
+                ('pc-a2', 'Invalid item id'),
+                (None, 'Invalid item id'),
+                (0, 'Item not found'),
+                (self.pc_a2.layout_item_id, 'Invalid position: must not be negative'),
+                (self.pc_b1.layout_item_id, "Invalid position: invalid literal for int() with base 10: 'left'"),
+            ],
+        )
+        self.assertEqual(self.positions(self.pc_a1, self.pc_a2, self.pc_b1), [(4, 2), (1, 0), (0, 0)])
+
+    def test_move_onto_a_sibling_is_refused(self):
+        a1, a2 = self.pc_a1.layout_item_id, self.pc_a2.layout_item_id
+        result = save_positions([{'id': a1, 'position_x': 1}])
+        self.assertEqual((result['updated'], result['refused']), (0, [a1]))
+        self.assertEqual(result['errors'], [{'id': a1, 'message': f'Overlaps item(s) {a2}'}])
+
+        # Into a place its sibling leaves in the same batch
+        result = save_positions([{'id': a1, 'position_x': 1}, {'id': a2, 'position_x': 2}])
+        self.assertEqual((result['updated'], result['errors']), (2, []))
+        self.assertEqual(self.positions(self.pc_a1, self.pc_a2), [(1, 0), (2, 0)])
+
+    def test_older_versions_are_dropped_as_stale(self):
+        item_id = self.pc_a1.layout_item_id
+        save_positions([{'id': item_id, 'position_x': 5}], versions={item_id: 20})
+
+        result = save_positions([{'id': item_id, 'position_x': 3}], versions={item_id: 10})
+
+        self.assertEqual((result['updated'], result['stale']), (0, [item_id]))
+        self.assertEqual(LayoutItem.objects.values_list('position_x', 'position_version').get(pk=item_id), (5, 20))
+
+    def test_view_reports_a_partial_save(self):
+        response = self.client.post(
+            reverse('layout:save_layout'),
+            json.dumps({'items': [{'id': self.pc_a1.layout_item_id, 'position_x': 4}, {'id': 0}]}),
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {'status': 'partial', 'updated': 1, 'errors': [{'id': 0, 'message': 'Item not found'}]},
+        )
+
+
+@override_settings(LAYOUT_GRID_BUCKET=4)
+class SpatialTests(LayoutTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.bench = LayoutItem.objects.create(
+            name='Bench', item_type='rack', parent=cls.lab_c.layout_item, position_x=3, position_y=2, width=6,
+        )
+
+    def cells(self, item):
+        return set(LayoutCell.objects.filter(layout_item=item).values_list('parent_id', 'bucket_x', 'bucket_y'))
+
+    def test_cells_follow_the_rectangle(self):
+        room = self.lab_c.layout_item_id
+        self.assertEqual(self.cells(self.bench), {(room, 0, 0), (room, 1, 0), (room, 2, 0)})
+
+        self.bench.position_y, self.bench.width = 5, 1
+        self.bench.save()
+        self.assertEqual(self.cells(self.bench), {(room, 0, 1)})
+
+        self.bench.parent = self.lab_a.layout_item
+        self.bench.save()
+        self.assertEqual(self.cells(self.bench), {(self.lab_a.layout_item_id, 0, 1)})
+
+    def test_rebuild_after_the_bucket_size_changes(self):
+        self.assertEqual(rebuild_cells(), 0)
+        with self.settings(LAYOUT_GRID_BUCKET=16):
+            self.assertEqual(rebuild_cells(), 1)
+            self.assertEqual(self.cells(self.bench), {(self.lab_c.layout_item_id, 0, 0)})
+
+    def viewport(self, **params):
+        return self.client.get(reverse('layout:get_viewport_items'), params)
+
+    def test_viewport_returns_the_children_it_touches(self):
+        room = self.lab_c.layout_item_id
+        other = LayoutItem.objects.create(name='pc-far', item_type='computer', parent_id=room, position_x=20)
+
+        def names(**rect):
+            response = self.viewport(parent_id=room, **rect)
+            self.assertEqual(response.status_code, 200)
+            return sorted(item['name'] for item in response.json()['items'])
+
+        self.assertEqual(names(x=8, y=0, width=20, height=3), ['Bench', other.name])
+        self.assertEqual(names(x=9, y=0, width=11, height=5), [])
+        self.assertEqual(names(x=0, y=0, width=4, height=3), ['Bench'])
+
+    def test_viewport_rejects_bad_rectangles(self):
+        self.assertEqual(self.viewport(x=0, y=0, width=4).status_code, 400)
+        self.assertEqual(self.viewport(x=0, y=0, width=0, height=4).status_code, 400)
+
+    def add(self, **data):
+        return self.client.post(reverse('layout:add_layout_item'), json.dumps(data), content_type='application/json')
+
+    def test_add_onto_an_item_is_refused(self):
+        room = self.lab_c.layout_item_id
+        response = self.add(name='pc-c1', item_type='computer', parent_id=room, position_x=8, position_y=2)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['overlaps'], [self.bench.pk])
+
+        response = self.add(name='pc-c1', item_type='computer', parent_id=room, position_x=9, position_y=2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(System.objects.get(host_name='pc-c1').lab, self.lab_c)
+
+    def move(self, item, **data):
+        return self.client.post(
+            reverse('layout:update_layout_item', args=[item.pk]), json.dumps(data), content_type='application/json'
+        )
+
+    def test_move_onto_an_item_is_refused(self):
+        pc = LayoutItem.objects.create(name='pc-c1', item_type='computer', parent=self.lab_c.layout_item)
+
+        response = self.move(pc, position_x=4, position_y=2)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['overlaps'], [self.bench.pk])
+        pc.refresh_from_db()
+        self.assertEqual((pc.position_x, pc.position_y), (0, 0))
+
+        self.assertEqual(self.move(pc, position_x=2, position_y=2).status_code, 200)
+        self.assertEqual(self.cells(pc), {(self.lab_c.layout_item_id, 0, 0)})
+
+    def test_move_locks_the_parent(self):
+        if not connection.features.has_select_for_update:
+            self.skipTest('Row locks need SELECT ... FOR UPDATE')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.move(self.bench, position_x=0).status_code, 200)
+        locked = [query['sql'] for query in queries if 'FOR UPDATE' in query['sql']]
+        # The parent, before anything else is locked
+        self.assertIn(f'"id" = {self.lab_c.layout_item_id} ', locked[0])
+
+
+class ChangeLogTests(LayoutTestCase):
+    def setUp(self):
+        self.since = current_version()
+
+    def changes(self, parent, subtree=False):
+        _, changes = changes_since(self.since, parent.pk, subtree=subtree)
+        return [(change['op'], change['item_id']) for change in changes]
+
+    def test_each_write_takes_the_next_version(self):
+        item = self.pc_a1.layout_item
+        item.position_x = 3
+        item.save()
+        self.assertEqual(current_version(), self.since + 1)
+        self.assertIsNone(record([]))
+        self.assertEqual(current_version(), self.since + 1)
+
+        self.pc_a1.status = 'non-functional'
+        self.pc_a1.save()
+        version, [change] = changes_since(self.since, self.lab_a.layout_item_id)
+        self.assertEqual(version, self.since + 2)
+        self.assertEqual((change['version'], change['op']), (self.since + 2, 'update'))
+        self.assertEqual(change['item']['position_x'], 3)
+
+    def test_only_the_newest_change_per_item_is_sent(self):
+        item = self.pc_a1.layout_item
+        for x in (3, 4, 5):
+            item.position_x = x
+            item.save()
+        added = LayoutItem.objects.create(name='pc-a3', item_type='computer', parent=self.lab_a.layout_item, position_x=2)
+
+        version, changes = changes_since(self.since, self.lab_a.layout_item_id)
+        self.assertEqual([(c['op'], c['item_id'], c['version']) for c in changes], [
+            ('update', item.pk, self.since + 3), ('add', added.pk, self.since + 4),
+        ])
+        self.assertEqual(changes[0]['item']['position_x'], 5)
+        self.assertEqual(changes_since(version, self.lab_a.layout_item_id), (version, []))
+
+    def test_a_move_is_seen_by_both_lists(self):
+        item = self.pc_a1.layout_item
+        item.parent = self.lab_c.layout_item
+        item.save()
+
+        self.assertEqual(self.changes(self.lab_a.layout_item), [('move', item.pk)])
+        self.assertEqual(self.changes(self.lab_c.layout_item), [('move', item.pk)])
+        self.assertEqual(self.changes(self.floor1), [])
+        self.assertEqual(self.changes(self.floor1, subtree=True), [('move', item.pk)])
+        self.assertEqual(self.changes(self.building, subtree=True), [('move', item.pk), ('move', item.pk)])
+
+    def test_a_delete_stands_for_the_subtree(self):
+        room_id = self.lab_b.layout_item_id
+        self.lab_b.layout_item.delete()
+
+        self.assertEqual(self.changes(self.floor1), [('delete', room_id)])
+        self.assertEqual(self.changes(self.building, subtree=True), [('delete', room_id)])
+
+    def test_clients_too_far_behind_must_reload(self):
+        item = self.pc_a1.layout_item
+        item.save()
+        version = current_version()
+        self.assertEqual(changes_since(version + 1, None), (version, None))
+
+        logged = LayoutChange.objects.count()
+        self.assertEqual(prune_changes(now=timezone.now() + timedelta(days=8)), logged)
+        self.assertEqual(changes_since(self.since, self.lab_a.layout_item_id), (version, None))
+        self.assertEqual(changes_since(version, self.lab_a.layout_item_id), (version, []))
+
+    def test_view_rejects_a_missing_version(self):
+        url = reverse('layout:get_layout_changes')
+        self.assertEqual(self.client.get(url, {'parent_id': self.floor1.pk}).status_code, 400)
+
+        response = self.client.get(url, {'parent_id': self.floor1.pk, 'since': self.since})
+        self.assertEqual(response.json(), {'version': self.since, 'reset': False, 'changes': []})
+
+
+class PlacementTests(LayoutTestCase):
+    """
+    Renames and moves bring the locations and enclosing labs below them along.
+    """
+
+    def placements(self, *items):
+        return [LayoutItem.objects.values_list('location', 'enclosing_lab').get(pk=item.pk) for item in items]
+
+    def test_rename_relocates_the_subtree(self):
+        rename_item(self.floor1, 'Ground Floor')
+
+        self.assertEqual(self.placements(self.lab_a.layout_item, self.pc_a1.layout_item), [
+            ('Building > Ground Floor', self.lab_a.pk), ('Building > Ground Floor > Lab A', self.lab_a.pk),
+        ])
+        self.assertEqual(
+            sorted(Lab.objects.values_list('lab_name', 'location')),
+            [('Lab A', 'Building > Ground Floor'), ('Lab B', 'Building > Ground Floor'), ('Lab C', 'Building > Floor 2')],
+        )
+
+    def test_moved_room_keeps_its_lab(self):
+        room = self.lab_b.layout_item
+        room.parent, room.position_x = self.floor2, 1
+        room.save()
+
+        self.assertEqual(self.placements(room, self.pc_b1.layout_item), [
+            ('Building > Floor 2', self.lab_b.pk), ('Building > Floor 2 > Lab B', self.lab_b.pk),
+        ])
+        self.assertEqual(Lab.objects.get(pk=self.lab_b.pk).location, 'Building > Floor 2')
+        self.assertEqual(System.objects.get(pk=self.pc_b1.pk).lab, self.lab_b)
+
+    def test_moved_device_changes_lab(self):
+        item = self.pc_a1.layout_item
+        item.parent, item.position_x = self.lab_b.layout_item, 1
+        item.save()
+
+        self.assertEqual(self.placements(item), [('Building > Floor 1 > Lab B', self.lab_b.pk)])
+        self.assertEqual(System.objects.get(pk=self.pc_a1.pk).lab, self.lab_b)
+
+    def test_new_lab_claims_the_room_below(self):
+        cubicle = LayoutItem.objects.create(name='Cubicle', item_type='room', parent=self.lab_a.layout_item, position_x=2)
+        item = self.pc_a1.layout_item
+        item.parent = cubicle
+        item.save()
+        self.assertEqual(System.objects.get(pk=self.pc_a1.pk).lab, self.lab_a)
+
+        lab = Lab.objects.create(layout_item=cubicle, lab_name='Cubicle')
+
+        self.assertEqual(self.placements(cubicle, item), [
+            ('Building > Floor 1 > Lab A', lab.pk), ('Building > Floor 1 > Lab A > Cubicle', lab.pk),
+        ])
+        self.assertEqual(System.objects.get(pk=self.pc_a1.pk).lab, lab)
+        self.assertEqual(System.objects.get(pk=self.pc_a2.pk).lab, self.lab_a)
+
+
+class ChildrenCacheTests(LayoutTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def children(self, parent):
+        return {item['name']: item for item in get_children(parent.pk if parent else None)[0]}
+
+    def test_cached_list_is_reused(self):
+        self.children(self.lab_a.layout_item)
+        # Only the live metrics are read again
+        with self.assertNumQueries(1):
+            self.children(self.lab_a.layout_item)
+
+    def test_child_save_invalidates_after_commit(self):
+        self.children(self.lab_a.layout_item)
+        item = self.pc_a1.layout_item
+        item.position_x = 5
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+            self.assertEqual(self.children(self.lab_a.layout_item)['pc-a1']['position_x'], 0)
+        self.assertEqual(self.children(self.lab_a.layout_item)['pc-a1']['position_x'], 5)
+
+    def test_move_invalidates_both_parents(self):
+        self.children(self.lab_a.layout_item)
+        self.children(self.lab_c.layout_item)
+        item = self.pc_a1.layout_item
+        item.parent = self.lab_c.layout_item
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+
+        self.assertEqual(list(self.children(self.lab_a.layout_item)), ['pc-a2'])
+        self.assertEqual(list(self.children(self.lab_c.layout_item)), ['pc-a1'])
+
+    def test_system_and_lab_changes_invalidate_the_list_they_show_in(self):
+        self.children(self.lab_a.layout_item)
+        self.children(self.floor1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pc_a1.status = 'non-functional'
+            self.pc_a1.save()
+            self.lab_b.quick_info = json.dumps({'capacity': 30})
+            self.lab_b.save()
+
+        self.assertEqual(self.children(self.lab_a.layout_item)['pc-a1']['status'], 'non-functional')
+        self.assertEqual(self.children(self.floor1)['Lab B']['quick_info']['capacity'], 30)
+
+    def test_delete_and_bulk_save_invalidate(self):
+        self.children(self.lab_a.layout_item)
+        with self.captureOnCommitCallbacks(execute=True):
+            save_positions([{'id': self.pc_a1.layout_item_id, 'position_x': 5}])
+        self.assertEqual(self.children(self.lab_a.layout_item)['pc-a1']['position_x'], 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pc_a2.layout_item.delete()
+        self.assertEqual(list(self.children(self.lab_a.layout_item)), ['pc-a1'])
+
+    def test_evicted_version_does_not_bring_back_a_stale_list(self):
+        self.children(self.lab_a.layout_item)
+        cache.delete(f'layout_children_version:{self.lab_a.layout_item_id}')
+        LayoutItem.objects.filter(pk=self.pc_a1.layout_item_id).update(position_x=5)
+
+        self.assertEqual(self.children(self.lab_a.layout_item)['pc-a1']['position_x'], 5)
+
+
+class LayoutTransferTests(LayoutTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.staff = User.objects.create_user(
+            username='assistant', email='assistant@example.com', password='x', role='Lab Assistant'
+        )
+        cls.annex = LayoutItem.objects.create(name='Annex', item_type='building', position_x=5)
+
+    def export(self, root, fmt='json'):
+        response = self.client.get(reverse('layout:export_layout'), {'root_id': root.pk, 'format': fmt})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    @staticmethod
+    def shape(rows):
+        """
+        The rows with ids replaced by names, to compare copies of a tree.
+        """
+        names = {row['ref']: row['name'] for row in rows}
+        return sorted(
+            (names.get(str(row['parent']), ''),) + tuple(str(row[key]) for key in row if key not in ('ref', 'parent'))
+            for row in rows
+        )
+
+    def test_json_round_trip(self):
+        self.client.force_login(self.admin)
+        exported = self.export(self.floor1).json()['items']
+
+        response = self.client.post(
+            reverse('layout:import_layout'), json.dumps({'parent_id': self.annex.pk, 'items': exported}),
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual((result['items'], result['labs'], result['systems']), (6, 2, 3))
+        [copy] = LayoutItem.objects.filter(parent=self.annex)
+        self.assertEqual(self.shape(self.export(copy).json()['items']), self.shape(exported))
+
+    def test_csv_upload_round_trip(self):
+        self.client.force_login(self.admin)
+        exported = self.export(self.lab_a.layout_item, 'csv').content
+
+        response = self.client.post(reverse('layout:import_layout'), {
+            'parent_id': self.annex.pk,
+            'file': SimpleUploadedFile('lab.csv', exported, content_type='text/csv'),
+        })
+
+        self.assertEqual(response.status_code, 200)
+        [copy] = LayoutItem.objects.filter(parent=self.annex)
+        self.assertEqual(Lab.objects.get(layout_item=copy).lab_name, 'Lab A')
+        self.assertEqual(self.export(copy, 'csv').content.count(b'\n'), exported.count(b'\n'))
+
+    def test_nested_rooms_enclose_what_is_below_them(self):
+        import_rows([
+            {'ref': 'f', 'name': 'Floor', 'item_type': 'floor'},
+            {'ref': 'r', 'parent': 'f', 'name': 'Room', 'item_type': 'room'},
+            {'ref': 'c', 'parent': 'r', 'name': 'Cubicle', 'item_type': 'room', 'position_x': 2},
+            {'ref': 'p1', 'parent': 'r', 'name': 'pc-1', 'item_type': 'computer'},
+            {'ref': 'p2', 'parent': 'c', 'name': 'pc-2', 'item_type': 'computer'},
+        ], parent=self.annex)
+
+        labs = {item.name: item.enclosing_lab for item in LayoutItem.objects.filter(path__startswith=self.annex.path)}
+        room, cubicle = Lab.objects.get(lab_name='Room'), Lab.objects.get(lab_name='Cubicle')
+        self.assertEqual(labs, {
+            'Annex': None, 'Floor': None, 'Room': room, 'pc-1': room, 'Cubicle': cubicle, 'pc-2': cubicle,
+        })
+        self.assertEqual(System.objects.get(host_name='pc-2').lab, cubicle)
+
+    def test_overlapping_rows_are_rejected(self):
+        with self.assertRaises(LayoutImportError) as raised:
+            import_rows([
+                {'ref': 'a', 'name': 'A', 'item_type': 'floor', 'width': 4, 'height': 4},
+                {'ref': 'b', 'name': 'B', 'item_type': 'floor', 'position_x': 4},
+                {'ref': 'c', 'name': 'C', 'item_type': 'floor', 'position_x': 3, 'position_y': 3},
+                {'ref': 'd', 'parent': 'a', 'name': 'D', 'item_type': 'room'},
+                {'ref': 'e', 'parent': 'b', 'name': 'E', 'item_type': 'room'},
+            ], parent=self.annex)
+
+        self.assertEqual(raised.exception.errors, [{'row': 3, 'ref': 'c', 'message': 'Overlaps row(s) a'}])
+        self.assertFalse(LayoutItem.objects.filter(parent=self.annex).exists())
+
+    def test_anonymous_requests_are_rejected(self):
+        response = self.client.get(reverse('layout:export_layout'))
+        self.assertRedirects(response, '/login/?next=' + reverse('layout:export_layout'), fetch_redirect_response=False)
+
+        response = self.client.post(
+            reverse('layout:import_layout'), json.dumps({'parent_id': self.annex.pk, 'items': []}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(LayoutItem.objects.filter(parent=self.annex).exists())
+
+    def test_non_administrators_are_rejected(self):
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(reverse('layout:export_layout')).status_code, 403)
+        response = self.client.post(
+            reverse('layout:import_layout'),
+            json.dumps({'parent_id': self.annex.pk, 'items': [{'ref': '1', 'name': 'Floor', 'item_type': 'floor'}]}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(LayoutItem.objects.filter(parent=self.annex).exists())
+
+    @override_settings(COMPRESS_ENABLED=False, COMPRESS_OFFLINE=False)
+    def test_only_administrators_see_the_import_controls(self):
+        url = reverse('layout:layout_view', args=[self.floor1.pk])
+        self.client.force_login(self.admin)
+        self.assertContains(self.client.get(url), 'id="importLayoutButton"')
+        self.client.force_login(self.staff)
+        self.assertNotContains(self.client.get(url), 'id="importLayoutButton"')
+
+    def test_import_requires_the_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.admin)
+        response = client.post(
+            reverse('layout:import_layout'), json.dumps({'parent_id': self.annex.pk, 'items': []}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    LAYOUT_EDIT_FLUSH_INTERVAL=60,
+)
+class LayoutConsumerTests(TransactionTestCase):
+    # The consumer's database_sync_to_async closes connections left inside
+    # a transaction, so these tests can't run in one. Edits are flushed by
+    # disconnecting, never by the (long) interval.
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='editor', email='editor@example.com', password='x')
+        self.room = LayoutItem.objects.create(name='Lab A', item_type='room')
+        self.pc = LayoutItem.objects.create(name='pc-1', item_type='computer', parent=self.room)
+
+    async def connect(self, user=None):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/layout/{self.room.pk}/')
+        communicator.scope['user'] = user or self.user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    def move(self, x):
+        return {'action': 'move', 'id': self.pc.pk, 'position_x': x, 'position_y': 0}
+
+    async def stored_position(self):
+        await self.pc.arefresh_from_db()
+        return self.pc.position_x, self.pc.position_version
+
+    async def test_anonymous_socket_is_closed(self):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/layout/{self.room.pk}/')
+        communicator.scope['user'] = AnonymousUser()
+        self.assertEqual(await communicator.connect(), (False, 4401))
+
+    async def test_move_reaches_the_other_client(self):
+        alice, bob = await self.connect(), await self.connect()
+
+        await alice.send_json_to(self.move(4))
+
+        seen = await bob.receive_json_from()
+        self.assertEqual(seen['type'], 'edit')
+        self.assertFalse(seen['own'])
+        [edit] = seen['diffs']
+        self.assertEqual(
+            (edit['id'], edit['field'], edit['value']),
+            (self.pc.pk, 'position', {'position_x': 4, 'position_y': 0}),
+        )
+        self.assertTrue((await alice.receive_json_from())['own'])
+
+        await alice.disconnect()
+        self.assertEqual(await self.stored_position(), (4, edit['version']))
+        self.assertTrue(await bob.receive_nothing())
+        await bob.disconnect()
+
+    async def test_stale_edit_loses_to_the_newer_one(self):
+        alice, bob, viewer = await self.connect(), await self.connect(), await self.connect()
+
+        await alice.send_json_to(self.move(2))
+        older = (await viewer.receive_json_from())['diffs'][0]
+        await bob.send_json_to(self.move(6))
+        newer = (await viewer.receive_json_from())['diffs'][0]
+        self.assertLess(older['version'], newer['version'])
+
+        # Bob's newer edit is written first; Alice's older one must not overwrite it
+        await bob.disconnect()
+        self.assertEqual(await self.stored_position(), (6, newer['version']))
+        await alice.disconnect()
+        self.assertEqual(await self.stored_position(), (6, newer['version']))
+
+        correction = await viewer.receive_json_from()
+        self.assertEqual(correction['diffs'], [{
+            'id': self.pc.pk, 'field': 'position',
+            'value': {'position_x': 6, 'position_y': 0}, 'version': newer['version'],
+        }])
+        await viewer.disconnect()
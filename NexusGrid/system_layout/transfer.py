@@ -0,0 +1,376 @@
+"""
+Import and export of whole layout trees as JSON or CSV.
+
+Both formats are a flat list of rows, parents before children. `ref` names
+a row and `parent` refers to another row's ref; an empty parent puts the
+row directly under the item the tree is imported into. An export uses item
+ids as refs.
+
+An import checks every row before writing anything, then creates the
+items one tree level at a time with bulk_create(), so each level's parent
+ids are known. Rooms get their Lab and devices their System, with the lab
+taken from the nearest room above, resolved in memory. bulk_create()
+skips save() and its signals, so paths, locations and enclosing labs,
+LayoutRollup rows, grid cells, the change log (one add per top-level item)
+and the parent's cached children are all set up here.
+"""
+import csv
+import io
+
+from django.db import transaction
+from django.db.models import CharField, F, Value
+from django.db.models.functions import Cast, Concat
+from django.utils import timezone
+
+from dashboard.live import notify_dashboard_changed
+
+from .changes import item_changes, record
+from .children import invalidate_children
+from .editing import SYSTEM_TYPES
+from .models import Lab, LayoutItem, LayoutRollup, System
+from .rollups import apply_deltas, compute_rollups, invalidate_stats
+from .spatial import colliding, index_items, overlaps
+
+COLUMNS = [
+    'ref', 'parent', 'name', 'item_type', 'position_x', 'position_y', 'width', 'height',
+    'host_name', 'status', 'capacity', 'dimension',
+]
+
+ITEM_TYPES = {value for value, _ in LayoutItem.ITEM_TYPES}
+SYSTEM_STATUSES = {value for value, _ in System.STATUS_CHOICES}
+
+# Rows per IN (...) list when touching the imported items again
+CHUNK = 5000
+
+
+class LayoutImportError(ValueError):
+    """
+    The rows can't be imported; `errors` lists [{'row', 'ref', 'message'}].
+    """
+    def __init__(self, errors):
+        super().__init__(f'{len(errors)} row(s) could not be imported')
+        self.errors = errors
+
+
+def _chunks(values, size=CHUNK):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def export_rows(root=None):
+    """
+    Rows for `root`'s subtree (root included), or the whole layout.
+    """
+    items = LayoutItem.objects.select_related('system', 'lab').order_by('depth', 'id')
+    if root is not None:
+        items = items.filter(path__startswith=root.path)
+    rows = []
+    for item in items:
+        system = getattr(item, 'system', None) if item.item_type in SYSTEM_TYPES else None
+        lab = getattr(item, 'lab', None) if item.item_type == 'room' else None
+        rows.append({
+            'ref': str(item.id),
+            'parent': '' if root is not None and item.pk == root.pk else str(item.parent_id or ''),
+            'name': item.name,
+            'item_type': item.item_type,
+            'position_x': item.position_x,
+            'position_y': item.position_y,
+            'width': item.width,
+            'height': item.height,
+            'host_name': system.host_name if system else '',
+            'status': (system.status or '') if system else '',
+            'capacity': lab.capacity if lab and lab.capacity is not None else '',
+            'dimension': (lab.dimension or '') if lab else '',
+        })
+    return rows
+
+
+def rows_to_csv(rows):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=COLUMNS)
+    writer.writeheader()
+    writer.writerows(rows)
+    return out.getvalue()
+
+
+def rows_from_csv(text):
+    return list(csv.DictReader(io.StringIO(text)))
+
+
+def _int(value, default, minimum):
+    if value in (None, ''):
+        return default
+    value = int(value)
+    if value < minimum:
+        raise ValueError(f'must be at least {minimum}')
+    return value
+
+
+def _levels(cleaned):
+    """
+    (ref, level, error message) for every row, walking parent refs in
+    memory. Rows under an unknown ref, in a cycle or below such a row get
+    level None and a message.
+    """
+    levels = {}
+    for ref in cleaned:
+        chain = []
+        current = ref
+        message = None
+        while current is not None and current not in levels:
+            if current in chain:
+                message = 'Parent refers to the row itself or one of its descendants'
+                break
+            chain.append(current)
+            parent = cleaned[current]['parent']
+            if parent is not None and parent not in cleaned:
+                message = f'Unknown parent {parent!r}'
+                break
+            current = parent
+        if message is None and current is not None and levels[current][0] is None:
+            message = 'Parent row could not be imported'
+
+        if message:
+            for member in chain:
+                levels[member] = (None, message)
+            continue
+        level = levels[current][0] if current is not None else -1
+        for member in reversed(chain):
+            level += 1
+            levels[member] = (level, None)
+    return [(ref, level, message) for ref, (level, message) in levels.items()]
+
+
+def _clean(rows):
+    """
+    Validated row dicts in topological order, each with its `level` (0 for
+    rows placed directly under the import target). Raises LayoutImportError.
+    """
+    errors = []
+    cleaned = {}
+    for number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append({'row': number, 'ref': None, 'message': 'Row must be an object'})
+            continue
+        ref = str(row.get('ref') or '').strip()
+        try:
+            if not ref:
+                raise ValueError('ref is required')
+            if ref in cleaned:
+                raise ValueError('Duplicate ref')
+            name = str(row.get('name') or '').strip()
+            if not name or len(name) > 100:
+                raise ValueError('name must be 1-100 characters')
+            item_type = row.get('item_type')
+            if item_type not in ITEM_TYPES:
+                raise ValueError(f'Unknown item_type {item_type!r}')
+            status = row.get('status') or 'active'
+            if item_type in SYSTEM_TYPES and status not in SYSTEM_STATUSES:
+                raise ValueError(f'Unknown status {status!r}')
+            cleaned[ref] = {
+                'row': number,
+                'ref': ref,
+                'parent': str(row.get('parent') or '').strip() or None,
+                'name': name,
+                'item_type': item_type,
+                'position_x': _int(row.get('position_x'), 0, 0),
+                'position_y': _int(row.get('position_y'), 0, 0),
+                'width': _int(row.get('width'), 1, 1),
+                'height': _int(row.get('height'), 1, 1),
+                'host_name': str(row.get('host_name') or '').strip() or name,
+                'status': status,
+                'capacity': _int(row.get('capacity'), None, 0),
+                'dimension': str(row.get('dimension') or '').strip() or None,
+            }
+        except (TypeError, ValueError) as e:
+            errors.append({'row': number, 'ref': ref or None, 'message': str(e)})
+
+    for ref, level, message in _levels(cleaned):
+        cleaned[ref]['level'] = level
+        if message:
+            errors.append({'row': cleaned[ref]['row'], 'ref': ref, 'message': message})
+
+    # Sibling lab names must be unique (Lab's unique_lab_name_per_floor)
+    seen = set()
+    for row in cleaned.values():
+        if row['item_type'] == 'room' and row.get('level') is not None:
+            key = (row['parent'], row['name'])
+            if key in seen:
+                errors.append({'row': row['row'], 'ref': row['ref'], 'message': 'Duplicate room name under the same parent'})
+            seen.add(key)
+
+    # Siblings within the import mustn't overlap either; the database is checked later
+    siblings = {}
+    for row in cleaned.values():
+        if row.get('level') is not None:
+            siblings.setdefault(row['parent'], {})[row['ref']] = (
+                row['position_x'], row['position_y'], row['width'], row['height']
+            )
+    for rects in siblings.values():
+        for ref, hits in colliding(rects).items():
+            errors.append({'row': cleaned[ref]['row'], 'ref': ref,
+                           'message': f"Overlaps row(s) {', '.join(hits)}"})
+
+    if errors:
+        raise LayoutImportError(sorted(errors, key=lambda error: error['row']))
+    return sorted(cleaned.values(), key=lambda row: row['level'])
+
+
+def _check_target(rows, parent):
+    """
+    What rows can only be checked against the database: the top-level
+    rows' places under `parent`, their room names, and a lab for every
+    device. Returns (errors, lab id above the target or None).
+    """
+    parent_id = parent.pk if parent else None
+    ancestor_ids = parent.ancestor_ids() + [parent.pk] if parent else []
+    base_lab_id = (
+        Lab.objects.filter(layout_item_id__in=ancestor_ids)
+        .order_by('-layout_item__depth')
+        .values_list('id', flat=True)
+        .first()
+    )
+    taken = set(Lab.objects.filter(parent_id=parent_id).values_list('lab_name', flat=True)) if parent else set()
+
+    errors = []
+    has_room = {}
+    for row in rows:
+        above = has_room[row['parent']] if row['parent'] else base_lab_id is not None
+        has_room[row['ref']] = above or row['item_type'] == 'room'
+        if row['item_type'] in SYSTEM_TYPES and not above:
+            errors.append({'row': row['row'], 'ref': row['ref'], 'message': 'Devices must be inside a room'})
+        if row['level'] != 0:
+            continue
+        if row['item_type'] == 'room':
+            if parent is None:
+                errors.append({'row': row['row'], 'ref': row['ref'], 'message': 'Rooms must be inside another item'})
+            elif row['name'] in taken:
+                errors.append({'row': row['row'], 'ref': row['ref'], 'message': 'A room with this name already exists here'})
+        collisions = overlaps(parent_id, row['position_x'], row['position_y'], row['width'], row['height'])
+        if collisions:
+            errors.append({'row': row['row'], 'ref': row['ref'],
+                           'message': f"Overlaps item(s) {', '.join(map(str, collisions))}"})
+    return sorted(errors, key=lambda error: error['row']), base_lab_id
+
+
+def import_rows(rows, parent=None, user=None):
+    """
+    Create the tree described by `rows` under `parent` (None for the top
+    level). Nothing is written unless every row is valid; otherwise
+    LayoutImportError lists what is wrong.
+    Returns {'items', 'labs', 'systems': counts created, 'root_ids'}.
+    """
+    rows = _clean(rows)
+    with transaction.atomic():
+        if parent is not None:
+            # Locked like add_layout_item does, so the overlap checks hold
+            parent = LayoutItem.objects.select_for_update().get(pk=parent.pk)
+        errors, base_lab_id = _check_target(rows, parent)
+        if errors:
+            raise LayoutImportError(errors)
+
+        # One bulk INSERT per tree level; a row's parent is always in an earlier one.
+        # Paths are stored as the parent's and completed below, once ids exist.
+        # A level's rooms get their Labs before the next level is inserted, so
+        # every item's enclosing lab (the nearest room above) is known in memory.
+        base_depth = parent.depth + 1 if parent else 0
+        created = {}
+        labs = {}
+        lab_of = {}
+        levels = {}
+        for row in rows:
+            levels.setdefault(row['level'], []).append(row)
+        for level, level_rows in sorted(levels.items()):
+            items = []
+            for row in level_rows:
+                above = created[row['parent']] if row['parent'] else parent
+                lab_of[row['ref']] = lab_of[row['parent']] if row['parent'] else base_lab_id
+                items.append(LayoutItem(
+                    name=row['name'],
+                    item_type=row['item_type'],
+                    parent_id=above.pk if above else None,
+                    position_x=row['position_x'],
+                    position_y=row['position_y'],
+                    width=row['width'],
+                    height=row['height'],
+                    path=above.path if above else '/',
+                    depth=base_depth + level,
+                    location=above.child_location() if above else '',
+                    enclosing_lab_id=lab_of[row['ref']],
+                ))
+            LayoutItem.objects.bulk_create(items, batch_size=1000)
+            rooms = {}
+            for row, item in zip(level_rows, items):
+                item.path = f'{item.path}{item.pk}/'
+                created[row['ref']] = item
+                if row['item_type'] == 'room':
+                    rooms[row['ref']] = Lab(
+                        layout_item=item,
+                        lab_name=item.name,
+                        location=item.location or 'Unknown',
+                        parent_id=item.parent_id,
+                        capacity=row['capacity'],
+                        dimension=row['dimension'],
+                    )
+            Lab.objects.bulk_create(rooms.values(), batch_size=1000)
+            for ref, lab in rooms.items():
+                # A room is in its own lab, which only exists once the room does
+                created[ref].enclosing_lab_id = lab_of[ref] = lab.pk
+            LayoutItem.objects.bulk_update([created[ref] for ref in rooms], ['enclosing_lab'], batch_size=1000)
+            labs.update(rooms)
+
+        item_ids = [item.pk for item in created.values()]
+        for chunk in _chunks(item_ids):
+            LayoutItem.objects.filter(pk__in=chunk).update(
+                path=Concat(F('path'), Cast('id', output_field=CharField()), Value('/'))
+            )
+
+        # Each device's lab is the nearest room above it
+        systems = []
+        now = timezone.now()
+        for row in rows:
+            if row['item_type'] in SYSTEM_TYPES:
+                systems.append(System(
+                    layout_item=created[row['ref']],
+                    lab_id=lab_of[row['ref']],
+                    host_name=row['host_name'],
+                    status=row['status'],
+                    updated_at=now,
+                    updated_by=user,
+                ))
+        System.objects.bulk_create(systems, batch_size=1000)
+
+        totals = compute_rollups(
+            [(item.pk, item.parent_id) for item in created.values()],
+            [(system.pk, system.layout_item_id, system.status) for system in systems],
+            [],
+            [],
+        )
+        LayoutRollup.objects.bulk_create(
+            [LayoutRollup(layout_item_id=item_id, **counters) for item_id, counters in totals.items()],
+            batch_size=1000,
+        )
+        roots = [created[row['ref']] for row in rows if row['level'] == 0]
+        if parent is not None:
+            apply_deltas(parent.pk, {
+                name: sum(totals[root.pk][name] for root in roots) for name in LayoutRollup.COUNTERS
+            })
+        else:
+            # New top-level items add to the whole-hierarchy totals
+            invalidate_stats()
+
+        for chunk in _chunks(created.values()):
+            index_items(chunk)
+        # Clients see the new top-level items; what's below them loads with them
+        record(item_changes(roots, 'add'))
+        invalidate_children(parent.pk if parent else None)
+        if systems:
+            notify_dashboard_changed()
+
+    return {
+        'items': len(created),
+        'labs': len(labs),
+        'systems': len(systems),
+        'root_ids': [root.pk for root in roots],
+    }
@@ -6,13 +6,18 @@ app_name = 'layout'  # Namespace
 urlpatterns = [
     path("", views.layout_view, name="root"),
     path("<int:item_id>/", views.layout_view, name="layout_view"),
-    # path("details/<int:item_id>/", views.system_details, name="layout_details"),
+    path("details/<int:item_id>/", views.system_details, name="layout_details"),
     path("add_layout_item/", views.add_layout_item, name="add_layout_item"),
     path("update_layout_item/<int:item_id>/", views.update_layout_item, name="update_layout_item"),
     path("delete_layout_item/<int:item_id>/", views.delete_layout_item, name="delete_layout_item"),
+    path("deletions/<int:job_id>/", views.get_deletion, name="get_deletion"),
     path("get_layout_items/", views.get_layout_items, name="get_layout_items"),
+    path("viewport/", views.get_viewport_items, name="get_viewport_items"),
+    path("changes/", views.get_layout_changes, name="get_layout_changes"),
     path("get_parent/", views.get_parent, name="get_parent"),
     path("save/", views.save_layout, name="save_layout"),
+    path("export/", views.export_layout, name="export_layout"),
+    path("import/", views.import_layout, name="import_layout"),
     path('report_fault/', views.submit_fault_report, name='submit_fault_report'),
 
 ]
\ No newline at end of file
@@ -6,53 +6,46 @@ from django.contrib.auth.decorators import login_required
 from django.db import transaction
 import json
 from django.views.decorators.http import require_POST
-from .models import LayoutItem, Lab, System
+from .models import LayoutDeletion, LayoutItem, Lab, System
 from login_manager.models import User
+from faults.duplicates import file_report
 from faults.models import FaultReport
 from resources.models import ResourceRequest
 from django.views.decorators.http import require_http_methods
+from monitoring.snapshots import get_snapshot
+from .bulk import edit_version, save_positions
+from .changes import changes_since
+from .children import current_metrics, get_children, serialize_items, with_metrics
+from .deletion import delete_subtree
+from .editing import rename_item
+from .rollups import layout_stats
+from .spatial import intersecting, overlaps
+from .transfer import LayoutImportError, export_rows, import_rows, rows_from_csv, rows_to_csv
 
 @login_required(login_url="/login/")
 def layout_view(request, item_id=None):
     if item_id:
         current_item = get_object_or_404(LayoutItem, id=int(item_id))  
         parent = current_item
-        breadcrumb = [{'id': ancestor.id, 'name': ancestor.name} for ancestor in parent.get_ancestors()]
+        # Ancestor ids and names are stored on the item
+        breadcrumb = parent.breadcrumb()
     else:
         current_item = None
         parent = None
         breadcrumb = []
 
-    # Get lab_name from parent (room)
-    lab = None
-    if parent and parent.item_type == 'room':
-        lab = Lab.objects.filter(layout_item_id=parent.id).first()
-
-    systems = System.objects.filter(lab=lab) if lab else System.objects.none()
-
-    total_systems = systems.count()
-
-    functional_count = systems.filter(status__in=['active', 'inactive']).count()
-    critical_count = systems.filter(status='non-functional').count()
-    active_count = systems.filter(status='active').count()
-
-    if total_systems > 0:
-        functional_percent = (functional_count / total_systems) * 100
-        critical_percent = (critical_count / total_systems) * 100
-        active_percent = (active_count / total_systems) * 100
-        system_utilization = round((active_count / (functional_count if functional_count != 0 else 1)) * 100, 2)
-    else:
-        functional_percent = critical_percent = active_percent = system_utilization = 0
+    # Subtree counters for this level of the hierarchy: cached, else one primary-key read
+    stats = layout_stats(parent)
 
     context = {
-        'functional_count': functional_count,
-        'critical_count': critical_count,
-        'active_count': active_count,
-        'total_systems': total_systems,
-        'functional_percent': functional_percent,
-        'critical_percent': critical_percent,
-        'active_percent': active_percent,
-        'system_utilization': system_utilization,
+        'functional_count': stats['functional_count'],
+        'critical_count': stats['critical_count'],
+        'active_count': stats['active_count'],
+        'total_systems': stats['total_systems'],
+        'functional_percent': stats['functional_percent'],
+        'critical_percent': stats['critical_percent'],
+        'active_percent': stats['active_percent'],
+        'system_utilization': stats['system_utilization'],
         'user_role': request.user.role,
         'parent': parent,
         'breadcrumb': breadcrumb,
@@ -61,71 +54,75 @@ def layout_view(request, item_id=None):
 
     return render(request, 'system-layout/system-layout.html', context)
 
-# def system_details(request, item_id=None):
-#     if not item_id:
-#         return HttpResponse("Invalid request", status=400)
-
-#     try:
-#         print(f"[DEBUG] Requested LayoutItem ID: {item_id}")
-
-#         layout_item = get_object_or_404(LayoutItem, id=item_id)
-#         print(f"[DEBUG] LayoutItem fetched: {layout_item.name} (ID: {layout_item.id})")
-
-#         # Get associated system
-#         system = System.objects.filter(layout_item_id=layout_item.id).first()
-#         if not system or not system.host_name:
-#             print("[DEBUG] No associated System or host_name found.")
-#             return HttpResponse("No associated system or hostname found", status=404)
+@login_required(login_url="/login/")
+def system_details(request, item_id=None):
+    if not item_id:
+        return HttpResponse("Invalid request", status=400)
 
-#         hostname = system.host_name
-#         print(f"[DEBUG] Hostname from System table: {hostname}")
+    try:
+        layout_item = get_object_or_404(LayoutItem, id=item_id)
 
-#         # Get latest SystemInfo for hostname
-#         system_info = SystemInfo.objects.filter(hostname=hostname).order_by('-timestamp').first()
-#         if not system_info:
-#             print(f"[DEBUG] No SystemInfo record found for hostname: {hostname}")
-#             return HttpResponse("System info not found for this host", status=404)
+        # Get associated system
+        system = System.objects.filter(layout_item_id=layout_item.id).first()
+        if not system or not system.host_name:
+            return HttpResponse("No associated system or hostname found", status=404)
 
-#         print(f"[DEBUG] SystemInfo found for hostname: {hostname} (Timestamp: {system_info.timestamp})")
+        # Latest state comes from the per-system snapshot, not the history table
+        system_info = get_snapshot(system)
 
-#         # Pass everything needed to the template
-#         context = {
-#             "layout_item": layout_item,
-#             "system": system,
-#             "system_info": system_info,
-#         }
-#         return render(request, 'system-layout/system-details.html', context)
+        context = {
+            "layout_item": layout_item,
+            "system": system,
+            "system_info": system_info,
+            "is_stale": system_info.is_stale if system_info else False,
+        }
+        return render(request, 'system-layout/system-details.html', context)
 
-    # except Exception as e:
-    #     print(f"[ERROR] Exception occurred: {str(e)}")
-    #     return HttpResponse(f"Error fetching system details: {str(e)}", status=500)
+    except Exception as e:
+        return HttpResponse(f"Error fetching system details: {str(e)}", status=500)
 
 def get_layout_items(request):
     parent_id = request.GET.get('parent_id')
     parent_id = int(parent_id) if parent_id and parent_id.isdigit() else None 
     
-    items = LayoutItem.objects.filter(parent_id=parent_id) if parent_id else LayoutItem.objects.filter(parent__isnull=True)
-
-    item_list = []
-    quick_info = ''
-    for item in items:
-        item_dict = item.to_dict()
-        
-        # If item is a computer, fetch status from system table
-        if item.item_type == 'computer':
-            system = System.objects.filter(layout_item_id=item.id).first()
-            item_dict['status'] = system.status if system else None  # Could be 'active', 'inactive', etc.
-        else:
-            item_dict['status'] = None
-
-        if item.item_type == 'room':
-            lab = Lab.objects.filter(layout_item_id=item.id).first()
-            quick_info = lab.get_quick_info() if lab else {}
-            item_dict['quick_info'] = quick_info
-
-        item_list.append(item_dict)
+    # Cached per parent; a constant number of queries however many children
+    items, version = get_children(parent_id)
+    return JsonResponse({'items': items, 'version': version})
+
+def get_layout_changes(request):
+    """
+    Changes to the children of parent_id (or, with subtree=1, anywhere
+    below it) since the client's version. 'reset' means reload instead.
+    """
+    parent_id = request.GET.get('parent_id')
+    parent_id = int(parent_id) if parent_id and parent_id.isdigit() else None
+    try:
+        since = int(request.GET['since'])
+    except (KeyError, ValueError):
+        return JsonResponse({'status': 'error', 'message': 'since must be an integer version'}, status=400)
+
+    version, changes = changes_since(since, parent_id, subtree=request.GET.get('subtree') == '1')
+    if changes is None:
+        return JsonResponse({'version': version, 'reset': True, 'changes': []})
+    return JsonResponse({'version': version, 'reset': False, 'changes': changes})
+
+def get_viewport_items(request):
+    """
+    Children of parent_id intersecting the rectangle x, y, width, height
+    (grid cells), found through the spatial index.
+    """
+    parent_id = request.GET.get('parent_id')
+    parent_id = int(parent_id) if parent_id and parent_id.isdigit() else None
+    try:
+        x, y, width, height = (int(request.GET[name]) for name in ['x', 'y', 'width', 'height'])
+    except (KeyError, ValueError):
+        return JsonResponse({'status': 'error', 'message': 'x, y, width and height are required integers'}, status=400)
+    if width <= 0 or height <= 0:
+        return JsonResponse({'status': 'error', 'message': 'width and height must be positive'}, status=400)
 
-    return JsonResponse({'items': item_list})
+    items = serialize_items(intersecting(parent_id, x, y, width, height))
+    metrics = current_metrics(parent_id, [item['id'] for item in items if item['item_type'] == 'computer'])
+    return JsonResponse({'items': with_metrics(items, metrics)})
 
 def get_parent(request):
     item_id = request.GET.get('item_id')
@@ -145,43 +142,41 @@ def add_layout_item(request):
             data = json.loads(request.body)
             parent_id = data.get('parent_id')
 
-            parent = None if parent_id in [None, 'null'] else get_object_or_404(LayoutItem, id=int(parent_id))
+            # Locking the parent serializes concurrent adds into the same room
+            parent = None if parent_id in [None, 'null'] else get_object_or_404(
+                LayoutItem.objects.select_for_update(), id=int(parent_id)
+            )
+
+            rect = [int(data.get(field, default)) for field, default in
+                    [('position_x', 0), ('position_y', 0), ('width', 1), ('height', 1)]]
+            collisions = overlaps(parent.id if parent else None, *rect)
+            if collisions:
+                return JsonResponse({'status': 'error', 'message': 'Position overlaps existing items',
+                                     'overlaps': collisions}, status=409)
 
             item = LayoutItem.objects.create(
                 name=data.get('name'),
                 item_type=data.get('item_type'),
                 parent=parent,
-                position_x=data.get('position_x', 0),
-                position_y=data.get('position_y', 0),
-                width=data.get('width', 1),
-                height=data.get('height', 1)
+                position_x=rect[0],
+                position_y=rect[1],
+                width=rect[2],
+                height=rect[3]
             )
 
             # Auto-create Lab or System
             if item.item_type == 'room':
-                # Get ancestors for location: e.g., Building > Floor
-                ancestors = item.get_ancestors()
-                location_parts = [a.name for a in ancestors]
-                location = " > ".join(location_parts) if location_parts else "Unknown"
-
+                # The lab's location ("Building > Floor") comes from the item
                 Lab.objects.create(
                     layout_item=item,
                     lab_name=item.name,
-                    location=location
                 )
 
             elif item.item_type in ['computer', 'server', 'network_switch', 'router', 'printer', 'ups', 'rack']:
-                parent_lab = None
-                ancestor = item.parent
-                while ancestor:
-                    if hasattr(ancestor, 'lab'):
-                        parent_lab = ancestor.lab
-                        break
-                    ancestor = ancestor.parent
-
+                # Nearest enclosing room's lab, stored on the item when it was saved
                 System.objects.create(
                     layout_item=item,
-                    lab=parent_lab,
+                    lab_id=item.enclosing_lab_id,
                     host_name=item.name,
                     updated_at=timezone.now(),
                     updated_by_id=request.user.id if request.user.is_authenticated else None
@@ -202,31 +197,34 @@ def update_layout_item(request, item_id):
         return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=405)
 
     try:
-        item = get_object_or_404(LayoutItem, id=int(item_id))
-        data = json.loads(request.body)
-
-        name_changed = False
-        for field in ['name', 'position_x', 'position_y']:
-            if field in data:
-                setattr(item, field, data[field])
-                if field == 'name':
-                    name_changed = True
-
-        item.save()
-
-        # Update Lab name if applicable
-        if item.item_type == 'room' and hasattr(item, 'lab') and name_changed:
-            item.lab.lab_name = item.name
-            item.lab.save()
-
-        # Update System host_name and metadata if it's a system item
-        if item.item_type in ['computer', 'server', 'network_switch', 'router', 'printer', 'ups', 'rack']:
-            if hasattr(item, 'system'):
-                item.system.host_name = item.name
-                item.system.updated_at = timezone.now()
-                if request.user.is_authenticated:
-                    item.system.updated_by_id = request.user.id
-                item.system.save()
+        with transaction.atomic():
+            item = get_object_or_404(LayoutItem, id=int(item_id))
+            data = json.loads(request.body)
+            moving = 'position_x' in data or 'position_y' in data
+
+            if moving and item.parent_id is not None:
+                # Locked like add_layout_item does, so concurrent adds and moves
+                # into the same room can't both pass the overlap check
+                get_object_or_404(LayoutItem.objects.select_for_update(), id=item.parent_id)
+                item.refresh_from_db()
+
+            for field in ['position_x', 'position_y']:
+                if field in data:
+                    setattr(item, field, data[field])
+
+            if moving:
+                collisions = overlaps(item.parent_id, int(item.position_x), int(item.position_y),
+                                      item.width, item.height, exclude=item.id)
+                if collisions:
+                    return JsonResponse({'status': 'error', 'message': 'Position overlaps existing items',
+                                         'overlaps': collisions}, status=409)
+                item.position_version = max(edit_version(), item.position_version + 1)
+
+            # Renaming also renames the room's Lab or the System behind the item
+            if 'name' in data:
+                rename_item(item, data['name'], request.user.id if request.user.is_authenticated else None)
+            else:
+                item.save()
 
         return JsonResponse({'status': 'success', 'item': item.to_dict()})
     except Exception as e:
@@ -240,21 +238,25 @@ def delete_layout_item(request, item_id):
     try:
         item = get_object_or_404(LayoutItem, id=int(item_id))
 
-        # if item.children.exists():
-        #     return JsonResponse({'status': 'error', 'message': 'Cannot delete - item has child items'}, status=400)
-
-        # Delete related Lab/System safely
-        if hasattr(item, 'system'):
-            item.system.delete()
-        if hasattr(item, 'lab'):
-            item.lab.delete()
-
-        item.delete()
-        return JsonResponse({'status': 'success'})
+        # Removed in batches with its Labs, Systems and reports; big subtrees
+        # are left to the deletion worker and polled through get_deletion
+        job = delete_subtree(item, request.user if request.user.is_authenticated else None)
+        if job.status == LayoutDeletion.FAILED:
+            return JsonResponse({'status': 'error', 'message': job.error, 'job': job.to_dict()}, status=500)
+        if job.status == LayoutDeletion.DONE:
+            return JsonResponse({'status': 'success', 'job': job.to_dict()})
+        return JsonResponse({'status': 'queued', 'job': job.to_dict()}, status=202)
     except Exception as e:
         import traceback
         return JsonResponse({'status': 'error', 'message': str(e), 'traceback': traceback.format_exc()}, status=400)
 
+def get_deletion(request, job_id):
+    """
+    Progress of a subtree deletion started by delete_layout_item.
+    """
+    job = get_object_or_404(LayoutDeletion, id=job_id)
+    return JsonResponse({'status': 'success', 'job': job.to_dict()})
+
 @csrf_exempt
 def save_layout(request):
     if request.method != 'POST':
@@ -263,15 +265,78 @@ def save_layout(request):
     try:
         data = json.loads(request.body)
         items = data.get('items', [])
-        
-        with transaction.atomic():
-            for item_data in items:
-                item_id = int(item_data.get('id'))
-                item = get_object_or_404(LayoutItem, id=item_id)
-                item.position_x = item_data.get('position_x', item.position_x)
-                item.position_y = item_data.get('position_y', item.position_y)
-                item.save()
-        return JsonResponse({'status': 'success'})
+        if not isinstance(items, list):
+            return JsonResponse({'status': 'error', 'message': 'items must be a list'}, status=400)
+
+        # One SELECT and one bulk UPDATE; bad entries are reported, not fatal
+        result = save_positions(items)
+        return JsonResponse({
+            'status': 'partial' if result['errors'] else 'success',
+            'updated': result['updated'],
+            'errors': result['errors'],
+        })
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+def _forbidden_unless_admin(request):
+    if request.user.role != 'Administrator':
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Only administrators can import or export the layout'
+        }, status=403)
+    return None
+
+@login_required(login_url="/login/")
+def export_layout(request):
+    """
+    The subtree under root_id (or the whole layout) as a JSON or CSV
+    download that import_layout accepts back.
+    """
+    forbidden = _forbidden_unless_admin(request)
+    if forbidden:
+        return forbidden
+    root_id = request.GET.get('root_id')
+    root = get_object_or_404(LayoutItem, id=int(root_id)) if root_id and root_id.isdigit() else None
+    rows = export_rows(root)
+    name = f"layout-{root.id if root else 'all'}"
+    if request.GET.get('format') == 'csv':
+        response = HttpResponse(rows_to_csv(rows), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{name}.csv"'
+    else:
+        response = JsonResponse({'items': rows})
+        response['Content-Disposition'] = f'attachment; filename="{name}.json"'
+    return response
+
+@login_required(login_url="/login/")
+def import_layout(request):
+    """
+    Create a whole tree under parent_id from a JSON body ({'parent_id',
+    'items'}) or an uploaded .json/.csv file. All or nothing.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid request method'}, status=405)
+    forbidden = _forbidden_unless_admin(request)
+    if forbidden:
+        return forbidden
+
+    try:
+        upload = request.FILES.get('file')
+        if upload:
+            parent_id = request.POST.get('parent_id')
+            text = upload.read().decode('utf-8-sig')
+            rows = rows_from_csv(text) if upload.name.lower().endswith('.csv') else json.loads(text).get('items', [])
+        else:
+            data = json.loads(request.body)
+            parent_id = data.get('parent_id')
+            rows = data.get('items', [])
+        if not isinstance(rows, list):
+            return JsonResponse({'status': 'error', 'message': 'items must be a list'}, status=400)
+
+        parent = None if parent_id in [None, '', 'null'] else get_object_or_404(LayoutItem, id=int(parent_id))
+        result = import_rows(rows, parent, request.user)
+        return JsonResponse({'status': 'success', **result})
+    except LayoutImportError as e:
+        return JsonResponse({'status': 'error', 'message': str(e), 'errors': e.errors}, status=400)
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
@@ -329,13 +394,14 @@ def submit_fault_report(request):
 
             full_description = f"Title: {title}\n\n{description}" if title else description
 
-            report = FaultReport.objects.create(
-                fault_type=fault_type,
-                description=full_description,
-                reported_by=request.user,
-                system_name_id=system_id,
-                status="Pending"  # Set default status
-            )
+            # A near-duplicate of an open report is counted on that report instead
+            report, created = file_report(system_id, request.user, fault_type, full_description)
+            if not created:
+                return JsonResponse({
+                    "message": "This fault has already been reported; your report was added to it.",
+                    "fault_id": report.fault_id,
+                    "duplicate": True,
+                }, status=200)
 
             return JsonResponse({"message": "Fault reported successfully.", "fault_id": report.fault_id}, status=201)
 